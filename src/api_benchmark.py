@@ -0,0 +1,88 @@
+"""
+Tailscale API client benchmark
+Runs sequential and concurrent list_auth_keys calls against the local mock
+API, once with the pooled TailscaleAPI client and once opening a new HTTP
+client per call (the previous behaviour), and reports throughput and the TCP
+connections each run opened
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI
+from mock_tailscale_api import MockTailscaleAPI, running
+
+DEFAULT_CALLS = 1000
+MODES = ("per-call", "pooled")
+PATTERNS = ("sequential", "concurrent")
+
+class PerCallTailscaleAPI(TailscaleAPI):
+    """Baseline: a fresh HTTP client (new TCP connection) for every request"""
+    async def _request(self, method, endpoint, **kwargs):
+        token = await self.get_access_token()
+        url = f"{self.base_url}/tailnet/{self.tailnet}/{endpoint}"
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+            if response.status_code >= 400:
+                raise Exception(f"API error {response.status_code}: {response.text}")
+            return response.json()
+
+async def run_calls(api, calls, pattern):
+    if pattern == "sequential":
+        for _ in range(calls):
+            await api.list_auth_keys()
+    else:
+        await asyncio.gather(*(api.list_auth_keys() for _ in range(calls)))
+
+async def _benchmark(base_url, mock, calls, modes, patterns):
+    rows = []
+    for mode in modes:
+        api_class = PerCallTailscaleAPI if mode == "per-call" else TailscaleAPI
+        for pattern in patterns:
+            async with api_class(base_url=base_url, tailnet="-", client_id="bench", client_secret="bench",
+                                 rate=0) as api:
+                # Token fetch and first connection are not part of the measurement
+                await api.list_auth_keys()
+                connections = mock.stats["connections"]
+                started = time.perf_counter()
+                await run_calls(api, calls, pattern)
+                elapsed = time.perf_counter() - started
+            rows.append({
+                "mode": mode,
+                "pattern": pattern,
+                "calls": calls,
+                "seconds": round(elapsed, 3),
+                "rps": round(calls / elapsed, 1),
+                "connections": mock.stats["connections"] - connections
+            })
+    return rows
+
+def benchmark(calls=DEFAULT_CALLS, modes=MODES, patterns=PATTERNS):
+    """One row per mode/pattern, measured against an in-process mock API"""
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        return asyncio.run(_benchmark(base_url, mock, calls, modes, patterns))
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the Tailscale API client against a local mock")
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALLS)
+    parser.add_argument("--mode", choices=MODES, action="append", help="Client mode (default: both)")
+    args = parser.parse_args()
+
+    rows = benchmark(args.calls, args.mode or MODES)
+    print(f"{'mode':<10} {'pattern':<11} {'calls':>6} {'seconds':>8} {'req/s':>9} {'connections':>12}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row['pattern']:<11} {row['calls']:>6} {row['seconds']:>8} "
+              f"{row['rps']:>9} {row['connections']:>12}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
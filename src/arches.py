@@ -0,0 +1,59 @@
+"""
+Target CPU architectures
+Arches use Tailscale's package names (amd64, arm64, 386, arm); helpers map
+them to upstream file names, wheel platforms and host machine names
+"""
+
+import re
+
+ARCHES = ("amd64", "arm64", "386", "arm")
+DEFAULT_ARCH = "amd64"
+# Tailscale publishes MSIs for three arches and static tarballs for all four
+PLATFORM_ARCHES = {"windows": ("amd64", "arm64", "386"), "linux": ARCHES}
+# Other spellings (uname -m, PROCESSOR_ARCHITECTURE, Debian) of the same arches
+ALIASES = {
+    "x86_64": "amd64", "x64": "amd64",
+    "aarch64": "arm64", "armv8": "arm64",
+    "i386": "386", "i686": "386", "x86": "386",
+    "armv7": "arm", "armv7l": "arm", "armv6l": "arm", "armhf": "arm"
+}
+# Upstream MSI file names call 386 "x86"
+MSI_ARCHES = {"amd64": "amd64", "arm64": "arm64", "386": "x86"}
+# Wheel platform bundled per arch; cryptography publishes no current
+# manylinux wheels for 386 or arm, so those hosts use the distro package
+WHEEL_PLATFORMS = {"amd64": "manylinux2014_x86_64", "arm64": "manylinux2014_aarch64",
+                   "386": None, "arm": None}
+WHEEL_MACHINES = {"amd64": "x86_64", "arm64": "aarch64", "386": "i686", "arm": "armv7l"}
+
+class ArchError(Exception):
+    """Raised for unknown arches or arches a platform does not support"""
+
+def normalize_arch(arch, platform=None):
+    """Canonical arch name, checked against the platform's supported arches"""
+    name = str(arch).strip().lower()
+    name = ALIASES.get(name, name)
+    if name not in ARCHES:
+        raise ArchError(f"Unknown arch: {arch} (expected one of: {', '.join(ARCHES)})")
+    if platform is not None and name not in PLATFORM_ARCHES[platform]:
+        raise ArchError(f"Unsupported arch for {platform}: {name}")
+    return name
+
+def parse_arches(value, platform=None):
+    """Arch list from a comma-separated string or a list, without duplicates"""
+    if isinstance(value, str):
+        value = value.split(",")
+    arches = []
+    for arch in value:
+        if str(arch).strip():
+            arch = normalize_arch(arch, platform)
+            if arch not in arches:
+                arches.append(arch)
+    return arches
+
+def wheel_fits_arch(filename, arch):
+    """Whether a wheel's platform tag is pure Python or built for arch"""
+    match = re.match(r"^.+-(?P<plat>[^-]+)\.whl$", filename)
+    if not match:
+        return False
+    machine = WHEEL_MACHINES[arch]
+    return any(tag == "any" or tag.endswith(f"_{machine}") for tag in match.group("plat").split("."))
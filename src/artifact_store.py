@@ -0,0 +1,408 @@
+"""
+Content-addressed artifact store for build outputs
+Blobs are stored once by sha256; each build gets a manifest and each variant a
+"latest" pointer. Loose outputs in builds/ are only checkouts of the store and
+are garbage-collected together with old manifests and unreferenced blobs
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: the store lock only covers this process
+    fcntl = None
+
+sys.path.insert(0, str(Path(__file__).parent))
+from installer_stamp import read_stamp
+from build_graph import path_size, prune_cache
+
+CHUNK_SIZE = 1024 * 1024
+STORE_FORMAT = 1
+# Generic builds and stage cache entries younger than this survive gc even
+# when no manifest uses them yet (a build may be stamping from them now)
+GC_GRACE_SECONDS = 86400
+GENERIC_FIELDS = ("generic_installer", "generic_package")
+_process_lock = threading.Lock()
+
+class ArtifactStoreError(Exception):
+    """Raised for unknown builds or damaged store entries"""
+
+def variant_name(platform, arch, tags):
+    """Default variant name, shared with batch matrices"""
+    label = "-".join(t.replace("tag:", "") for t in tags) or "default"
+    return f"{platform}-{arch}-{label}"
+
+class ArtifactStore:
+    def __init__(self, root=None):
+        self.root = Path(root or Path("builds") / "store")
+        self.objects_dir = self.root / "objects"
+        self.manifests_dir = self.root / "manifests"
+        self.refs_dir = self.root / "refs"
+        # The builders' output directory (builds/ for the default store)
+        self.build_dir = self.root.parent
+        for directory in (self.objects_dir, self.manifests_dir, self.refs_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def locked(self, exclusive=False):
+        """Store lock: commits and reads share it, gc holds it alone
+
+        A commit writes its blobs before its manifest, so a gc running in
+        between would see them as unreferenced and delete them.
+        """
+        if fcntl is None:
+            with _process_lock:
+                yield
+            return
+        with open(self.root / "lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def object_path(self, sha256):
+        return self.objects_dir / sha256[:2] / sha256
+
+    def put_range(self, path, start=0, end=None):
+        """Store bytes [start, end) of a file; returns {"sha256", "size"}"""
+        path = Path(path)
+        end = path.stat().st_size if end is None else end
+        digest = hashlib.sha256()
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.objects_dir, suffix=".part")
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as out:
+                src.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = src.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ArtifactStoreError(f"Unexpected end of file in {path}")
+                    digest.update(chunk)
+                    out.write(chunk)
+                    remaining -= len(chunk)
+
+            sha256 = digest.hexdigest()
+            target = self.object_path(sha256)
+            if target.exists():
+                os.remove(tmp_name)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                os.chmod(tmp_name, 0o444)
+                os.replace(tmp_name, target)
+            return {"sha256": sha256, "size": end - start}
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+
+    def put_file(self, path):
+        """Store a file as one or more blobs
+
+        Stamped installers are split at the stamp, so every variant built
+        from the same generic installer shares its (MSI-sized) blob.
+        """
+        path = Path(path)
+        try:
+            config, stamp_start = read_stamp(path)
+        except Exception:
+            config = None
+        if config is not None:
+            parts = [self.put_range(path, 0, stamp_start), self.put_range(path, stamp_start)]
+        else:
+            parts = [self.put_range(path)]
+        return {
+            "parts": parts,
+            "size": sum(p["size"] for p in parts),
+            "mode": path.stat().st_mode & 0o777
+        }
+
+    def commit(self, variant, output_path, build_info=None, checkout=None):
+        """Store a build output (file or directory) and point the variant's latest at it"""
+        with self.locked():
+            return self._commit(variant, Path(output_path), build_info, checkout)
+
+    def _commit(self, variant, output_path, build_info, checkout):
+        if output_path.is_dir():
+            kind = "tree"
+            files = {
+                p.relative_to(output_path).as_posix(): self.put_file(p)
+                for p in sorted(output_path.rglob("*")) if p.is_file()
+            }
+        else:
+            kind = "file"
+            files = {output_path.name: self.put_file(output_path)}
+
+        content = json.dumps({"variant": variant, "kind": kind, "files": files}, sort_keys=True)
+        build_id = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+        manifest = {
+            "format": STORE_FORMAT,
+            "id": build_id,
+            "variant": variant,
+            "kind": kind,
+            "name": output_path.name,
+            "created": time.time(),
+            "size": sum(f["size"] for f in files.values()),
+            "files": files,
+            "checkout": [str(p) for p in (checkout or [output_path])],
+            "build_info": build_info
+        }
+        self._write_json(self.manifests_dir / f"{build_id}.json", manifest)
+        self._write_json(self.refs_dir / f"{variant}.json", {"latest": build_id, "updated": time.time()})
+        return manifest
+
+    def _write_json(self, path, data):
+        part = path.with_name(path.name + ".part")
+        with open(part, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(part, path)
+
+    def manifest(self, build_id):
+        path = self.manifests_dir / f"{build_id}.json"
+        if not path.exists():
+            raise ArtifactStoreError(f"Unknown build: {build_id}")
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def latest(self, variant):
+        """Manifest the variant's latest pointer refers to"""
+        ref = self.refs_dir / f"{variant}.json"
+        if not ref.exists():
+            raise ArtifactStoreError(f"No builds for variant: {variant}")
+        with open(ref, 'r') as f:
+            return self.manifest(json.load(f)["latest"])
+
+    def resolve(self, name):
+        """Build id or variant name -> manifest"""
+        if (self.manifests_dir / f"{name}.json").exists():
+            return self.manifest(name)
+        return self.latest(name)
+
+    def manifests(self):
+        """All manifests, oldest first"""
+        result = []
+        for path in self.manifests_dir.glob("*.json"):
+            with open(path, 'r') as f:
+                result.append(json.load(f))
+        return sorted(result, key=lambda m: m["created"])
+
+    def latest_ids(self):
+        ids = set()
+        for ref in self.refs_dir.glob("*.json"):
+            with open(ref, 'r') as f:
+                ids.add(json.load(f)["latest"])
+        return ids
+
+    def iter_file(self, manifest, relpath):
+        """Stream a stored file's bytes"""
+        entry = manifest["files"][relpath]
+        for part in entry["parts"]:
+            blob = self.object_path(part["sha256"])
+            if not blob.exists():
+                raise ArtifactStoreError(f"Missing blob {part['sha256']} for {relpath}")
+            with open(blob, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    yield chunk
+
+    def materialize(self, manifest, dest):
+        """Write a stored build out to dest (a file, or a directory for trees)"""
+        with self.locked():
+            return self._materialize(manifest, Path(dest))
+
+    def _materialize(self, manifest, dest):
+        targets = ({dest / relpath: relpath for relpath in manifest["files"]}
+                   if manifest["kind"] == "tree" else {dest: manifest["name"]})
+
+        for target, relpath in targets.items():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            part = target.with_name(target.name + ".part")
+            with open(part, 'wb') as out:
+                for chunk in self.iter_file(manifest, relpath):
+                    out.write(chunk)
+            if part.stat().st_size != manifest["files"][relpath]["size"]:
+                part.unlink()
+                raise ArtifactStoreError(f"Size mismatch restoring {relpath}")
+            os.chmod(part, manifest["files"][relpath]["mode"])
+            os.replace(part, target)
+        return dest
+
+    def usage(self):
+        """Blob count and bytes on disk"""
+        count = size = 0
+        for shard in self.objects_dir.iterdir():
+            if shard.is_dir():
+                for blob in shard.iterdir():
+                    count += 1
+                    size += blob.stat().st_size
+        return {"objects": count, "bytes": size, "manifests": len(list(self.manifests_dir.glob("*.json")))}
+
+    def gc(self, max_age_days=None, max_bytes=None, now=None):
+        """Drop old manifests, their checkouts and unreferenced blobs
+
+        The latest build of every variant is always kept. Manifests older
+        than max_age_days go first; then the oldest remaining ones until the
+        blobs fit in max_bytes. Checkouts of anything but the latest build of
+        a variant are removed too, since they can be rebuilt from the store,
+        and so are generic builds and stage cache entries no kept build was
+        stamped from (after a grace period).
+        """
+        with self.locked(exclusive=True):
+            return self._gc(max_age_days, max_bytes, time.time() if now is None else now)
+
+    def _gc(self, max_age_days, max_bytes, now):
+        latest = self.latest_ids()
+        manifests = self.manifests()
+        removed = []
+
+        def referenced(kept):
+            return {part["sha256"] for m in kept for f in m["files"].values() for part in f["parts"]}
+
+        def blob_bytes(shas):
+            return sum(self.object_path(s).stat().st_size for s in shas if self.object_path(s).exists())
+
+        kept = []
+        for manifest in manifests:
+            expired = max_age_days is not None and now - manifest["created"] > max_age_days * 86400
+            if expired and manifest["id"] not in latest:
+                removed.append(manifest)
+            else:
+                kept.append(manifest)
+
+        if max_bytes is not None:
+            while blob_bytes(referenced(kept)) > max_bytes:
+                victim = next((m for m in kept if m["id"] not in latest), None)
+                if victim is None:
+                    break
+                kept.remove(victim)
+                removed.append(victim)
+
+        for manifest in removed:
+            (self.manifests_dir / f"{manifest['id']}.json").unlink()
+
+        # Loose checkouts: keep only the latest build of each variant
+        latest_checkouts = {c for m in manifests if m["id"] in latest for c in m.get("checkout", [])}
+        checkouts_removed = 0
+        for manifest in manifests:
+            if manifest["id"] in latest:
+                continue
+            for checkout in manifest.get("checkout", []):
+                if checkout in latest_checkouts:
+                    continue
+                path = Path(checkout)
+                if path.is_dir():
+                    shutil.rmtree(path)
+                    checkouts_removed += 1
+                elif path.exists():
+                    path.unlink()
+                    checkouts_removed += 1
+
+        live = referenced(kept)
+        blobs_removed = bytes_freed = 0
+        for shard in self.objects_dir.iterdir():
+            if not shard.is_dir():
+                if shard.name.endswith(".part") and now - shard.stat().st_mtime > 3600:
+                    shard.unlink()
+                continue
+            for blob in shard.iterdir():
+                if blob.name not in live:
+                    bytes_freed += blob.stat().st_size
+                    blob.unlink()
+                    blobs_removed += 1
+
+        # Generic builds and the stage cache they came from
+        cutoff = now - GC_GRACE_SECONDS
+        live_generics = {Path(m["build_info"][field]).resolve() for m in kept if m.get("build_info")
+                         for field in GENERIC_FIELDS if m["build_info"].get(field)}
+        generics_removed = 0
+        for generic_dir in (self.build_dir / "generic", self.build_dir / "linux" / "generic"):
+            if not generic_dir.is_dir():
+                continue
+            for sidecar in generic_dir.glob("*.json"):
+                try:
+                    with open(sidecar, 'r') as f:
+                        generic = Path(json.load(f)["generic_path"])
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                if generic.resolve() in live_generics or sidecar.stat().st_mtime > cutoff:
+                    continue
+                if generic.is_dir():
+                    bytes_freed += path_size(generic)
+                    shutil.rmtree(generic)
+                elif generic.exists():
+                    bytes_freed += generic.stat().st_size
+                    generic.unlink()
+                sidecar.unlink()
+                generics_removed += 1
+
+        cache_removed, cache_freed = prune_cache(self.build_dir / ".cache", live_generics, cutoff)
+
+        return {
+            "manifests_removed": len(removed),
+            "checkouts_removed": checkouts_removed,
+            "blobs_removed": blobs_removed,
+            "generics_removed": generics_removed,
+            "cache_entries_removed": cache_removed,
+            "bytes_freed": bytes_freed + cache_freed
+        }
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and clean the build artifact store")
+    parser.add_argument("--store", default=None, help="Store directory (default: builds/store)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List builds, oldest first")
+    show = sub.add_parser("show", help="Show a build manifest")
+    show.add_argument("build", help="Build id or variant name")
+    checkout = sub.add_parser("checkout", help="Restore a build from the store")
+    checkout.add_argument("build", help="Build id or variant name")
+    checkout.add_argument("dest")
+    gc = sub.add_parser("gc", help="Garbage-collect old builds")
+    gc.add_argument("--max-age-days", type=float, default=None)
+    gc.add_argument("--max-size-mb", type=float, default=None)
+    sub.add_parser("du", help="Show store disk usage")
+
+    args = parser.parse_args()
+    store = ArtifactStore(args.store)
+
+    try:
+        if args.command == "list":
+            latest = store.latest_ids()
+            for m in store.manifests():
+                marker = "*" if m["id"] in latest else " "
+                created = time.strftime("%Y-%m-%d %H:%M", time.localtime(m["created"]))
+                print(f"{marker} {m['id']}  {created}  {m['size'] / (1024 * 1024):8.2f} MB  {m['variant']}")
+        elif args.command == "show":
+            print(json.dumps(store.resolve(args.build), indent=2))
+        elif args.command == "checkout":
+            dest = store.materialize(store.resolve(args.build), args.dest)
+            print(f"[OK] Restored {dest}")
+        elif args.command == "gc":
+            max_bytes = None if args.max_size_mb is None else int(args.max_size_mb * 1024 * 1024)
+            stats = store.gc(args.max_age_days, max_bytes)
+            print(f"[OK] Removed {stats['manifests_removed']} builds, {stats['checkouts_removed']} checkouts, "
+                  f"{stats['blobs_removed']} blobs, {stats['generics_removed']} generic builds, "
+                  f"{stats['cache_entries_removed']} cache entries ({stats['bytes_freed'] / (1024 * 1024):.2f} MB freed)")
+        else:
+            usage = store.usage()
+            print(f"[INFO] {usage['manifests']} builds, {usage['objects']} blobs, "
+                  f"{usage['bytes'] / (1024 * 1024):.2f} MB")
+    except (ArtifactStoreError, OSError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
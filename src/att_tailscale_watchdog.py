@@ -332,6 +332,9 @@ class TailscaleMonitor:
             # Add optional parameters
             if self.config.get("accept_routes", True):
                 cmd.append("--accept-routes")
+            
+            if self.config.get("tags"):
+                cmd.extend(["--advertise-tags", ",".join(self.config["tags"])])
                 
             if self.config.get("hostname"):
                 cmd.extend(["--hostname", self.config["hostname"]])
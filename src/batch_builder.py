@@ -0,0 +1,310 @@
+"""
+Batch ATT Tailscale installer builder
+Builds every variant of a deployment matrix: the generic installer for each
+distinct platform and arch is built once (all in parallel), then all
+variants are stamped concurrently
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import itertools
+import contextlib
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).parent))
+from windows_installer_builder import WindowsInstallerBuilder
+from linux_installer_builder import LinuxInstallerBuilder
+from installer_stamp import DEFAULT_CHECK_INTERVAL
+from reproducible import deterministic_mode
+from artifact_store import variant_name
+from preflight import Preflight, checks_for, print_report, platform_failures
+from arches import DEFAULT_ARCH, PLATFORM_ARCHES, ArchError, normalize_arch
+from key_pool import pool_auth_key
+
+# platform -> (builder class, generic build method, stamp method)
+PLATFORMS = {
+    "windows": (WindowsInstallerBuilder, "build_generic_installer", "stamp_installer"),
+    "linux": (LinuxInstallerBuilder, "build_generic_package", "stamp_package")
+}
+
+class MatrixError(Exception):
+    """Raised for invalid deployment matrix files"""
+
+def expand_matrix(spec):
+    """Expand a matrix spec into a list of variants
+
+    The spec has optional "defaults", a "matrix" of axes that is expanded as a
+    cross product, and an "include" list of explicit variants. Cross-product
+    combinations of a platform with an arch it does not support (windows/arm)
+    are skipped; explicit variants with one are an error.
+    """
+    defaults = dict(spec.get("defaults", {}))
+    candidates = []
+
+    axes = spec.get("matrix", {})
+    if axes:
+        names = sorted(axes)
+        for values in itertools.product(*(axes[name] for name in names)):
+            candidates.append((dict(defaults, **dict(zip(names, values))), True))
+
+    for variant in spec.get("include", []):
+        candidates.append((dict(defaults, **variant), False))
+
+    variants = []
+    seen = set()
+    for variant, from_matrix in candidates:
+        variant.setdefault("arch", DEFAULT_ARCH)
+        variant.setdefault("tags", [])
+        variant.setdefault("check_interval", DEFAULT_CHECK_INTERVAL)
+        if isinstance(variant["tags"], str):
+            variant["tags"] = [t for t in variant["tags"].split(",") if t]
+
+        if variant.get("platform") not in PLATFORMS:
+            raise MatrixError(f"Unknown platform {variant.get('platform')!r} "
+                              f"(expected one of: {', '.join(PLATFORMS)})")
+        try:
+            arch = normalize_arch(variant["arch"])
+        except ArchError as e:
+            raise MatrixError(str(e))
+        if arch not in PLATFORM_ARCHES[variant["platform"]]:
+            if from_matrix:
+                continue
+            raise MatrixError(f"Unsupported arch for {variant['platform']}: {arch}")
+        variant["arch"] = arch
+
+        if "name" not in variant:
+            variant["name"] = variant_name(variant["platform"], variant["arch"], variant["tags"])
+        if variant["name"] in seen:
+            raise MatrixError(f"Duplicate variant name: {variant['name']}")
+        seen.add(variant["name"])
+        variants.append(variant)
+
+    if not variants:
+        raise MatrixError("Matrix defines no variants")
+    return variants
+
+def load_matrix(path):
+    """Load and expand a matrix JSON file"""
+    with open(path, 'r') as f:
+        return expand_matrix(json.load(f))
+
+def resolve_auth_key(variant):
+    """Auth key from the variant, the key pool (KEY_POOL=1), or the env var the variant names"""
+    if variant.get("auth_key"):
+        return variant["auth_key"]
+    pooled = pool_auth_key(variant.get("tags"))
+    if pooled:
+        return pooled
+    env_name = variant.get("auth_key_env", "TAILSCALE_AUTH_KEY")
+    auth_key = os.getenv(env_name)
+    if not auth_key:
+        raise MatrixError(f"Variant {variant['name']}: {env_name} is not set")
+    return auth_key.strip()
+
+def _run_logged(log_file, func, *args):
+    """Run func with its output captured to log_file; return (result, seconds)"""
+    started = time.perf_counter()
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            result = func(*args)
+    finally:
+        Path(log_file).write_text(buffer.getvalue(), encoding='utf-8')
+    return result, time.perf_counter() - started
+
+def _build_generic(platform, arch, log_file):
+    """Pool worker: build (or reuse) the generic installer for one platform and arch"""
+    builder_class, generic_method, _ = PLATFORMS[platform]
+    builder = builder_class(arch)
+    (generic_path, generic_info), seconds = _run_logged(log_file, getattr(builder, generic_method))
+    return str(generic_path), generic_info, seconds
+
+def _stamp_variant(variant, auth_key, generic_path, generic_info, output_name, log_file):
+    """Pool worker: stamp one variant from its generic installer"""
+    builder_class, _, stamp_method = PLATFORMS[variant["platform"]]
+    builder = builder_class(variant["arch"])
+    (output_path, build_info), seconds = _run_logged(
+        log_file, getattr(builder, stamp_method),
+        Path(generic_path), generic_info, auth_key,
+        variant["tags"], variant["check_interval"], output_name, variant["name"]
+    )
+    return str(output_path), build_info, seconds
+
+class BatchBuilder:
+    def __init__(self, max_workers=None):
+        self.build_dir = Path("builds")
+        self.batch_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.batch_dir = self.build_dir / "batch" / self.batch_id
+        self.max_workers = max_workers
+
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+
+    def output_name(self, variant_name):
+        """Per-variant output name; stable across batches in deterministic mode"""
+        if deterministic_mode():
+            return variant_name
+        return f"{variant_name}-{self.batch_id}"
+
+    def build_matrix(self, variants):
+        """Build all variants; returns the batch summary"""
+
+        print("=" * 70)
+        print("ATT TAILSCALE BATCH BUILDER")
+        print("=" * 70)
+
+        started = time.perf_counter()
+        results = {}
+        keys = {}
+
+        # Resolve auth keys up front so a missing key fails before any build
+        for variant in variants:
+            try:
+                keys[variant["name"]] = resolve_auth_key(variant)
+            except MatrixError as e:
+                results[variant["name"]] = {"success": False, "stage": "auth_key", "error": str(e)}
+
+        targets = sorted({(v["platform"], v["arch"]) for v in variants if v["name"] in keys})
+        print(f"[INFO] {len(variants)} variants, {len(targets)} distinct generic builds")
+
+        # Fail platforms fast, before any pool work, if their prerequisites are missing
+        generics = {}
+        if targets:
+            platforms = sorted({platform for platform, _ in targets})
+            arches = sorted({arch for _, arch in targets})
+            report = Preflight(checks_for(platforms, need_auth_key=False, arches=arches)).run()
+            print_report(report)
+            failures = platform_failures(report, platforms, arches)
+            for target in targets:
+                if target[0] in failures:
+                    generics[target] = Exception(failures[target[0]])
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            # Stage 1: one generic build per distinct (platform, arch)
+            futures = {
+                pool.submit(_build_generic, platform, arch,
+                            self.batch_dir / f"generic-{platform}-{arch}.log"): (platform, arch)
+                for platform, arch in targets if (platform, arch) not in generics
+            }
+            for future in as_completed(futures):
+                target = futures[future]
+                try:
+                    generics[target] = future.result()
+                    print(f"[OK] Generic {target[0]}/{target[1]}: {generics[target][0]} "
+                          f"({generics[target][2]:.1f}s)")
+                except Exception as e:
+                    generics[target] = e
+                    print(f"[ERROR] Generic {target[0]}/{target[1]} failed: {e}")
+
+            # Stage 2: stamp every variant concurrently
+            futures = {}
+            for variant in variants:
+                name = variant["name"]
+                if name not in keys:
+                    continue
+                generic = generics[(variant["platform"], variant["arch"])]
+                if isinstance(generic, Exception):
+                    results[name] = {"success": False, "stage": "generic", "error": str(generic)}
+                    print(f"[ERROR] {name}: generic build failed")
+                    continue
+                generic_path, generic_info, _ = generic
+                future = pool.submit(_stamp_variant, variant, keys[name], generic_path,
+                                     generic_info, self.output_name(name),
+                                     self.batch_dir / f"{name}.log")
+                futures[future] = variant
+
+            for future in as_completed(futures):
+                variant = futures[future]
+                name = variant["name"]
+                try:
+                    output_path, build_info, seconds = future.result()
+                    results[name] = {
+                        "success": True,
+                        "platform": variant["platform"],
+                        "arch": variant["arch"],
+                        "tags": variant["tags"],
+                        "path": output_path,
+                        "generic": generics[(variant["platform"], variant["arch"])][0],
+                        "seconds": round(seconds, 3),
+                        "stage_timings": build_info.get("stage_timings", [])[-1:]
+                    }
+                    print(f"[OK] {name}: {output_path}")
+                except Exception as e:
+                    results[name] = {"success": False, "stage": "stamp", "error": str(e)}
+                    print(f"[ERROR] {name}: {e}")
+
+        generic_summary = {
+            f"{platform}/{arch}": (
+                {"success": False, "error": str(result)} if isinstance(result, Exception)
+                else {"success": True, "path": result[0], "cache_key": result[1]["cache_key"],
+                      "seconds": round(result[2], 3),
+                      "stage_timings": result[1].get("stage_timings", [])}
+            )
+            for (platform, arch), result in generics.items()
+        }
+        return self.create_batch_summary(variants, results, generic_summary,
+                                         time.perf_counter() - started)
+
+    def create_batch_summary(self, variants, results, generics, wall_seconds):
+        """Write the single batch summary and print it"""
+        summary_file = self.batch_dir / "batch_summary.json"
+
+        summary = {
+            "batch_id": self.batch_id,
+            "build_time": datetime.now().isoformat(),
+            "wall_seconds": round(wall_seconds, 3),
+            "total_variants": len(variants),
+            "distinct_generic_builds": len(generics),
+            "successful_builds": sum(1 for r in results.values() if r["success"]),
+            "failed_builds": sum(1 for r in results.values() if not r["success"]),
+            "generic_builds": generics,
+            "variants": {v["name"]: results[v["name"]] for v in variants}
+        }
+
+        with open(summary_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        print("\n" + "=" * 70)
+        print("BATCH SUMMARY")
+        print("=" * 70)
+        print(f"Variants: {summary['total_variants']} "
+              f"({summary['distinct_generic_builds']} generic builds)")
+        print(f"Successful: {summary['successful_builds']}")
+        print(f"Failed: {summary['failed_builds']}")
+        print(f"Wall time: {summary['wall_seconds']:.1f}s")
+        print(f"Logs: {self.batch_dir}")
+        print(f"Summary: {summary_file}")
+        print("=" * 70)
+
+        return summary
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build installers for a deployment matrix")
+    parser.add_argument("matrix", help="Matrix JSON file (see batch_matrix.example.json)")
+    parser.add_argument("--arch", dest="arches", action="append",
+                        help="Target arch (repeatable); replaces the matrix's arch axis")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    args = parser.parse_args()
+
+    try:
+        with open(args.matrix, 'r') as f:
+            spec = json.load(f)
+        if args.arches:
+            spec.setdefault("matrix", {})["arch"] = args.arches
+        variants = expand_matrix(spec)
+    except (MatrixError, OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    summary = BatchBuilder(args.workers).build_matrix(variants)
+    return 0 if summary["failed_builds"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+Build stage graph with per-stage caching and timings
+Stages declare their inputs and dependencies; results are cached under the
+build directory by input hash so unchanged stages are skipped on re-run
+"""
+
+import os
+import json
+import shutil
+import time
+import hashlib
+import inspect
+import threading
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CACHE_FORMAT = 1
+# Stage timers running right now, in any thread
+_running = set()
+_running_lock = threading.Lock()
+
+class BuildGraphError(Exception):
+    """Raised for invalid graphs (unknown or cyclic dependencies)"""
+
+def _children_cpu():
+    """CPU seconds used by finished child processes (PyInstaller etc.)"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class StageTimer:
+    """Measure wall time, CPU time (this thread + child processes) and output bytes
+
+    Child process CPU is only known for the whole process, so it is left out
+    (child_cpu False) for a stage that overlapped another timed stage in a
+    different thread: it would include that stage's children too.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.record = {"stage": name, "status": "built"}
+        self.overlapped = False
+
+    def __enter__(self):
+        with _running_lock:
+            for other in _running:
+                other.overlapped = True
+            self.overlapped = bool(_running)
+            _running.add(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        self.children_cpu = _children_cpu()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        cpu = time.thread_time() - self.cpu
+        children_cpu = _children_cpu() - self.children_cpu
+        with _running_lock:
+            _running.discard(self)
+        self.record["wall_seconds"] = round(time.perf_counter() - self.wall, 3)
+        self.record["cpu_seconds"] = round(cpu if self.overlapped else cpu + children_cpu, 3)
+        self.record["child_cpu"] = not self.overlapped
+        self.record.setdefault("bytes", 0)
+        if exc_type is not None:
+            self.record["status"] = "failed"
+            self.record["error"] = str(exc)
+        return False
+
+def path_size(path):
+    """Size of a file, or of all files under a directory"""
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+def hash_path(path):
+    """Content hash of a file or directory tree"""
+    path = Path(path)
+    digest = hashlib.sha256()
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        digest.update(str(file.relative_to(path) if path.is_dir() else file.name).encode('utf-8'))
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_value(value):
+    """Hash a stage input or output value"""
+    if isinstance(value, Path):
+        return hash_path(value) if value.exists() else hashlib.sha256(str(value).encode('utf-8')).hexdigest()
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    if isinstance(value, str):
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+    if isinstance(value, dict):
+        parts = {k: hash_value(v) for k, v in sorted(value.items())}
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+    if isinstance(value, (list, tuple)):
+        return hashlib.sha256("".join(hash_value(v) for v in value).encode('utf-8')).hexdigest()
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _output_paths(value):
+    """Paths referenced by a stage result (the stage's declared outputs)"""
+    if isinstance(value, Path):
+        return [value]
+    if isinstance(value, dict):
+        return [v for v in value.values() if isinstance(v, Path)]
+    return []
+
+def _output_bytes(value):
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, Path):
+        return path_size(value) if value.exists() else 0
+    if isinstance(value, dict):
+        return sum(_output_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_output_bytes(v) for v in value)
+    return 0
+
+def _source_hash(func):
+    """Hash of a stage function's source so code changes invalidate its cache"""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = getattr(func, "__qualname__", repr(func))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+class Stage:
+    def __init__(self, name, func, deps=None, inputs=None, cache=True, max_age=None, pass_key=False):
+        self.name = name
+        self.func = func
+        # deps maps the func's keyword argument to the stage that provides it
+        self.deps = dict(deps or {})
+        self.inputs = dict(inputs or {})
+        self.cache = cache
+        self.max_age = max_age
+        self.pass_key = pass_key
+
+class BuildGraph:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.stages = {}
+        self.timings = []
+        self._digests = {}
+        self._values = {}
+        self._keys = {}
+
+    def add(self, name, func, deps=None, inputs=None, cache=True, max_age=None, pass_key=False):
+        """Add a stage; func is called with its deps (and cache_key if pass_key)"""
+        if name in self.stages:
+            raise BuildGraphError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, func, deps, inputs, cache, max_age, pass_key)
+        return self
+
+    def order(self, targets=None):
+        """Stages needed for targets, dependencies first"""
+        ordered, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name not in self.stages:
+                raise BuildGraphError(f"Unknown stage: {name}")
+            if name in visiting:
+                raise BuildGraphError(f"Dependency cycle at stage: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps.values():
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return ordered
+
+    def cache_key(self, stage):
+        """Hash of the stage's code, inputs and dependency outputs"""
+        digest = hashlib.sha256(f"{CACHE_FORMAT}:{stage.name}".encode('utf-8'))
+        digest.update(_source_hash(stage.func).encode('utf-8'))
+        for name, value in sorted(stage.inputs.items()):
+            digest.update(f"{name}={hash_value(value)}".encode('utf-8'))
+        for arg, dep in sorted(stage.deps.items()):
+            digest.update(f"{arg}<-{self._digests[dep]}".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _meta_file(self, stage, key):
+        return self.cache_dir / stage.name / f"{key}.json"
+
+    def _load_cached(self, stage, key):
+        """Cache metadata if the entry is present, fresh and its outputs are intact"""
+        meta_file = self._meta_file(stage, key)
+        if not stage.cache or not meta_file.exists():
+            return None
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if stage.max_age is not None and time.time() - meta["created"] > stage.max_age:
+            return None
+        for output in meta["outputs"]:
+            path = Path(output["path"])
+            if not path.exists() or path.stat().st_mtime_ns != output["mtime_ns"]:
+                return None
+        if meta["type"] == "bytes" and not meta_file.with_suffix(".bin").exists():
+            return None
+        return meta
+
+    def _store(self, stage, key, value, digest):
+        """Write a stage result to the cache (atomically)
+
+        Part files are per process: concurrent per-arch builds share stages
+        such as the agent executable and may store the same key at once.
+        """
+        meta_file = self._meta_file(stage, key)
+        meta_file.parent.mkdir(parents=True, exist_ok=True)
+
+        if isinstance(value, bytes):
+            meta = {"type": "bytes"}
+            part = meta_file.with_suffix(f".bin.{os.getpid()}.part")
+            part.write_bytes(value)
+            os.replace(part, meta_file.with_suffix(".bin"))
+        elif isinstance(value, Path):
+            meta = {"type": "path", "value": str(value)}
+        elif isinstance(value, dict):
+            meta = {
+                "type": "json",
+                "value": {k: str(v) if isinstance(v, Path) else v for k, v in value.items()},
+                "paths": sorted(k for k, v in value.items() if isinstance(v, Path))
+            }
+        else:
+            meta = {"type": "text" if isinstance(value, str) else "value", "value": value}
+
+        meta.update({
+            "stage": stage.name,
+            "key": key,
+            "digest": digest,
+            # Cache entries this one was built from, so cache GC can keep them together
+            "deps": {dep: self._keys[dep] for dep in sorted(set(stage.deps.values()))},
+            "created": time.time(),
+            "bytes": _output_bytes(value),
+            "outputs": [{"path": str(p), "mtime_ns": p.stat().st_mtime_ns}
+                        for p in _output_paths(value) if p.exists()]
+        })
+        part = meta_file.with_suffix(f".json.{os.getpid()}.part")
+        with open(part, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(part, meta_file)
+
+    def _decode(self, stage, key, meta):
+        """Load a cached stage result"""
+        if meta["type"] == "bytes":
+            return self._meta_file(stage, key).with_suffix(".bin").read_bytes()
+        if meta["type"] == "path":
+            return Path(meta["value"])
+        if meta["type"] == "json":
+            return {k: Path(v) if k in meta["paths"] else v for k, v in meta["value"].items()}
+        return meta["value"]
+
+    def value(self, name):
+        """Result of a stage that has run (cached results load lazily)"""
+        value = self._values[name]
+        if callable(value):
+            value = self._values[name] = value()
+        return value
+
+    def run(self, targets=None):
+        """Run the graph; returns {stage: result} for the targets
+
+        Results of completed stages stay cached when a later stage fails, so
+        a re-run resumes from the failed stage.
+        """
+        self.timings = []
+        for name in self.order(targets):
+            stage = self.stages[name]
+            key = self._keys[name] = self.cache_key(stage)
+            meta = self._load_cached(stage, key)
+
+            if meta is not None:
+                self._digests[name] = meta["digest"]
+                self._values[name] = lambda stage=stage, key=key, meta=meta: self._decode(stage, key, meta)
+                self.timings.append({"stage": name, "status": "cached", "wall_seconds": 0.0,
+                                     "cpu_seconds": 0.0, "bytes": meta["bytes"]})
+                print(f"[CACHE] {name}: unchanged ({key})")
+                continue
+
+            kwargs = {arg: self.value(dep) for arg, dep in stage.deps.items()}
+            if stage.pass_key:
+                kwargs["cache_key"] = key
+
+            timer = StageTimer(name)
+            try:
+                with timer:
+                    value = stage.func(**kwargs)
+                    timer.record["bytes"] = _output_bytes(value)
+            finally:
+                self.timings.append(timer.record)
+
+            digest = hash_value(value)
+            self._digests[name] = digest
+            self._values[name] = value
+            if stage.cache:
+                self._store(stage, key, value, digest)
+
+        return {name: self.value(name) for name in (targets or self.stages)}
+
+def prune_cache(cache_dir, live_paths, cutoff):
+    """Remove stage cache entries not needed for any of live_paths
+
+    Entries whose outputs include a live path are kept, together with the
+    entries they were built from; so are entries written after cutoff (a
+    build may be using them right now). Returns (entries removed, bytes freed).
+    """
+    cache_dir = Path(cache_dir)
+    live_paths = {Path(p).resolve() for p in live_paths}
+    entries = {}
+    for meta_file in cache_dir.glob("*/*.json"):
+        try:
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            entries[(meta["stage"], meta["key"])] = (meta_file, meta)
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+
+    def outputs(meta):
+        return {Path(o["path"]).resolve() for o in meta.get("outputs", [])}
+
+    pending = [k for k, (meta_file, meta) in entries.items()
+               if outputs(meta) & live_paths or meta_file.stat().st_mtime > cutoff]
+    live = set()
+    while pending:
+        entry = pending.pop()
+        if entry in live or entry not in entries:
+            continue
+        live.add(entry)
+        pending.extend(entries[entry][1].get("deps", {}).items())
+
+    live_outputs = set().union(*(outputs(entries[k][1]) for k in live)) if live else set()
+    removed = freed = 0
+    cache_root = cache_dir.resolve()
+    for entry, (meta_file, meta) in entries.items():
+        if entry in live:
+            continue
+        # Outputs kept inside the cache (bundles) go with the entry; others belong to the builders
+        for path in outputs(meta) - live_outputs:
+            if cache_root in path.parents and path.exists():
+                freed += path_size(path)
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+        for path in (meta_file.with_suffix(".bin"), meta_file):
+            if path.exists():
+                freed += path.stat().st_size
+                path.unlink()
+        removed += 1
+    return removed, freed
+
+def format_timings(timings):
+    """Render stage timings as a table"""
+    lines = [f"{'stage':<28} {'status':<7} {'wall s':>8} {'cpu s':>8} {'MB':>9}"]
+    for t in timings:
+        mark = " " if t.get("child_cpu", True) else "*"
+        lines.append(f"{t['stage']:<28} {t['status']:<7} {t['wall_seconds']:>8.3f} "
+                     f"{t['cpu_seconds']:>7.3f}{mark} {t['bytes'] / (1024 * 1024):>9.2f}")
+    if any(not t.get("child_cpu", True) for t in timings):
+        lines.append("* ran alongside other stages: CPU of this thread only, child processes not counted")
+    return "\n".join(lines)
@@ -0,0 +1,319 @@
+"""
+Local ATT Tailscale build service
+Long-running daemon with a small HTTP/JSON API: jobs are queued and built by a
+bounded worker pool that shares the warm stage cache in builds/.cache
+"""
+
+import sys
+import json
+import uuid
+import queue
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).parent))
+from batch_builder import PLATFORMS, MatrixError, expand_matrix, resolve_auth_key
+from arches import PLATFORM_ARCHES
+from multi_platform_builder import PlatformOutput
+from reproducible import make_tarball
+from artifact_store import ArtifactStore, ArtifactStoreError
+from key_pool import start_refiller
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+MAX_QUEUED_JOBS = 100
+MAX_REQUEST_BYTES = 64 * 1024
+
+# Job fields returned by the API (never the auth key)
+PUBLIC_FIELDS = ("id", "status", "platform", "arch", "tags", "check_interval", "created",
+                 "started", "finished", "artifact", "error")
+
+class BuildService:
+    def __init__(self, workers=DEFAULT_WORKERS, max_queued=MAX_QUEUED_JOBS):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        # Generic builds are shared, so only one worker builds each platform at a time
+        self.generic_locks = {(platform, arch): threading.Lock()
+                              for platform in PLATFORMS for arch in PLATFORM_ARCHES[platform]}
+        self.archive_lock = threading.Lock()
+        self.threads = []
+        self.output = None
+
+    def start(self):
+        """Start the worker pool"""
+        self.output = PlatformOutput(sys.stdout)
+        sys.stdout = self.output
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"build-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Let running jobs finish, then stop the workers"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.output is not None:
+            sys.stdout = self.output.stream
+            self.output = None
+
+    def submit(self, spec):
+        """Validate and queue a job spec; returns the public job record"""
+        if not isinstance(spec, dict):
+            raise MatrixError("Job must be a JSON object")
+        spec = {k: v for k, v in spec.items() if k != "name"}
+        variant = expand_matrix({"include": [spec]})[0]
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "platform": variant["platform"],
+            "arch": variant["arch"],
+            "tags": variant["tags"],
+            "check_interval": variant["check_interval"],
+            "created": datetime.now().isoformat(),
+            "started": None,
+            "finished": None,
+            "artifact": None,
+            "error": None,
+            "variant": variant,
+            "build_info": None,
+            "done": threading.Event()
+        }
+        with self.jobs_lock:
+            try:
+                self.queue.put_nowait(job_id)
+            except queue.Full:
+                raise OverflowError("Build queue is full")
+            self.jobs[job_id] = job
+        return self.public(job)
+
+    def public(self, job):
+        return {field: job[field] for field in PUBLIC_FIELDS}
+
+    def get(self, job_id):
+        with self.jobs_lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.jobs_lock:
+            return [self.public(job) for job in self.jobs.values()]
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job has finished (for tests and scripted callers)"""
+        job = self.get(job_id)
+        job["done"].wait(timeout)
+        return self.public(job)
+
+    def generic_build(self, platform, arch):
+        """Generic installer for a platform and arch
+
+        Served from the stage cache after the first job, which still checks
+        its inputs so source changes on disk are picked up.
+        """
+        builder_class, generic_method, _ = PLATFORMS[platform]
+        with self.generic_locks[(platform, arch)]:
+            return getattr(builder_class(arch), generic_method)()
+
+    def run_job(self, job):
+        """Build one job: shared generic build, then the per-job stamp"""
+        variant = job["variant"]
+        auth_key = resolve_auth_key(variant)
+        generic_path, generic_info = self.generic_build(variant["platform"], variant["arch"])
+
+        builder_class, _, stamp_method = PLATFORMS[variant["platform"]]
+        output_path, build_info = getattr(builder_class(variant["arch"]), stamp_method)(
+            Path(generic_path), generic_info, auth_key,
+            variant["tags"], variant["check_interval"], f"service-{job['id']}"
+        )
+        return Path(output_path), build_info
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            if job_id is None:
+                return
+
+            job = self.get(job_id)
+            job["status"] = "running"
+            job["started"] = datetime.now().isoformat()
+            self.output.set_label(f"job {job_id}")
+            try:
+                output_path, build_info = self.run_job(job)
+                job["artifact"] = str(output_path)
+                job["build_info"] = build_info
+                job["status"] = "succeeded"
+                print(f"[OK] Built {output_path}")
+            except Exception as e:
+                job["error"] = str(e)
+                job["status"] = "failed"
+                print(f"[ERROR] Build failed: {e}")
+            finally:
+                job["finished"] = datetime.now().isoformat()
+                job["done"].set()
+                self.output.flush()
+                self.output.set_label(None)
+
+    def artifact_file(self, job):
+        """File to serve for a finished job (Linux packages are served as .tar.gz)"""
+        artifact = Path(job["artifact"])
+        with self.archive_lock:
+            if not artifact.exists():
+                # Checkout removed by artifact store GC; restore it
+                store = ArtifactStore()
+                store.materialize(store.manifest(job["build_info"]["artifact_id"]), artifact)
+            if artifact.is_file():
+                return artifact
+            archive = artifact.with_name(artifact.name + ".tar.gz")
+            if not archive.exists():
+                make_tarball(artifact, archive)
+        return archive
+
+class BuildRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ATTBuildService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body):
+        data = json.dumps(body, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": message})
+
+    def finished_job(self, job_id):
+        job = self.service.get(job_id)
+        if job is None:
+            self.send_error_json(404, f"Unknown job: {job_id}")
+            return None
+        if job["status"] != "succeeded":
+            self.send_error_json(409, f"Job is {job['status']}")
+            return None
+        return job
+
+    def do_GET(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+
+        if parts == ["health"]:
+            self.send_json(200, {
+                "status": "ok",
+                "workers": self.service.workers,
+                "queued": self.service.queue.qsize()
+            })
+        elif parts == ["builds"]:
+            self.send_json(200, {"jobs": self.service.list_jobs()})
+        elif len(parts) == 2 and parts[0] == "builds":
+            job = self.service.get(parts[1])
+            if job is None:
+                self.send_error_json(404, f"Unknown job: {parts[1]}")
+            else:
+                self.send_json(200, self.service.public(job))
+        elif len(parts) == 3 and parts[0] == "builds" and parts[2] == "build_info":
+            job = self.finished_job(parts[1])
+            if job is not None:
+                self.send_json(200, job["build_info"])
+        elif len(parts) == 3 and parts[0] == "builds" and parts[2] == "artifact":
+            job = self.finished_job(parts[1])
+            if job is None:
+                return
+            try:
+                artifact = self.service.artifact_file(job)
+            except ArtifactStoreError as e:
+                # Checkout and stored build both garbage-collected
+                self.send_error_json(410, f"Artifact is no longer available: {e}")
+                return
+            self.send_file(artifact)
+        else:
+            self.send_error_json(404, f"Not found: {self.path}")
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/builds":
+            self.send_error_json(404, f"Not found: {self.path}")
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.send_error_json(413, "Request too large")
+            return
+        try:
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            job = self.service.submit(spec)
+        except (ValueError, MatrixError) as e:
+            self.send_error_json(400, str(e))
+            return
+        except OverflowError as e:
+            self.send_error_json(503, str(e))
+            return
+
+        job["url"] = f"/builds/{job['id']}"
+        self.send_json(202, job)
+
+    def send_file(self, path):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.send_header("Content-Disposition", f'attachment; filename="{path.name}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """HTTP server bound to the service (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), BuildRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the local build service")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    service = BuildService(args.workers)
+    server = create_server(service, args.host, args.port, args.verbose)
+    service.start()
+    refiller = start_refiller()
+    if refiller:
+        print(f"[INFO] Key pool refiller running for {refiller.pool.root}")
+    print(f"[OK] Build service listening on http://{args.host}:{server.server_address[1]} "
+          f"({args.workers} workers)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Shutting down...")
+    finally:
+        server.server_close()
+        service.stop()
+        if refiller:
+            refiller.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
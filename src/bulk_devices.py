@@ -0,0 +1,369 @@
+"""
+Bulk device operations
+Deletes, re-tags, authorizes or expires every device matching a selector
+(tags, lastSeen age, hostname pattern, or stale duplicates of a hostname
+left behind by re-imaged machines). A plan is computed first and shown as a
+dry run; applying it runs the operations through a bounded worker pool under
+an ops/s budget, appends a result per device to an NDJSON log, and a re-run
+resumes from the saved plan and log
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import fnmatch
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError, NotFoundError, CircuitOpenError
+from rate_limit import TokenBucket
+from bulk_keys import ResultLog, read_results
+from device_inventory import parse_time
+
+DEFAULT_CONCURRENCY = 8
+# Operations per second across all workers (on top of the client's own limiter)
+DEFAULT_RATE = 10
+DEFAULT_LOG = "device_ops.ndjson"
+ACTIONS = ("delete", "tag", "authorize", "expire")
+
+class SelectorError(Exception):
+    """Raised for a selector that would match every device, or a bad action"""
+
+class Selector:
+    """Devices matching every given criterion"""
+    def __init__(self, tags=(), offline_days=None, hostname=None, device_ids=(), duplicates=False, now=None):
+        self.tags = set(tags)
+        self.offline_days = offline_days
+        self.hostname = hostname.lower() if hostname else None
+        self.device_ids = set(device_ids)
+        self.duplicates = duplicates
+        self.now = now
+        if not (self.tags or offline_days is not None or hostname or self.device_ids or duplicates):
+            raise SelectorError("Selector matches every device; give a tag, age, hostname, id or --duplicates")
+
+    def spec(self):
+        """Constructor arguments, JSON-ready (saved with a plan checkpoint)"""
+        return {"tags": sorted(self.tags), "offline_days": self.offline_days, "hostname": self.hostname,
+                "device_ids": sorted(self.device_ids), "duplicates": self.duplicates}
+
+    def describe(self):
+        parts = [f"tag {t}" for t in sorted(self.tags)]
+        if self.offline_days is not None:
+            parts.append(f"offline > {self.offline_days:g} days")
+        if self.hostname:
+            parts.append(f"hostname {self.hostname}")
+        if self.device_ids:
+            parts.append(f"{len(self.device_ids)} ids")
+        if self.duplicates:
+            parts.append("stale duplicates")
+        return ", ".join(parts)
+
+    def match(self, device):
+        if self.device_ids and device["id"] not in self.device_ids:
+            return False
+        if self.tags and not self.tags & set(device.get("tags") or ()):
+            return False
+        if self.hostname and not fnmatch.fnmatchcase((device.get("hostname") or "").lower(), self.hostname):
+            return False
+        if self.offline_days is not None:
+            last_seen = parse_time(device.get("lastSeen"))
+            cutoff = (self.now or time.time()) - self.offline_days * 86400
+            if last_seen is None or last_seen >= cutoff:
+                return False
+        return True
+
+    def select(self, devices):
+        """Matching devices; with duplicates, all but the most recently seen device per hostname"""
+        devices = list(devices)
+        if self.duplicates:
+            newest = {}
+            for device in devices:
+                key = (device.get("hostname") or "").lower()
+                seen = parse_time(device.get("lastSeen")) or 0
+                if key not in newest or seen > newest[key][0]:
+                    newest[key] = (seen, device["id"])
+            keep = {device_id for _, device_id in newest.values()}
+            devices = [d for d in devices if d["id"] not in keep]
+        return [d for d in devices if self.match(d)]
+
+def needs_change(device, action, args):
+    """False when the device is already in the wanted state"""
+    if action == "tag":
+        return sorted(device.get("tags") or ()) != sorted(args["tags"])
+    if action == "authorize":
+        return device.get("authorized") is not True
+    return True
+
+def make_plan(devices, selector, action, args=None):
+    """Operations for the selected devices that would change something"""
+    if action not in ACTIONS:
+        raise SelectorError(f"Unknown action: {action} (use {', '.join(ACTIONS)})")
+    args = args or {}
+    if action == "tag" and not args.get("tags"):
+        raise SelectorError("The tag action needs tags")
+    suffix = f":{','.join(sorted(args['tags']))}" if action == "tag" else ""
+    return [{"op_id": f"{action}:{device['id']}{suffix}", "device_id": device["id"],
+             "hostname": device.get("hostname"), "lastSeen": device.get("lastSeen"), "action": action, "args": args}
+            for device in selector.select(devices) if needs_change(device, action, args)]
+
+async def plan_operations(api, selector, action, args=None):
+    """Plan from the tailnet's current device list (streamed, only the fields needed are kept)"""
+    fields = ("id", "hostname", "lastSeen", "tags", "authorized")
+    devices = [{f: device.get(f) for f in fields} async for device in api.iter_devices()]
+    return make_plan(devices, selector, action, args)
+
+async def run_operation(api, op):
+    if op["action"] == "delete":
+        await api.delete_device(op["device_id"])
+    elif op["action"] == "tag":
+        await api.set_device_tags(op["device_id"], op["args"]["tags"])
+    elif op["action"] == "authorize":
+        await api.authorize_device(op["device_id"])
+    elif op["action"] == "expire":
+        await api.expire_device(op["device_id"])
+
+def save_plan(plan, path):
+    path = Path(path)
+    part = path.with_name(path.name + ".part")
+    part.write_text(json.dumps(plan, indent=1))
+    os.replace(part, path)
+
+def load_plan(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def plan_path(log):
+    """Plan checkpoint kept next to a result log"""
+    return Path(f"{log}.plan.json")
+
+def finish_run(log):
+    """Archive a completed run's log and drop its checkpoint; returns the archived log
+
+    Done operations are skipped by op_id, so a log left in place would turn
+    the next run of the same command into a no-op.
+    """
+    log = Path(log)
+    plan_path(log).unlink(missing_ok=True)
+    if not log.exists():
+        return None
+    archived = log.with_name(f"{log.name}.{time.strftime('%Y%m%d-%H%M%S')}")
+    suffix = 1
+    while archived.exists():
+        archived = log.with_name(f"{log.name}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}")
+        suffix += 1
+    os.replace(log, archived)
+    return archived
+
+def describe_command(command):
+    if "plan" in command:
+        return f"{command['action']} from plan {command['plan']}"
+    tags = f" {','.join(command['args']['tags'])}" if command["args"].get("tags") else ""
+    return f"{command['action']}{tags} on {Selector(**command['selector']).describe()}"
+
+def save_checkpoint(plan, path, command):
+    """The frozen plan, with the action and selector it was made for"""
+    save_plan({"command": command, "operations": plan}, path)
+
+def checkpoint_plan(path, command):
+    """The saved plan when path holds one for this command, None when there is none
+
+    A checkpoint left by a different command is refused rather than applied:
+    resuming it would act on devices the current command did not select.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    saved = load_plan(path)
+    saved_command = saved.get("command") if isinstance(saved, dict) else None
+    if saved_command != json.loads(json.dumps(command)):
+        previous = describe_command(saved_command) if saved_command else "an unknown command"
+        raise SelectorError(f"{path} holds an unfinished plan for {previous}; re-run that command "
+                            f"to finish it, or delete the file to start over")
+    return saved["operations"]
+
+async def apply_plan(api, plan, log_path=DEFAULT_LOG, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                     progress=None):
+    """Run every operation of plan not yet recorded as done in log_path; returns a summary"""
+    started = time.perf_counter()
+    previous = read_results(log_path, key="op_id")
+    todo = [op for op in plan if previous.get(op["op_id"], {}).get("status") != "ok"]
+    summary = {"planned": len(plan), "skipped": len(plan) - len(todo), "done": 0, "failed": 0}
+    budget = TokenBucket(rate, max(1, int(rate))) if rate else None
+
+    log = ResultLog(log_path)
+    try:
+        queue = asyncio.Queue()
+        for op in todo:
+            queue.put_nowait(op)
+
+        async def worker():
+            while not queue.empty():
+                op = queue.get_nowait()
+                record = {"op_id": op["op_id"], "device_id": op["device_id"], "hostname": op["hostname"],
+                          "action": op["action"]}
+                if budget is not None:
+                    await budget.acquire()
+                try:
+                    await run_operation(api, op)
+                except NotFoundError:
+                    # Deleted meanwhile (e.g. by an interrupted earlier run): nothing left to do
+                    if op["action"] == "delete":
+                        log.write({**record, "status": "ok", "note": "already deleted"})
+                        summary["done"] += 1
+                    else:
+                        log.write({**record, "status": "error", "error": "device not found"})
+                        summary["failed"] += 1
+                except CircuitOpenError:
+                    # Leave the rest for the next run
+                    log.write({**record, "status": "error", "error": "circuit open"})
+                    summary["failed"] += 1
+                    while not queue.empty():
+                        queue.get_nowait()
+                    return
+                except TailscaleAPIError as e:
+                    log.write({**record, "status": "error", "error": str(e)})
+                    summary["failed"] += 1
+                else:
+                    log.write({**record, "status": "ok"})
+                    summary["done"] += 1
+                if progress:
+                    progress(summary)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        log.close()
+
+    summary["remaining"] = len(todo) - summary["done"] - summary["failed"]
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["ops_per_second"] = round(summary["done"] / summary["seconds"], 1) if summary["seconds"] else 0
+    return summary
+
+def print_plan(plan, selector, limit=20):
+    print(f"[INFO] {len(plan)} devices selected ({selector.describe()})")
+    for op in plan[:limit]:
+        print(f"   {op['action']:<9} {op['device_id']:<20} {op['hostname'] or '':<30} last seen {op['lastSeen']}")
+    if len(plan) > limit:
+        print(f"   ... and {len(plan) - limit} more")
+
+async def _bench(devices, concurrency, latency, rate, log):
+    from mock_tailscale_api import MockTailscaleAPI, running
+
+    mock = MockTailscaleAPI(devices=devices, latency=latency)
+    with running(mock) as base_url:
+        async with TailscaleAPI(base_url=base_url, client_id="bench", client_secret="bench", rate=0) as api:
+            plan = await plan_operations(api, Selector(tags=["tag:kiosk"]), "expire")
+            return await apply_plan(api, plan, log, concurrency, rate)
+
+def benchmark(devices=1500, concurrency=(1, 8, 32), latency=0.02, rate=0, output_dir="temp"):
+    """Expire the tag:kiosk third of a mock tailnet per concurrency level"""
+    rows = []
+    for level in concurrency:
+        log = Path(output_dir) / f"bench-device-ops-{os.getpid()}-{level}.ndjson"
+        try:
+            rows.append({"concurrency": level, **asyncio.run(_bench(devices, level, latency, rate, log))})
+        finally:
+            log.unlink(missing_ok=True)
+    return rows
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply an operation to every device matching a selector")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("plan", "Show what would change (dry run)"),
+                            ("apply", "Apply the operation (dry run without --yes; resumable)")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--action", choices=ACTIONS, required=True)
+        cmd.add_argument("--set-tags", default="", help="For --action tag: comma-separated tags to set")
+        cmd.add_argument("--tag", action="append", default=[], help="Select devices with this tag")
+        cmd.add_argument("--offline-days", type=float, help="Select devices not seen for more than N days")
+        cmd.add_argument("--hostname", help="Select hostnames matching a glob, e.g. 'laptop-*'")
+        cmd.add_argument("--id", action="append", default=[], help="Select a device id")
+        cmd.add_argument("--duplicates", action="store_true",
+                         help="Select all but the most recently seen device of each hostname")
+        cmd.add_argument("--out", help="Write the plan to this JSON file")
+    apply = sub.choices["apply"]
+    apply.add_argument("--yes", action="store_true", help="Really apply the plan")
+    apply.add_argument("--plan", help="Apply a plan file instead of selecting devices now")
+    apply.add_argument("--log", default=DEFAULT_LOG, help="NDJSON result log (resumed if present)")
+    apply.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    apply.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Operations per second (0: unlimited)")
+    bench = sub.add_parser("bench", help="Operations/s per concurrency level against a local mock")
+    bench.add_argument("--devices", type=int, default=1500)
+    bench.add_argument("--concurrency", default="1,8,32", help="Comma-separated worker counts")
+    bench.add_argument("--latency", type=float, default=0.02, help="Mock API seconds per request")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(f"{'workers':>7} {'ops':>6} {'seconds':>8} {'ops/s':>8}")
+        for row in benchmark(args.devices, [int(c) for c in args.concurrency.split(",")], args.latency):
+            print(f"{row['concurrency']:>7} {row['done']:>6} {row['seconds']:>8} {row['ops_per_second']:>8}")
+        return 0
+
+    action_args = {"tags": [t for t in args.set_tags.split(",") if t]} if args.action == "tag" else {}
+    checkpoint = plan_path(args.log) if args.command == "apply" else None
+
+    async def run():
+        async with TailscaleAPI() as api:
+            selector = plan = None
+            if args.command == "apply" and args.plan:
+                command = {"action": args.action, "plan": str(Path(args.plan).resolve())}
+            else:
+                selector = Selector(args.tag, args.offline_days, args.hostname, args.id, args.duplicates)
+                command = {"action": args.action, "args": action_args, "selector": selector.spec()}
+            if checkpoint is not None:
+                plan = checkpoint_plan(checkpoint, command)
+                if plan is not None:
+                    selector = None
+                    print(f"[INFO] Resuming plan {checkpoint} ({len(plan)} operations)")
+                elif args.plan:
+                    plan = load_plan(args.plan)
+                    if any(op["action"] != args.action for op in plan):
+                        raise SelectorError(f"{args.plan} is not a plan for --action {args.action}")
+                    print(f"[INFO] Using plan {args.plan} ({len(plan)} operations)")
+            if plan is None:
+                plan = await plan_operations(api, selector, args.action, action_args)
+            if selector is not None:
+                print_plan(plan, selector)
+            if args.out:
+                save_plan(plan, args.out)
+                print(f"[OK] Plan written to {args.out}")
+            if args.command == "plan" or not args.yes:
+                if args.command == "apply":
+                    print("[INFO] Dry run; add --yes to apply")
+                return None
+            # The frozen plan is the checkpoint: a resumed run works on the same devices
+            if not checkpoint.exists():
+                save_checkpoint(plan, checkpoint, command)
+
+            def progress(summary):
+                done = summary["skipped"] + summary["done"] + summary["failed"]
+                print(f"\r[INFO] {done}/{summary['planned']} ({summary['failed']} failed)", end="", flush=True)
+
+            summary = await apply_plan(api, plan, args.log, args.concurrency, args.rate, progress)
+            print()
+            return summary
+
+    try:
+        summary = asyncio.run(run())
+    except (SelectorError, TailscaleAPIError, OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if summary is None:
+        return 0
+
+    print(f"[OK] {summary['done']} done ({summary['skipped']} already done) in {summary['seconds']}s "
+          f"-> {args.log}")
+    if summary["failed"] or summary["remaining"]:
+        print(f"[ERROR] {summary['failed']} failed, {summary['remaining']} not attempted; "
+              f"re-run the same command to finish")
+        return 1
+    # Finished: the next run with this log plans afresh
+    print(f"[INFO] Run complete; log archived as {finish_run(args.log)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
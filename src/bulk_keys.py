@@ -0,0 +1,280 @@
+"""
+Bulk auth key minting
+Mints many auth keys (per department, build or CI runner) through a bounded
+worker pool on one TailscaleAPI client. Results stream to an NDJSON file as
+they complete; a re-run resumes from it without minting duplicates: a key
+whose result was never recorded is found by the marker in its description
+and revoked before minting again
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError, CircuitOpenError
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_OUTPUT = "keys.ndjson"
+# The API limits key descriptions to 50 characters, marker included
+MAX_DESCRIPTION = 50
+KEY_FIELDS = ("tags", "expires_days", "description", "reusable", "ephemeral", "preauthorized")
+KEY_DEFAULTS = {"tags": ["tag:employee"], "expires_days": 90, "description": "Standalone deployment",
+                "reusable": True, "ephemeral": False, "preauthorized": True}
+
+class SpecError(Exception):
+    """Raised for an invalid key spec"""
+
+def marker(request_id):
+    """Short tag in the key description that ties a key to its request"""
+    return "bk:" + hashlib.sha256(request_id.encode('utf-8')).hexdigest()[:10]
+
+def key_description(request):
+    tag = marker(request["request_id"])
+    return f"{request['description'][:MAX_DESCRIPTION - len(tag) - 1]} {tag}".lstrip()
+
+def expand_spec(spec):
+    """Key requests from a spec: a list of items, or {"defaults": {...}, "keys": [...]}
+
+    Each item has an id (stable across runs, so resume can match it) and
+    optional count; item i of a count > 1 gets request id "<id>-<i>".
+    """
+    if isinstance(spec, dict):
+        defaults, items = spec.get("defaults", {}), spec.get("keys", [])
+    else:
+        defaults, items = {}, spec
+    requests, seen = [], set()
+    for item in items:
+        item = {**defaults, **item}
+        if not item.get("id"):
+            raise SpecError(f"Key spec item without an id: {item}")
+        unknown = set(item) - set(KEY_FIELDS) - {"id", "count"}
+        if unknown:
+            raise SpecError(f"Unknown key spec fields: {', '.join(sorted(unknown))}")
+        count = int(item.get("count", 1))
+        ids = [str(item["id"])] if count == 1 else [f"{item['id']}-{i}" for i in range(1, count + 1)]
+        for request_id in ids:
+            if request_id in seen:
+                raise SpecError(f"Duplicate key request id: {request_id}")
+            seen.add(request_id)
+            request = {field: item.get(field, KEY_DEFAULTS[field]) for field in KEY_FIELDS}
+            request["request_id"] = request_id
+            requests.append(request)
+    return requests
+
+def load_spec(path):
+    with open(path, 'r') as f:
+        return expand_spec(json.load(f))
+
+def read_results(path, key="request_id"):
+    """Last recorded result per request id (a torn final line is ignored)"""
+    results = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                results[record[key]] = record
+    except FileNotFoundError:
+        pass
+    return results
+
+class ResultLog:
+    """Append-only NDJSON result file (holds key secrets: mode 600)"""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self.file = os.fdopen(fd, 'a')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+async def reconcile(api, pending, log, concurrency=DEFAULT_CONCURRENCY):
+    """Revoke keys minted for requests whose result was never recorded (or recorded as an error)"""
+    markers = {marker(request_id): request_id for request_id in pending}
+    key_ids = [key["id"] for key in (await api.list_auth_keys()).get("keys", [])]
+    semaphore = asyncio.Semaphore(concurrency)
+    revoked = 0
+
+    async def check(key_id):
+        nonlocal revoked
+        async with semaphore:
+            key = await api.get_auth_key(key_id)
+            tag = (key.get("description") or "").rsplit(" ", 1)[-1]
+            if tag in markers:
+                await api.delete_auth_key(key_id)
+                log.write({"request_id": markers[tag], "status": "revoked", "key_id": key_id})
+                revoked += 1
+
+    await asyncio.gather(*(check(key_id) for key_id in key_ids))
+    return revoked
+
+async def mint_keys(api, requests, output=DEFAULT_OUTPUT, concurrency=DEFAULT_CONCURRENCY, progress=None):
+    """Mint every request not yet recorded as minted in output; returns a summary"""
+    started = time.perf_counter()
+    previous = read_results(output)
+    todo = [r for r in requests if previous.get(r["request_id"], {}).get("status") != "ok"]
+    # A failed create may still have minted the key (timeout, 5xx, dropped response)
+    pending = [r["request_id"] for r in todo
+               if previous.get(r["request_id"], {}).get("status") in ("pending", "error")]
+    summary = {"requested": len(requests), "skipped": len(requests) - len(todo),
+               "minted": 0, "failed": 0, "revoked": 0}
+
+    log = ResultLog(output)
+    try:
+        if pending:
+            summary["revoked"] = await reconcile(api, pending, log, concurrency)
+
+        queue = asyncio.Queue()
+        for request in todo:
+            queue.put_nowait(request)
+
+        async def worker():
+            while not queue.empty():
+                request = queue.get_nowait()
+                request_id = request["request_id"]
+                # Recorded before the call, so a crash mid-call is reconciled on resume
+                log.write({"request_id": request_id, "status": "pending"})
+                try:
+                    key = await api.create_auth_key(
+                        reusable=request["reusable"], ephemeral=request["ephemeral"],
+                        preauthorized=request["preauthorized"], tags=request["tags"],
+                        expires_days=request["expires_days"], description=key_description(request))
+                except CircuitOpenError:
+                    # Leave the rest queued for the next run
+                    log.write({"request_id": request_id, "status": "error", "error": "circuit open"})
+                    summary["failed"] += 1
+                    while not queue.empty():
+                        queue.get_nowait()
+                    return
+                except TailscaleAPIError as e:
+                    log.write({"request_id": request_id, "status": "error", "error": str(e)})
+                    summary["failed"] += 1
+                else:
+                    log.write({"request_id": request_id, "status": "ok", "key_id": key["id"],
+                               "key": key["key"], "expires": key.get("expires"), "tags": request["tags"]})
+                    summary["minted"] += 1
+                if progress:
+                    progress(summary)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        log.close()
+
+    summary["remaining"] = len(todo) - summary["minted"] - summary["failed"]
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["keys_per_second"] = round(summary["minted"] / summary["seconds"], 1) if summary["seconds"] else 0
+    return summary
+
+async def _bench(count, concurrency, server_rate, client_rate, latency, output):
+    from mock_tailscale_api import MockTailscaleAPI, running
+
+    mock = MockTailscaleAPI(rate_limit=server_rate, burst=max(1, int(server_rate / 10)), latency=latency)
+    requests = expand_spec([{"id": "bench", "count": count, "tags": ["tag:ci"], "expires_days": 1}])
+    with running(mock) as base_url:
+        async with TailscaleAPI(base_url=base_url, client_id="bench", client_secret="bench",
+                                rate=client_rate, burst=max(1, int(client_rate / 10))) as api:
+            summary = await mint_keys(api, requests, output, concurrency)
+    summary["server_429s"] = mock.stats["throttled"]
+    return summary
+
+def benchmark(count=500, concurrency=(1, 8, 32), server_rate=200, client_rate=None, latency=0.02,
+              output_dir="temp"):
+    """Mint count keys per concurrency level against a rate-limited local mock"""
+    rows = []
+    for level in concurrency:
+        output = Path(output_dir) / f"bench-keys-{os.getpid()}-{level}.ndjson"
+        try:
+            summary = asyncio.run(_bench(count, level, server_rate,
+                                         server_rate if client_rate is None else client_rate, latency, output))
+        finally:
+            output.unlink(missing_ok=True)
+        rows.append({"concurrency": level, **summary})
+    return rows
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mint auth keys in bulk")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mint = sub.add_parser("mint", help="Mint keys from a spec file or options (resumable)")
+    mint.add_argument("spec", nargs="?", help="JSON spec: [{id, count, tags, expires_days, description, ...}]")
+    mint.add_argument("--out", default=DEFAULT_OUTPUT, help="NDJSON results file (resumed if present)")
+    mint.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    mint.add_argument("--count", type=int, help="Without a spec: number of keys")
+    mint.add_argument("--id", default="key", help="Without a spec: request id prefix")
+    mint.add_argument("--tags", default="tag:employee", help="Without a spec: comma-separated tags")
+    mint.add_argument("--expires-days", type=int, default=KEY_DEFAULTS["expires_days"])
+    mint.add_argument("--description", default=KEY_DEFAULTS["description"])
+    mint.add_argument("--ephemeral", action="store_true")
+    bench = sub.add_parser("bench", help="Measure minting throughput against a rate-limited local mock")
+    bench.add_argument("--count", type=int, default=500)
+    bench.add_argument("--concurrency", default="1,8,32", help="Comma-separated worker counts")
+    bench.add_argument("--server-rate", type=float, default=200, help="Mock API requests/s before 429")
+    bench.add_argument("--client-rate", type=float, default=None, help="Client limit (default: server rate)")
+    bench.add_argument("--latency", type=float, default=0.02, help="Mock API seconds per request")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        rows = benchmark(args.count, [int(c) for c in args.concurrency.split(",")],
+                         args.server_rate, args.client_rate, args.latency)
+        print(f"{'workers':>7} {'minted':>7} {'seconds':>8} {'keys/s':>8} {'429s':>6}")
+        for row in rows:
+            print(f"{row['concurrency']:>7} {row['minted']:>7} {row['seconds']:>8} "
+                  f"{row['keys_per_second']:>8} {row['server_429s']:>6}")
+        return 0
+
+    try:
+        if args.spec:
+            requests = load_spec(args.spec)
+        elif args.count:
+            requests = expand_spec([{
+                "id": args.id, "count": args.count, "tags": [t for t in args.tags.split(",") if t],
+                "expires_days": args.expires_days, "description": args.description,
+                "ephemeral": args.ephemeral
+            }])
+        else:
+            parser.error("mint needs a spec file or --count")
+    except (SpecError, OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    def progress(summary):
+        done = summary["skipped"] + summary["minted"] + summary["failed"]
+        print(f"\r[INFO] {done}/{summary['requested']} ({summary['failed']} failed)", end="", flush=True)
+
+    async def run():
+        async with TailscaleAPI() as api:
+            return await mint_keys(api, requests, args.out, args.concurrency, progress)
+
+    try:
+        summary = asyncio.run(run())
+    except TailscaleAPIError as e:
+        print()
+        print(f"[ERROR] {e}")
+        return 1
+    print()
+    if summary["revoked"]:
+        print(f"[INFO] Revoked {summary['revoked']} keys left unrecorded by an interrupted run")
+    print(f"[OK] Minted {summary['minted']} keys ({summary['skipped']} already done) "
+          f"in {summary['seconds']}s -> {args.out}")
+    if summary["failed"] or summary["remaining"]:
+        print(f"[ERROR] {summary['failed']} failed, {summary['remaining']} not attempted; "
+              f"re-run the same command to finish")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
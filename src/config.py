@@ -8,7 +8,18 @@ class Config:
     TS_OAUTH_CLIENT_ID = os.getenv('TS_OAUTH_CLIENT_ID')
     TS_OAUTH_CLIENT_SECRET = os.getenv('TS_OAUTH_CLIENT_SECRET') 
     TS_TAILNET = os.getenv('TS_TAILNET', '-')
-    TS_API_BASE = "https://api.tailscale.com/api/v2"
+    TS_API_BASE = os.getenv('TS_API_BASE', "https://api.tailscale.com/api/v2")
+    
+    # API client connection pool
+    TS_API_MAX_CONNECTIONS = int(os.getenv('TS_API_MAX_CONNECTIONS', '20'))
+    TS_API_MAX_KEEPALIVE = int(os.getenv('TS_API_MAX_KEEPALIVE', '20'))
+    TS_API_KEEPALIVE_EXPIRY = float(os.getenv('TS_API_KEEPALIVE_EXPIRY', '60'))
+    TS_API_HTTP2 = os.getenv('TS_API_HTTP2', '1') == '1'
+    
+    # API client rate limiting (requests/s per endpoint class; 0 disables) and retries
+    TS_API_RATE_LIMIT = float(os.getenv('TS_API_RATE_LIMIT', '10'))
+    TS_API_BURST = int(os.getenv('TS_API_BURST', '20'))
+    TS_API_MAX_RETRIES = int(os.getenv('TS_API_MAX_RETRIES', '4'))
     
     # Build settings
     BUILD_OUTPUT_DIR = os.getenv('BUILD_OUTPUT_DIR', 'builds')
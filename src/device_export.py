@@ -0,0 +1,174 @@
+"""
+Streaming device export
+Exports the tailnet's devices to NDJSON or CSV one device at a time, as
+TailscaleAPI.iter_devices parses them off the wire, so memory stays flat
+however large the tailnet is. Devices become compact DeviceRecord tuples;
+--fields projects the exported columns
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError
+
+FORMATS = ("ndjson", "csv")
+DEVICE_FIELDS = ("id", "nodeId", "name", "hostname", "addresses", "os", "user", "tags", "authorized",
+                 "clientVersion", "created", "lastSeen", "expires", "keyExpiryDisabled", "updateAvailable",
+                 "isExternal", "blocksIncomingConnections",
+                 # Set by multi-tailnet exports
+                 "tailnet")
+DEFAULT_FIELDS = ("id", "hostname", "addresses", "os", "user", "tags", "lastSeen")
+LIST_FIELDS = ("addresses", "tags")
+# Separator for list fields in CSV cells
+CSV_LIST_SEPARATOR = " "
+
+DeviceRecord = namedtuple("DeviceRecord", DEVICE_FIELDS, defaults=(None,) * len(DEVICE_FIELDS))
+
+class ExportError(Exception):
+    """Raised for unknown formats or fields"""
+
+def device_record(device):
+    """DeviceRecord from an API device (unknown fields dropped, lists as tuples)"""
+    return DeviceRecord._make(tuple(device.get(f) or ()) if f in LIST_FIELDS else device.get(f)
+                              for f in DEVICE_FIELDS)
+
+def parse_fields(value):
+    fields = tuple(f.strip() for f in value.split(",") if f.strip()) if value else DEFAULT_FIELDS
+    unknown = [f for f in fields if f not in DEVICE_FIELDS]
+    if unknown:
+        raise ExportError(f"Unknown fields: {', '.join(unknown)} (known: {', '.join(DEVICE_FIELDS)})")
+    return fields
+
+class NDJSONWriter:
+    def __init__(self, out, fields):
+        self.out = out
+        self.fields = fields
+
+    def write(self, record):
+        row = {}
+        for field in self.fields:
+            value = getattr(record, field)
+            row[field] = list(value) if field in LIST_FIELDS else value
+        self.out.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+class CSVWriter:
+    def __init__(self, out, fields):
+        self.writer = csv.writer(out, lineterminator="\n")
+        self.fields = fields
+        self.writer.writerow(fields)
+
+    def write(self, record):
+        row = []
+        for field in self.fields:
+            value = getattr(record, field)
+            row.append(CSV_LIST_SEPARATOR.join(value) if field in LIST_FIELDS else ("" if value is None else value))
+        self.writer.writerow(row)
+
+WRITERS = {"ndjson": NDJSONWriter, "csv": CSVWriter}
+
+async def export_devices(devices, out, fmt="ndjson", fields=DEFAULT_FIELDS):
+    """Write devices (an async iterator of API devices) to out; returns the count"""
+    if fmt not in WRITERS:
+        raise ExportError(f"Unknown format: {fmt} (use {' or '.join(FORMATS)})")
+    writer = WRITERS[fmt](out, fields)
+    count = 0
+    async for device in devices:
+        writer.write(device_record(device))
+        count += 1
+    return count
+
+async def _buffered(api):
+    """Baseline: the whole list via list_devices, then one device at a time"""
+    for device in (await api.list_devices())["devices"]:
+        yield device
+
+async def _bench(base_url, mode, fmt, trace):
+    async with TailscaleAPI(base_url=base_url, client_id="bench", client_secret="bench", rate=0) as api:
+        await api.get_access_token()
+        with open(os.devnull, 'w') as out:
+            if trace:
+                tracemalloc.start()
+            started = time.perf_counter()
+            devices = api.iter_devices() if mode == "streaming" else _buffered(api)
+            count = await export_devices(devices, out, fmt)
+            elapsed = time.perf_counter() - started
+            peak = None
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    return count, elapsed, peak
+
+def benchmark(sizes=(10000, 100000), modes=("buffered", "streaming"), fmt="ndjson", memory=True):
+    """Export time and peak Python memory per mode, against a local mock of sizes devices"""
+    from mock_tailscale_api import MockTailscaleAPI, running
+
+    rows = []
+    for size in sizes:
+        mock = MockTailscaleAPI(devices=size)
+        # Encoded once up front, so the mock's own copy isn't measured
+        mock.devices_body()
+        with running(mock) as base_url:
+            for mode in modes:
+                count, elapsed, _ = asyncio.run(_bench(base_url, mode, fmt, False))
+                # Tracing slows the export several times, so memory is measured in a separate run
+                peak = asyncio.run(_bench(base_url, mode, fmt, True))[2] if memory else None
+                rows.append({"mode": mode, "devices": count, "seconds": round(elapsed, 2),
+                             "devices_per_second": round(count / elapsed),
+                             "peak_mb": None if peak is None else round(peak / 2 ** 20, 1)})
+    return rows
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream the tailnet's devices to NDJSON or CSV")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export devices")
+    export.add_argument("--format", choices=FORMATS, default="ndjson")
+    export.add_argument("--fields", help=f"Comma-separated fields (default: {','.join(DEFAULT_FIELDS)})")
+    export.add_argument("--out", default="-", help="Output file (default: stdout)")
+    bench = sub.add_parser("bench", help="Buffered vs streaming export against a local mock")
+    bench.add_argument("--devices", default="10000,100000", help="Comma-separated tailnet sizes")
+    bench.add_argument("--format", choices=FORMATS, default="ndjson")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(f"{'mode':<10} {'devices':>8} {'seconds':>8} {'devices/s':>10} {'peak MB':>8}")
+        for row in benchmark([int(n) for n in args.devices.split(",")], fmt=args.format):
+            print(f"{row['mode']:<10} {row['devices']:>8} {row['seconds']:>8} "
+                  f"{row['devices_per_second']:>10} {row['peak_mb']:>8}")
+        return 0
+
+    try:
+        fields = parse_fields(args.fields)
+    except ExportError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+
+    async def run(out):
+        async with TailscaleAPI() as api:
+            return await export_devices(api.iter_devices(), out, args.format, fields)
+
+    out = sys.stdout if args.out == "-" else open(args.out, 'w', newline='', encoding='utf-8')
+    try:
+        count = asyncio.run(run(out))
+    except TailscaleAPIError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    # Status goes to stderr so stdout stays a clean export
+    print(f"[OK] Exported {count} devices", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
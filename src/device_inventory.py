@@ -0,0 +1,353 @@
+"""
+Local device inventory
+Caches the tailnet's device list in SQLite, synced from
+TailscaleAPI.list_devices. Each sync records which devices were added,
+removed or changed since the previous one; hostname, addresses, tags and
+lastSeen are indexed, so lookups and "offline for N days" queries are
+answered locally instead of fetching the whole device list per question
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import ipaddress
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError
+
+DEFAULT_DB = "builds/devices.db"
+DEFAULT_SYNC_INTERVAL = 300
+# Fields that change on every sync without the device changing
+VOLATILE_FIELDS = ("lastSeen",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    hostname TEXT COLLATE NOCASE,
+    name TEXT COLLATE NOCASE,
+    short_name TEXT COLLATE NOCASE,
+    os TEXT,
+    user TEXT,
+    last_seen INTEGER,
+    fingerprint TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS devices_hostname ON devices (hostname);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name);
+CREATE INDEX IF NOT EXISTS devices_short_name ON devices (short_name);
+CREATE INDEX IF NOT EXISTS devices_last_seen ON devices (last_seen);
+CREATE TABLE IF NOT EXISTS device_addresses (
+    address TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    PRIMARY KEY (address, device_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS device_addresses_device ON device_addresses (device_id);
+CREATE TABLE IF NOT EXISTS device_tags (
+    tag TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    PRIMARY KEY (tag, device_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS device_tags_device ON device_tags (device_id);
+CREATE TABLE IF NOT EXISTS syncs (
+    id INTEGER PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    seconds REAL NOT NULL,
+    total INTEGER NOT NULL,
+    added INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    changed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS device_changes (
+    sync_id INTEGER NOT NULL,
+    device_id TEXT NOT NULL,
+    change TEXT NOT NULL,
+    fields TEXT
+);
+CREATE INDEX IF NOT EXISTS device_changes_sync ON device_changes (sync_id);
+"""
+
+def parse_time(value):
+    """Epoch seconds from an API timestamp, or None"""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
+
+def fingerprint(device):
+    stable = {k: v for k, v in device.items() if k not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, separators=(",", ":")).encode('utf-8')).hexdigest()
+
+def changed_fields(old, new):
+    return sorted(k for k in set(old) | set(new) if k not in VOLATILE_FIELDS and old.get(k) != new.get(k))
+
+def _chunks(items, size=500):
+    """Slices small enough for SQLite's bound parameter limit"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class DeviceInventory:
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("DEVICE_INVENTORY_DB", DEFAULT_DB))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        # Readers (lookups from other processes) don't block a running sync
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _device_rows(self, devices):
+        rows, addresses, tags = [], [], []
+        for device, digest in devices:
+            name = device.get("name") or ""
+            rows.append((device["id"], device.get("hostname"), name, name.split(".")[0], device.get("os"),
+                         device.get("user"), parse_time(device.get("lastSeen")), digest,
+                         json.dumps(device, separators=(",", ":"))))
+            addresses.extend((address, device["id"]) for address in device.get("addresses") or [])
+            tags.extend((tag, device["id"]) for tag in device.get("tags") or [])
+        return rows, addresses, tags
+
+    def apply(self, devices):
+        """Store a full device list as a new sync; returns its delta against the stored list"""
+        started = time.perf_counter()
+        stored = {row[0]: (row[1], row[2])
+                  for row in self.db.execute("SELECT id, fingerprint, last_seen FROM devices")}
+        added, changed, seen, current = [], [], [], set()
+        for device in devices:
+            device_id = device["id"]
+            current.add(device_id)
+            digest = fingerprint(device)
+            previous = stored.get(device_id)
+            if previous is None:
+                added.append((device, digest))
+            elif previous[0] != digest:
+                changed.append((device, digest))
+            else:
+                last_seen = parse_time(device.get("lastSeen"))
+                if last_seen != previous[1]:
+                    seen.append((last_seen, json.dumps(device, separators=(",", ":")), device_id))
+        removed = [device_id for device_id in stored if device_id not in current]
+
+        fields = {}
+        for ids in _chunks([device["id"] for device, _ in changed]):
+            query = f"SELECT id, data FROM devices WHERE id IN ({','.join('?' * len(ids))})"
+            fields.update({device_id: json.loads(data) for device_id, data in self.db.execute(query, ids)})
+        fields = {device["id"]: changed_fields(fields[device["id"]], device) for device, _ in changed}
+
+        with self.db:
+            stale = [(device_id,) for device_id in removed] + [(device["id"],) for device, _ in changed]
+            self.db.executemany("DELETE FROM device_addresses WHERE device_id = ?", stale)
+            self.db.executemany("DELETE FROM device_tags WHERE device_id = ?", stale)
+            self.db.executemany("DELETE FROM devices WHERE id = ?", [(device_id,) for device_id in removed])
+            rows, addresses, tags = self._device_rows(added + changed)
+            self.db.executemany("INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT OR IGNORE INTO device_addresses VALUES (?, ?)", addresses)
+            self.db.executemany("INSERT OR IGNORE INTO device_tags VALUES (?, ?)", tags)
+            self.db.executemany("UPDATE devices SET last_seen = ?, data = ? WHERE id = ?", seen)
+
+            seconds = time.perf_counter() - started
+            sync_id = self.db.execute(
+                "INSERT INTO syncs (synced_at, seconds, total, added, removed, changed) VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), seconds, len(current), len(added), len(removed), len(changed))).lastrowid
+            self.db.executemany("INSERT INTO device_changes VALUES (?, ?, ?, ?)",
+                                [(sync_id, device["id"], "added", None) for device, _ in added] +
+                                [(sync_id, device_id, "removed", None) for device_id in removed] +
+                                [(sync_id, device_id, "changed", json.dumps(names))
+                                 for device_id, names in fields.items()])
+
+        return {"sync_id": sync_id, "total": len(current), "added": [device["id"] for device, _ in added],
+                "removed": removed, "changed": fields, "seconds": round(seconds, 3)}
+
+    async def sync(self, api):
+        """Fetch the device list once and apply it"""
+        return self.apply((await api.list_devices()).get("devices", []))
+
+    async def sync_if_stale(self, api, max_age=DEFAULT_SYNC_INTERVAL):
+        """Sync unless the last sync is younger than max_age seconds; returns the delta or None"""
+        last = self.last_sync()
+        if last and time.time() - last["synced_at"] < max_age:
+            return None
+        return await self.sync(api)
+
+    def last_sync(self):
+        row = self.db.execute("SELECT id, synced_at, seconds, total, added, removed, changed "
+                              "FROM syncs ORDER BY id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "synced_at", "seconds", "total", "added", "removed", "changed"), row))
+
+    def changes(self, sync_id):
+        """Delta recorded by a sync: [{"device_id", "change", "fields"}]"""
+        return [{"device_id": device_id, "change": change, "fields": json.loads(names) if names else None}
+                for device_id, change, names in self.db.execute(
+                    "SELECT device_id, change, fields FROM device_changes WHERE sync_id = ?", (sync_id,))]
+
+    def _devices(self, query, params=()):
+        return [json.loads(data) for (data,) in self.db.execute(query, params)]
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def get(self, device_id):
+        devices = self._devices("SELECT data FROM devices WHERE id = ?", (device_id,))
+        return devices[0] if devices else None
+
+    def by_hostname(self, hostname):
+        """Devices whose hostname, MagicDNS name or its first label matches (case-insensitive)"""
+        return self._devices("SELECT data FROM devices WHERE hostname = ?1 OR name = ?1 OR short_name = ?1",
+                             (hostname.rstrip("."),))
+
+    def by_address(self, address):
+        return self._devices("SELECT d.data FROM device_addresses a JOIN devices d ON d.id = a.device_id "
+                             "WHERE a.address = ?", (address,))
+
+    def by_tag(self, tag):
+        return self._devices("SELECT d.data FROM device_tags t JOIN devices d ON d.id = t.device_id "
+                             "WHERE t.tag = ?", (tag,))
+
+    def offline(self, days, now=None):
+        """Devices not seen for more than days, longest offline first"""
+        cutoff = (now or time.time()) - days * 86400
+        return self._devices("SELECT data FROM devices WHERE last_seen < ? ORDER BY last_seen", (cutoff,))
+
+    def find(self, query):
+        """Lookup by tag ("tag:..."), Tailscale IP or hostname"""
+        if query.startswith("tag:"):
+            return self.by_tag(query)
+        try:
+            return self.by_address(str(ipaddress.ip_address(query)))
+        except ValueError:
+            return self.by_hostname(query)
+
+async def _sync_loop(inventory, interval):
+    async with TailscaleAPI() as api:
+        while True:
+            try:
+                print_delta(await inventory.sync(api))
+            except TailscaleAPIError as e:
+                print(f"[WARNING] Device sync failed: {e}")
+            await asyncio.sleep(interval)
+
+def print_delta(delta):
+    print(f"[OK] Synced {delta['total']} devices in {delta['seconds']}s: {len(delta['added'])} added, "
+          f"{len(delta['removed'])} removed, {len(delta['changed'])} changed")
+
+async def _bench(devices, lookups, path):
+    from mock_tailscale_api import MockTailscaleAPI, make_device, running
+
+    mock = MockTailscaleAPI(devices)
+    queries = [make_device(i * devices // lookups) for i in range(lookups)]
+    with running(mock) as base_url:
+        async with TailscaleAPI(base_url=base_url, client_id="bench", client_secret="bench", rate=0) as api:
+            # Without the inventory every lookup fetches and scans the full list
+            api_lookups = max(1, lookups // 20)
+            started = time.perf_counter()
+            for device in queries[:api_lookups]:
+                listed = (await api.list_devices())["devices"]
+                next(d for d in listed if d["hostname"] == device["hostname"])
+            api_ms = (time.perf_counter() - started) * 1000 / api_lookups
+
+            with DeviceInventory(path) as inventory:
+                delta = await inventory.sync(api)
+                started = time.perf_counter()
+                for device in queries:
+                    inventory.by_hostname(device["hostname"])
+                    inventory.by_address(device["addresses"][0])
+                local_ms = (time.perf_counter() - started) * 1000 / (2 * lookups)
+                started = time.perf_counter()
+                offline = len(inventory.offline(30))
+                offline_ms = (time.perf_counter() - started) * 1000
+    return {"devices": devices, "sync_seconds": delta["seconds"], "api_lookup_ms": round(api_ms, 2),
+            "local_lookup_ms": round(local_ms, 3), "offline_query_ms": round(offline_ms, 2),
+            "offline_devices": offline}
+
+def benchmark(devices=10000, lookups=200, output_dir="temp"):
+    """Lookup latency via list_devices vs the inventory, against a local mock"""
+    path = Path(output_dir) / f"bench-devices-{os.getpid()}.db"
+    try:
+        return asyncio.run(_bench(devices, lookups, path))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local tailnet device inventory")
+    parser.add_argument("--db", default=None, help=f"Inventory database (default: {DEFAULT_DB})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync = sub.add_parser("sync", help="Fetch the device list and record what changed")
+    sync.add_argument("--every", type=float, help="Keep syncing every N seconds")
+    find = sub.add_parser("find", help="Devices by hostname, Tailscale IP or tag:...")
+    find.add_argument("query")
+    offline = sub.add_parser("offline", help="Devices not seen for more than N days")
+    offline.add_argument("--days", type=float, default=30)
+    sub.add_parser("status", help="Device count and last sync")
+    bench = sub.add_parser("bench", help="Lookup latency via the API vs the inventory (local mock)")
+    bench.add_argument("--devices", type=int, default=10000)
+    bench.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        for name, value in benchmark(args.devices, args.lookups).items():
+            print(f"{name:<18} {value}")
+        return 0
+
+    with DeviceInventory(args.db) as inventory:
+        if args.command == "sync":
+            if args.every:
+                try:
+                    asyncio.run(_sync_loop(inventory, args.every))
+                except KeyboardInterrupt:
+                    pass
+                return 0
+
+            async def run():
+                async with TailscaleAPI() as api:
+                    return await inventory.sync(api)
+
+            try:
+                print_delta(asyncio.run(run()))
+            except TailscaleAPIError as e:
+                print(f"[ERROR] {e}")
+                return 1
+            return 0
+
+        if args.command == "status":
+            last = inventory.last_sync()
+            if last is None:
+                print("[INFO] Never synced; run: python src/device_inventory.py sync")
+                return 1
+            age = time.time() - last["synced_at"]
+            print(f"[INFO] {inventory.count()} devices, last sync {age:.0f}s ago "
+                  f"({last['added']} added, {last['removed']} removed, {last['changed']} changed)")
+            return 0
+
+        devices = inventory.find(args.query) if args.command == "find" else inventory.offline(args.days)
+        for device in devices:
+            print(f"{device.get('hostname', ''):<24} {','.join(device.get('addresses') or []):<40} "
+                  f"{device.get('os', ''):<8} {device.get('lastSeen', '')}")
+        if args.command == "find" and not devices:
+            print(f"[ERROR] No device matches {args.query}")
+            return 1
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Install-state manifest
+Installers record each component's input digest, version and installed file
+hashes; on re-run a component whose inputs and files are unchanged is
+skipped, so re-applying a config or upgrading one component only redoes that
+component. Stdlib only: shipped in Linux packages and bundled into the
+Windows agent
+"""
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+STATE_FORMAT = 1
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def digest(*values):
+    """Digest of a component's inputs; "@path" values stand for the file's contents"""
+    parts = []
+    for value in values:
+        value = str(value)
+        parts.append("file:" + hash_file(value[1:]) if value.startswith("@") else "value:" + value)
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+class InstallState:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.components = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # A manifest from another format is ignored, so everything is redone once
+        if state.get("format") != STATE_FORMAT:
+            return {}
+        return state.get("components", {})
+
+    def current(self, component, input_digest):
+        """Whether component was installed from these inputs and its files are intact"""
+        entry = self.components.get(component)
+        if not entry or entry.get("digest") != input_digest:
+            return False
+        for path, sha256 in entry.get("files", {}).items():
+            try:
+                if hash_file(path) != sha256:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record(self, component, input_digest, files=(), version=None):
+        """Record a successfully installed component (saved immediately)"""
+        self.components[component] = {
+            "digest": input_digest,
+            "version": version,
+            "files": {str(path): hash_file(path) for path in files},
+            "installed": datetime.now().isoformat(timespec="seconds")
+        }
+        self.save()
+
+    def forget(self, component):
+        if self.components.pop(component, None) is not None:
+            self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        part = self.path.with_name(f"{self.path.name}.{os.getpid()}.part")
+        with open(part, 'w') as f:
+            json.dump({"format": STATE_FORMAT, "components": self.components}, f, indent=2, sort_keys=True)
+        os.chmod(part, 0o600)
+        os.replace(part, self.path)
+
+def main():
+    """Command line entry point (used by install.sh)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query and update an install-state manifest")
+    sub = parser.add_subparsers(dest="command", required=True)
+    digest_cmd = sub.add_parser("digest", help="Print the digest of values (@path for file contents)")
+    digest_cmd.add_argument("values", nargs="+")
+    current = sub.add_parser("current", help="Exit 0 if a component is installed from this digest")
+    current.add_argument("state")
+    current.add_argument("component")
+    current.add_argument("digest")
+    record = sub.add_parser("record", help="Record an installed component")
+    record.add_argument("state")
+    record.add_argument("component")
+    record.add_argument("digest")
+    record.add_argument("files", nargs="*", help="Installed files to hash")
+    record.add_argument("--version", default=None)
+    show = sub.add_parser("show", help="Print the manifest")
+    show.add_argument("state")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "digest":
+            print(digest(*args.values))
+        elif args.command == "current":
+            return 0 if InstallState(args.state).current(args.component, args.digest) else 1
+        elif args.command == "record":
+            InstallState(args.state).record(args.component, args.digest, args.files, args.version)
+        else:
+            for name, entry in sorted(InstallState(args.state).components.items()):
+                print(f"{name}\t{entry.get('version') or '-'}\t{entry['installed']}\t{entry['digest'][:12]}")
+    except OSError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Stamp per-deployment configuration into generic installers
+A generic installer is built once per Tailscale version; stamping writes the
+deployment config (auth key, tags, intervals) into it without re-running PyInstaller
+"""
+
+import os
+import sys
+import json
+import shlex
+import shutil
+import struct
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from reproducible import build_timestamp, normalize_tree
+
+# Stamp trailer appended after the payload container:
+#   [config json][config length][magic]
+STAMP_MAGIC = b"TSSTAMP1"
+STAMP_TRAILER = struct.Struct("<I8s")
+CHUNK_SIZE = 1024 * 1024
+
+# Linux packages carry the config as a shell-sourceable file next to install.sh
+DEPLOYMENT_ENV = "deployment.env"
+DEFAULT_CHECK_INTERVAL = 30
+
+class StampError(Exception):
+    """Raised for invalid deployment configs or unstampable files"""
+
+def make_deployment_config(auth_key, tags=None, check_interval=DEFAULT_CHECK_INTERVAL, build_time=None):
+    """Validate and normalize a per-deployment config"""
+    if not auth_key or not auth_key.startswith('tskey-auth-'):
+        raise StampError("Invalid auth key format. Auth key should start with 'tskey-auth-'")
+
+    tags = list(tags or [])
+    for tag in tags:
+        if not tag.startswith('tag:'):
+            raise StampError(f"Invalid tag '{tag}'. Tags should start with 'tag:'")
+
+    check_interval = int(check_interval)
+    if check_interval <= 0:
+        raise StampError("check_interval must be a positive number of seconds")
+
+    return {
+        "auth_key": auth_key.strip(),
+        "tags": tags,
+        "check_interval": check_interval,
+        "build_time": build_time or build_timestamp()
+    }
+
+def read_stamp(path):
+    """Return (config or None, offset where the stamp starts)"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        if end < STAMP_TRAILER.size:
+            return None, end
+
+        f.seek(end - STAMP_TRAILER.size)
+        length, magic = STAMP_TRAILER.unpack(f.read(STAMP_TRAILER.size))
+        if magic != STAMP_MAGIC:
+            return None, end
+
+        start = end - STAMP_TRAILER.size - length
+        if start < 0:
+            raise StampError(f"Corrupt stamp trailer in {path}")
+        f.seek(start)
+        config = json.loads(f.read(length).decode('utf-8'))
+        return config, start
+
+def stamp_executable(generic_path, output_path, config):
+    """Copy a generic installer and append the deployment config
+
+    Stamping an already-stamped file replaces its stamp.
+    """
+    generic_path = Path(generic_path)
+    output_path = Path(output_path)
+    _, end = read_stamp(generic_path)
+
+    data = json.dumps(config, sort_keys=True, separators=(",", ":")).encode('utf-8')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = output_path.with_name(output_path.name + ".part")
+
+    with open(generic_path, 'rb') as src, open(part_path, 'wb') as out:
+        remaining = end
+        while remaining > 0:
+            chunk = src.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise StampError(f"Unexpected end of file in {generic_path}")
+            out.write(chunk)
+            remaining -= len(chunk)
+        out.write(data)
+        out.write(STAMP_TRAILER.pack(len(data), STAMP_MAGIC))
+
+    shutil.copymode(generic_path, part_path)
+    os.replace(part_path, output_path)
+    return output_path
+
+def render_deployment_env(config):
+    """Render a config as shell assignments sourced by install.sh"""
+    values = {
+        "DEPLOY_AUTH_KEY": config["auth_key"],
+        "DEPLOY_TAGS": ",".join(config.get("tags", [])),
+        "DEPLOY_CHECK_INTERVAL": str(config.get("check_interval", DEFAULT_CHECK_INTERVAL)),
+        "DEPLOY_BUILD_TIME": config.get("build_time", "")
+    }
+    lines = ["# Deployment config stamped into this package"]
+    lines += [f"{name}={shlex.quote(value)}" for name, value in values.items()]
+    return "\n".join(lines) + "\n"
+
+def stamp_linux_package(generic_dir, output_dir, config):
+    """Copy a generic Linux package and write its deployment.env"""
+    generic_dir = Path(generic_dir)
+    output_dir = Path(output_dir)
+
+    if output_dir.exists():
+        raise StampError(f"Output already exists: {output_dir}")
+
+    shutil.copytree(generic_dir, output_dir)
+    env_file = output_dir / DEPLOYMENT_ENV
+    env_file.write_text(render_deployment_env(config), encoding='utf-8')
+    env_file.chmod(0o600)
+    normalize_tree(output_dir)
+    return output_dir
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stamp deployment config into a generic installer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stamp = sub.add_parser("stamp", help="Stamp a generic Windows exe or Linux package directory")
+    stamp.add_argument("generic")
+    stamp.add_argument("output")
+    stamp.add_argument("--auth-key", default=os.getenv('TAILSCALE_AUTH_KEY'))
+    stamp.add_argument("--tags", default="", help="Comma-separated tags, e.g. tag:sales,tag:laptop")
+    stamp.add_argument("--check-interval", type=int, default=DEFAULT_CHECK_INTERVAL)
+
+    show = sub.add_parser("show", help="Show the stamp of an installer")
+    show.add_argument("installer")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "stamp":
+            started = time.perf_counter()
+            config = make_deployment_config(
+                args.auth_key,
+                [t for t in args.tags.split(",") if t],
+                args.check_interval
+            )
+            if Path(args.generic).is_dir():
+                output = stamp_linux_package(args.generic, args.output, config)
+            else:
+                output = stamp_executable(args.generic, args.output, config)
+            print(f"[OK] Stamped {output} in {time.perf_counter() - started:.3f}s")
+        elif Path(args.installer).is_dir():
+            env_file = Path(args.installer) / DEPLOYMENT_ENV
+            if not env_file.exists():
+                print("[INFO] Not stamped (generic package)")
+                return 1
+            for line in env_file.read_text(encoding='utf-8').splitlines():
+                if line.startswith("DEPLOY_AUTH_KEY="):
+                    line = line[:46] + "..."
+                print(line)
+        else:
+            config, _ = read_stamp(args.installer)
+            if config is None:
+                print("[INFO] Not stamped (generic installer)")
+                return 1
+            config = dict(config, auth_key=config["auth_key"][:30] + "...")
+            print(json.dumps(config, indent=2))
+    except (StampError, OSError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Incremental JSON array parsing
+Yields the items of one array in a JSON document (e.g. "devices" in the
+device list response) as the bytes arrive, holding at most one item plus one
+chunk in memory instead of the whole document
+"""
+
+import re
+import json
+import codecs
+
+SKIP = re.compile(r'[\s,]*')
+# Bytes kept while looking for the array, in case its key straddles two chunks
+SEEK_TAIL = 256
+
+class JSONStreamError(ValueError):
+    """Raised when the stream ends before the array is complete"""
+
+class ArrayItemParser:
+    """Feed bytes, get back the array items completed so far"""
+    def __init__(self, key):
+        self.key = key
+        self.start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.decoder = json.JSONDecoder()
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.state = "seek"
+        self.count = 0
+
+    def feed(self, data):
+        if self.state == "done":
+            return []
+        buffer = self.buffer + self.text.decode(data)
+        pos = 0
+        if self.state == "seek":
+            match = self.start.search(buffer)
+            if match is None:
+                self.buffer = buffer[-SEEK_TAIL:]
+                return []
+            self.state = "items"
+            pos = match.end()
+
+        items = []
+        end = len(buffer)
+        while True:
+            pos = SKIP.match(buffer, pos).end()
+            if pos == end:
+                break
+            if buffer[pos] == "]":
+                self.state = "done"
+                break
+            try:
+                item, next_pos = self.decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Incomplete item: wait for more bytes
+                break
+            if next_pos == end:
+                # A number or literal cut by the chunk boundary would still decode
+                break
+            items.append(item)
+            pos = next_pos
+        self.buffer = buffer[pos:]
+        self.count += len(items)
+        return items
+
+    def close(self):
+        if self.state != "done":
+            raise JSONStreamError(f"Stream ended inside the {self.key!r} array after {self.count} items")
+
+async def iter_array(chunks, key):
+    """Items of the array under key from an async iterator of bytes"""
+    parser = ArrayItemParser(key)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    parser.close()
+
+def read_array(file, key, chunk_size=65536):
+    """Items of the array under key from a binary file object"""
+    parser = ArrayItemParser(key)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    parser.close()
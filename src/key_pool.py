@@ -0,0 +1,287 @@
+"""
+Pre-minted auth key pool
+Keeps KEY_POOL_SIZE unused, short-lived keys per tag set on disk so builds
+get a fresh per-build key without an OAuth and API round trip. Taking a key
+is one atomic rename (safe across build processes); a background refiller
+revokes keys close to expiry and mints replacements through TailscaleAPI.
+Taking keys is stdlib only, so builders can import this module cheaply
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+DEFAULT_POOL_DIR = "builds/.keypool"
+DEFAULT_POOL_SIZE = 5
+DEFAULT_KEY_TTL_HOURS = 168
+# Keys with less validity left are revoked instead of handed out
+DEFAULT_MIN_TTL_HOURS = 24
+DEFAULT_REFILL_INTERVAL = 60
+# OAuth-minted keys must be tagged; builds without tags get the API default
+DEFAULT_POOL_TAGS = ["tag:employee"]
+POOL_DESCRIPTION = "ATT key pool"
+
+def pool_enabled():
+    return os.getenv("KEY_POOL", "0") == "1"
+
+def normalize_tags(tags):
+    return sorted(set(tags or DEFAULT_POOL_TAGS))
+
+def parse_tag_sets(value):
+    """Tag sets from "tag:a,tag:b;tag:c" (semicolon between sets)"""
+    return [normalize_tags(t for t in part.split(",") if t.strip())
+            for part in (value or "").split(";") if part.strip()]
+
+class KeyPool:
+    def __init__(self, root=None, size=None, ttl_hours=None, min_ttl_hours=None):
+        self.root = Path(root or os.getenv("KEY_POOL_DIR", DEFAULT_POOL_DIR))
+        self.size = size if size is not None else int(os.getenv("KEY_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self.ttl = 3600 * (ttl_hours or float(os.getenv("KEY_POOL_TTL_HOURS", DEFAULT_KEY_TTL_HOURS)))
+        self.min_ttl = 3600 * (min_ttl_hours if min_ttl_hours is not None
+                               else float(os.getenv("KEY_POOL_MIN_TTL_HOURS", DEFAULT_MIN_TTL_HOURS)))
+        # Set by a KeyPoolRefiller running in this process
+        self.refiller = None
+
+    def tag_dir(self, tags):
+        return self.root / "+".join(normalize_tags(tags)).replace(":", "_")
+
+    def tag_sets(self):
+        """Tag sets with a pool directory"""
+        sets = []
+        if self.root.is_dir():
+            for entry in sorted(self.root.iterdir()):
+                try:
+                    sets.append(json.loads((entry / "tags.json").read_text())["tags"])
+                except (OSError, ValueError, KeyError):
+                    continue
+        return sets
+
+    def _entries(self, tags):
+        """(expires, path) of pooled keys; file names are <expires>-<key id>.key"""
+        directory = self.tag_dir(tags)
+        if not directory.is_dir():
+            return
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".key"):
+                    try:
+                        yield int(entry.name.split("-", 1)[0]), Path(entry.path)
+                    except ValueError:
+                        continue
+
+    def available(self, tags):
+        usable_after = time.time() + self.min_ttl
+        return sum(1 for expires, _ in self._entries(tags) if expires > usable_after)
+
+    def take(self, tags):
+        """Claim an unused key for tags, or None if the pool has none"""
+        usable_after = time.time() + self.min_ttl
+        claimed = None
+        for expires, path in self._entries(tags):
+            if expires <= usable_after:
+                continue
+            # Rename is atomic: of concurrent takers exactly one gets the file
+            target = path.with_name(f"{path.name}.taken-{os.getpid()}-{threading.get_ident()}")
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue
+            claimed = target
+            break
+        if self.refiller is not None:
+            self.refiller.wake()
+        if claimed is None:
+            return None
+        try:
+            return json.loads(claimed.read_text())["key"]
+        finally:
+            claimed.unlink()
+
+    def add(self, tags, key, expires):
+        """Add a minted key (written aside, then renamed into the pool)"""
+        directory = self.tag_dir(tags)
+        directory.mkdir(parents=True, exist_ok=True)
+        tags_file = directory / "tags.json"
+        if not tags_file.exists():
+            tags_file.write_text(json.dumps({"tags": normalize_tags(tags)}))
+        path = directory / f"{int(expires)}-{key['id']}.key"
+        part = path.with_name(path.name + ".part")
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"id": key["id"], "key": key["key"], "tags": normalize_tags(tags),
+                       "expires": int(expires)}, f)
+        os.replace(part, path)
+
+    async def refill(self, api, tags, concurrency=4):
+        """Mint keys until the pool for tags holds size usable keys; returns the count minted"""
+        missing = self.size - self.available(tags)
+        if missing <= 0:
+            return 0
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def mint():
+            async with semaphore:
+                expires = time.time() + self.ttl
+                key = await api.create_auth_key(tags=normalize_tags(tags), expiry_seconds=int(self.ttl),
+                                                description=POOL_DESCRIPTION)
+                self.add(tags, key, expires)
+
+        await asyncio.gather(*(mint() for _ in range(missing)))
+        return missing
+
+    async def prune(self, api, tags):
+        """Revoke and drop keys too close to expiry to hand out; returns the count"""
+        usable_after = time.time() + self.min_ttl
+        pruned = 0
+        for expires, path in list(self._entries(tags)):
+            if expires > usable_after:
+                continue
+            key_id = path.stem.split("-", 1)[1]
+            if expires > time.time():
+                from tailscale_api import NotFoundError
+                try:
+                    await api.delete_auth_key(key_id)
+                except NotFoundError:
+                    pass
+            path.unlink(missing_ok=True)
+            pruned += 1
+        return pruned
+
+    async def drain(self, api, tags):
+        """Revoke every pooled key for tags"""
+        pruned = 0
+        while True:
+            key_path = next((path for _, path in self._entries(tags)), None)
+            if key_path is None:
+                return pruned
+            await api.delete_auth_key(key_path.stem.split("-", 1)[1])
+            key_path.unlink(missing_ok=True)
+            pruned += 1
+
+class KeyPoolRefiller(threading.Thread):
+    """Background thread that keeps the pool topped up for the given tag sets"""
+    def __init__(self, pool, tag_sets=(), interval=DEFAULT_REFILL_INTERVAL, api_factory=None):
+        super().__init__(daemon=True, name="key-pool-refiller")
+        self.pool = pool
+        self.tag_sets = [normalize_tags(tags) for tags in tag_sets]
+        self.interval = interval
+        self.api_factory = api_factory
+        self.stats = {"cycles": 0, "minted": 0, "pruned": 0, "errors": 0}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        pool.refiller = self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    async def cycle(self):
+        if self.api_factory is None:
+            from tailscale_api import TailscaleAPI
+            self.api_factory = TailscaleAPI
+        tag_sets = {tuple(tags) for tags in self.tag_sets + self.pool.tag_sets()}
+        async with self.api_factory() as api:
+            for tags in sorted(tag_sets):
+                self.stats["pruned"] += await self.pool.prune(api, tags)
+                self.stats["minted"] += await self.pool.refill(api, tags)
+        self.stats["cycles"] += 1
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                asyncio.run(self.cycle())
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[WARNING] Key pool refill failed: {e}")
+            self._wake.wait(self.interval)
+
+def start_refiller(pool=None):
+    """Start a background refiller when KEY_POOL=1 (for long-running services)"""
+    if not pool_enabled():
+        return None
+    refiller = KeyPoolRefiller(pool or KeyPool(), parse_tag_sets(os.getenv("KEY_POOL_TAGS")),
+                               float(os.getenv("KEY_POOL_REFILL_INTERVAL", DEFAULT_REFILL_INTERVAL)))
+    refiller.start()
+    return refiller
+
+def pool_auth_key(tags=None):
+    """A pre-minted key for tags when KEY_POOL=1 and one is available, else None"""
+    if not pool_enabled():
+        return None
+    auth_key = KeyPool().take(tags)
+    if auth_key:
+        print(f"[OK] Auth key taken from key pool: {auth_key[:30]}...")
+    return auth_key
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the pre-minted auth key pool")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("fill", "Prune stale keys and mint up to the pool size"),
+                            ("take", "Claim one key and print it"),
+                            ("drain", "Revoke every pooled key")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--tags", default="", help="Comma-separated tags (default: tag:employee)")
+    sub.add_parser("status", help="Usable keys per tag set")
+    serve = sub.add_parser("serve", help="Keep the pool topped up (KEY_POOL_TAGS, or existing tag sets)")
+    serve.add_argument("--interval", type=float, default=DEFAULT_REFILL_INTERVAL)
+    args = parser.parse_args()
+
+    pool = KeyPool()
+    tags = normalize_tags(t for t in getattr(args, "tags", "").split(",") if t)
+
+    if args.command == "status":
+        for tag_set in pool.tag_sets():
+            print(f"{','.join(tag_set)}\t{pool.available(tag_set)}/{pool.size}")
+        return 0
+    if args.command == "take":
+        key = pool.take(tags)
+        if key is None:
+            print(f"[ERROR] No pooled key for {','.join(tags)}", file=sys.stderr)
+            return 1
+        print(key)
+        return 0
+    if args.command == "serve":
+        refiller = KeyPoolRefiller(pool, parse_tag_sets(os.getenv("KEY_POOL_TAGS")), args.interval)
+        refiller.start()
+        print(f"[INFO] Refilling key pool in {pool.root} every {args.interval:.0f}s")
+        try:
+            while refiller.is_alive():
+                refiller.join(1)
+        except KeyboardInterrupt:
+            refiller.stop()
+        return 0
+
+    from tailscale_api import TailscaleAPI, TailscaleAPIError
+
+    async def run():
+        async with TailscaleAPI() as api:
+            if args.command == "drain":
+                return 0, await pool.drain(api, tags)
+            return await pool.prune(api, tags), await pool.refill(api, tags)
+
+    try:
+        first, second = asyncio.run(run())
+    except TailscaleAPIError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if args.command == "drain":
+        print(f"[OK] Revoked {second} pooled keys")
+    else:
+        print(f"[OK] Pruned {first}, minted {second}; {pool.available(tags)}/{pool.size} usable")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
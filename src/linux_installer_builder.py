@@ -10,19 +10,63 @@ import subprocess
 import requests
 from datetime import datetime
 import json
+import time
+import hashlib
 from pathlib import Path
+import shutil
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).parent))
+from payload_container import write_payload, PayloadReader
+from installer_stamp import (
+    make_deployment_config, stamp_linux_package, DEPLOYMENT_ENV, DEFAULT_CHECK_INTERVAL
+)
+from build_graph import BuildGraph, StageTimer, format_timings, path_size
+from reproducible import (
+    deterministic_mode, output_name, build_info_for_disk, normalize_tree, make_tarball
+)
+from artifact_store import ArtifactStore, variant_name
+from preflight import run_preflight
+from key_pool import pool_auth_key
+from native_packages import build_native_packages, package_formats
+from mirror import Mirror, MirrorSync, MirrorError, offline_mirror, mirror_list, version_key
+from arches import DEFAULT_ARCH, WHEEL_PLATFORMS, normalize_arch, wheel_fits_arch
+
+# Payload entry for the watchdog script; the package ships the container
+# plus payload_container.py so install.sh can stream-extract and verify it
+WATCHDOG_ENTRY = "tailscale-watchdog"
+PAYLOAD_FILE = "payload.tspk"
+# Target hosts only have the stdlib, so Linux payloads always use lzma
+PAYLOAD_CODEC = "lzma"
+# Package directory with the Tailscale static tarball and wheelhouse, so
+# install.sh needs no network, package manager or pip
+OFFLINE_DIR = "offline"
+# Wheelhouse contents: one wheel set per supported target Python (for
+# arches with a wheel platform, see arches.WHEEL_PLATFORMS)
+WHEEL_REQUIREMENTS = ["cryptography"]
+WHEEL_PYTHON_VERSIONS = ["3.8", "3.9", "3.10", "3.11", "3.12", "3.13"]
+# The upstream copy in the build cache is re-synced at most daily
+UPSTREAM_SYNC_MAX_AGE = 24 * 3600
+
 # Load environment variables from .env file
 load_dotenv()
 
 class LinuxInstallerBuilder:
-    def __init__(self):
+    def __init__(self, arch=DEFAULT_ARCH):
         self.build_dir = Path("builds")
         self.temp_dir = Path("temp")
         self.linux_build_dir = self.build_dir / "linux"
+        self.generic_dir = self.linux_build_dir / "generic"
+        self.cache_dir = self.build_dir / ".cache"
         self.install_dir = Path("/opt/att/tailscale")
         self.service_user = "tailscale"
+        # Target arch of the bundled Tailscale tarball and wheels
+        self.arch = normalize_arch(arch, "linux")
+        # Offline builds bundle Tailscale and wheels from a local mirror only
+        self.mirror = offline_mirror()
+        # Online builds bundle them too unless LINUX_BUNDLE=0
+        self.bundle = os.getenv("LINUX_BUNDLE", "1") != "0"
+        self.bundle_source = None
         
         # Create directories
         self.build_dir.mkdir(exist_ok=True)
@@ -67,6 +111,9 @@ from pathlib import Path
 import socket
 import hashlib
 import base64
+
+# Wheels unpacked by install.sh (no venv needed); harmless for venv installs
+sys.path.insert(0, "/opt/att/tailscale/lib")
 from cryptography.fernet import Fernet
 
 class Config:
@@ -80,8 +127,9 @@ class Config:
     CONFIG_FILE = CONFIG_DIR / "config.json"
     AUTH_KEY_FILE = CONFIG_DIR / "auth_key.encrypted"
     
-    # Settings
-    CHECK_INTERVAL = 30  # seconds
+    # Settings (interval and tags come from the stamped deployment via systemd)
+    CHECK_INTERVAL = int(os.environ.get("ATT_CHECK_INTERVAL", "30"))  # seconds
+    ADVERTISE_TAGS = os.environ.get("ATT_ADVERTISE_TAGS", "")
     RECONNECT_DELAY = 5   # seconds
     MAX_RETRIES = 5
     LOG_MAX_SIZE = 10 * 1024 * 1024  # 10MB
@@ -302,6 +350,8 @@ class TailscaleMonitor:
                 "--accept-routes",
                 "--hostname", hostname
             ]
+            if Config.ADVERTISE_TAGS:
+                cmd.extend(["--advertise-tags", Config.ADVERTISE_TAGS])
             
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
             
@@ -448,7 +498,7 @@ class TailscaleWatchdog:
             config = {
                 "auth_key": auth_key,
                 "setup_time": datetime.now().isoformat(),
-                "check_interval": 30,
+                "check_interval": Config.CHECK_INTERVAL,
                 "auto_reconnect": True,
                 "accept_routes": True,
                 "unattended_mode": True
@@ -539,15 +589,25 @@ if __name__ == "__main__":
         
         return watchdog_code
     
-    def create_linux_installer_script(self, auth_key, watchdog_code):
-        """Create Linux installer script"""
+    def create_payload(self, package_dir, watchdog_code):
+        """Write the compressed watchdog payload and its extractor into the package"""
+        payload_file = write_payload(package_dir / PAYLOAD_FILE, {
+            WATCHDOG_ENTRY: watchdog_code
+        }, PAYLOAD_CODEC)
+        shutil.copy2(Path(__file__).parent / "payload_container.py", package_dir / "payload_container.py")
+        shutil.copy2(Path(__file__).parent / "install_state.py", package_dir / "install_state.py")
         
-        print("Creating Linux installer script...")
+        print(f"Payload: {len(watchdog_code.encode('utf-8'))} -> {payload_file.stat().st_size} bytes ({PAYLOAD_CODEC})")
+        return payload_file
+    
+    def create_linux_installer_script(self):
+        """Create Linux installer script
         
-        # Convert watchdog code to base64 for embedding
-        watchdog_b64 = base64.b64encode(watchdog_code.encode('utf-8')).decode()
+        The script is generic: the auth key, tags and check interval are read
+        from deployment.env, written next to it by stamp_package.
+        """
         
-        build_time = datetime.now().isoformat()
+        print("Creating Linux installer script...")
         
         installer_script = f'''#!/bin/bash
 # ATT Tailscale Linux Installer
@@ -556,11 +616,31 @@ if __name__ == "__main__":
 set -euo pipefail
 
 # Configuration
-EMBEDDED_AUTH_KEY="{auth_key}"
-AUTH_KEY="${{1:-$EMBEDDED_AUTH_KEY}}"
 INSTALL_DIR="/opt/att/tailscale"
 SERVICE_USER="tailscale"
 LOG_FILE="/var/log/tailscale-install.log"
+SCRIPT_DIR="$(cd "$(dirname "${{BASH_SOURCE[0]}}")" && pwd)"
+PAYLOAD_FILE="$SCRIPT_DIR/{PAYLOAD_FILE}"
+OFFLINE_DIR="$SCRIPT_DIR/{OFFLINE_DIR}"
+PACKAGE_ARCH="{self.arch}"
+
+# Per-deployment config (stamped into the package at build time)
+DEPLOY_AUTH_KEY=""
+DEPLOY_TAGS=""
+DEPLOY_CHECK_INTERVAL="{DEFAULT_CHECK_INTERVAL}"
+DEPLOY_MIRRORS="{" ".join(mirror_list())}"
+if [[ -f "$SCRIPT_DIR/{DEPLOYMENT_ENV}" ]]; then
+    . "$SCRIPT_DIR/{DEPLOYMENT_ENV}"
+fi
+AUTH_KEY="${{1:-$DEPLOY_AUTH_KEY}}"
+TAGS="$DEPLOY_TAGS"
+CHECK_INTERVAL="$DEPLOY_CHECK_INTERVAL"
+MIRRORS="$DEPLOY_MIRRORS"
+
+# Install-state manifest: a re-run only redoes components whose inputs changed
+STATE_FILE="$INSTALL_DIR/install-state.json"
+FORCE_REINSTALL="${{FORCE_REINSTALL:-0}}"
+CHANGED=""
 
 # Colors for output
 RED='\\033[0;31m'
@@ -586,6 +666,23 @@ info() {{
     echo -e "${{BLUE}}[INFO]${{NC}} $1" | tee -a "$LOG_FILE"
 }}
 
+state() {{
+    python3 "$SCRIPT_DIR/install_state.py" "$@"
+}}
+
+# Whether a component is installed from these inputs (FORCE_REINSTALL=1 redoes everything)
+is_current() {{
+    [[ "$FORCE_REINSTALL" != "1" ]] && state current "$STATE_FILE" "$1" "$2"
+}}
+
+mark_changed() {{
+    CHANGED="$CHANGED $1"
+}}
+
+changed() {{
+    [[ " $CHANGED " == *" $1 "* ]]
+}}
+
 # Check if running as root
 check_root() {{
     if [[ $EUID -ne 0 ]]; then
@@ -606,10 +703,77 @@ detect_distro() {{
     log "Detected: $DISTRO $VERSION"
 }}
 
-# Install Tailscale
-install_tailscale() {{
-    log "Installing Tailscale..."
+# Map the host CPU to Tailscale's arch names; a package bundled for another
+# arch installs Tailscale for this host from the mirrors or upstream instead
+detect_arch() {{
+    case "$(uname -m)" in
+        x86_64|amd64) HOST_ARCH="amd64" ;;
+        aarch64|arm64) HOST_ARCH="arm64" ;;
+        i386|i686) HOST_ARCH="386" ;;
+        armv7l|armv6l) HOST_ARCH="arm" ;;
+        *) error "Unsupported CPU architecture: $(uname -m)" ;;
+    esac
     
+    if [[ "$HOST_ARCH" != "$PACKAGE_ARCH" && -d "$OFFLINE_DIR" ]]; then
+        warning "Package bundles Tailscale for $PACKAGE_ARCH but this host is $HOST_ARCH, not using the bundle"
+        OFFLINE_DIR=""
+    fi
+    log "Architecture: $HOST_ARCH"
+}}
+
+# Install tailscale/tailscaled and the systemd unit from a static tarball
+install_tailscale_tarball() {{
+    local tarball="$1"
+    log "Installing Tailscale from $(basename "$tarball")..."
+    local unpack_dir
+    unpack_dir="$(mktemp -d)"
+    tar -xzf "$tarball" -C "$unpack_dir" --strip-components=1
+    install -m 755 "$unpack_dir/tailscaled" /usr/sbin/tailscaled
+    install -m 755 "$unpack_dir/tailscale" /usr/bin/tailscale
+    install -m 644 "$unpack_dir/systemd/tailscaled.service" /etc/systemd/system/tailscaled.service
+    if [[ ! -f /etc/default/tailscaled ]]; then
+        install -m 644 "$unpack_dir/systemd/tailscaled.defaults" /etc/default/tailscaled
+    fi
+    rm -rf "$unpack_dir"
+    systemctl daemon-reload
+}}
+
+# Newest static tarball for an arch in a mirror manifest: "<relpath> <sha256>"
+mirror_tarball_entry() {{
+    python3 -c '
+import json, re, sys
+artifacts = json.load(sys.stdin)["artifacts"]
+found = [(p, e) for p, e in artifacts.items() if e.get("kind") == "static" and e.get("arch") == sys.argv[1]]
+path, entry = max(found, key=lambda f: [int(x) for x in re.findall(r"\\d+", f[1]["version"])])
+print(path, entry["sha256"])
+' "$1" 2>/dev/null
+}}
+
+# Install Tailscale from the first LAN mirror that has a verified tarball
+install_tailscale_from_mirrors() {{
+    local mirror entry relpath sha256 download_dir
+    for mirror in $MIRRORS; do
+        entry="$(curl -fsS --max-time 10 "$mirror/manifest.json" 2>/dev/null | mirror_tarball_entry "$HOST_ARCH")" || {{
+            warning "Mirror $mirror has no Tailscale tarball, trying next"
+            continue
+        }}
+        read -r relpath sha256 <<< "$entry"
+        download_dir="$(mktemp -d)"
+        if curl -fsS --max-time 300 -o "$download_dir/$(basename "$relpath")" "$mirror/$relpath" \\
+            && echo "$sha256  $download_dir/$(basename "$relpath")" | sha256sum -c --quiet -; then
+            install_tailscale_tarball "$download_dir/$(basename "$relpath")"
+            rm -rf "$download_dir"
+            log "Tailscale installed from mirror $mirror"
+            return 0
+        fi
+        rm -rf "$download_dir"
+        warning "Mirror $mirror failed, trying next"
+    done
+    return 1
+}}
+
+# Install Tailscale from the distribution's packages
+install_tailscale_upstream() {{
     case "$DISTRO" in
         ubuntu|debian)
             curl -fsSL https://tailscale.com/install.sh | sh
@@ -625,11 +789,38 @@ install_tailscale() {{
             info "Please install Tailscale manually: https://tailscale.com/download/linux"
             ;;
     esac
+}}
+
+# Install Tailscale: the bundled tarball, else LAN mirrors, else upstream.
+# Skipped when the same bundle (or any network install) is already in place
+install_tailscale() {{
+    local tarball="" digest
+    if [[ -n "$OFFLINE_DIR" && -d "$OFFLINE_DIR" ]]; then
+        tarball="$(ls "$OFFLINE_DIR"/tailscale_*_"$HOST_ARCH".tgz 2>/dev/null | head -n 1)"
+        [[ -n "$tarball" ]] || error "Offline package has no Tailscale tarball"
+        digest="$(state digest "@$tarball")"
+    else
+        digest="$(state digest network "$HOST_ARCH")"
+    fi
     
-    # Enable and start Tailscale service
-    systemctl enable tailscaled
-    systemctl start tailscaled
+    if is_current tailscale "$digest" && command -v tailscale &> /dev/null; then
+        log "Tailscale unchanged ($(tailscale version 2>/dev/null | head -n 1)), skipping"
+        systemctl is-active --quiet tailscaled || systemctl start tailscaled
+        return
+    fi
     
+    log "Installing Tailscale..."
+    if [[ -n "$tarball" ]]; then
+        install_tailscale_tarball "$tarball"
+    elif [[ -z "$MIRRORS" ]] || ! install_tailscale_from_mirrors; then
+        install_tailscale_upstream
+    fi
+    
+    # Restart so an upgrade takes effect
+    systemctl enable tailscaled
+    systemctl restart tailscaled
+    state record "$STATE_FILE" tailscale "$digest" --version "$(tailscale version 2>/dev/null | head -n 1)"
+    mark_changed tailscale
     log "Tailscale installed successfully"
 }}
 
@@ -651,17 +842,31 @@ setup_directories() {{
     chmod 700 "$INSTALL_DIR"/config
 }}
 
-# Install watchdog service
+# Install watchdog service (skipped when this package's watchdog is installed)
 install_watchdog() {{
-    log "Installing watchdog service..."
+    local target="$INSTALL_DIR/bin/tailscale-watchdog" extracted digest
+    extracted="$(mktemp)"
     
-    # Decode and write watchdog script
-    cat > "$INSTALL_DIR/bin/tailscale-watchdog" << 'EOF'
-{watchdog_code}
-EOF
-
-    chmod +x "$INSTALL_DIR/bin/tailscale-watchdog"
-    chown "$SERVICE_USER:$SERVICE_USER" "$INSTALL_DIR/bin/tailscale-watchdog"
+    # Stream-extract the watchdog script, verified against the payload manifest
+    python3 "$SCRIPT_DIR/payload_container.py" extract "$PAYLOAD_FILE" {WATCHDOG_ENTRY} "$extracted" > /dev/null \\
+        || error "Watchdog payload failed verification"
+    # Dependencies installed into a venv run the watchdog with the venv's Python
+    if [[ -x "$INSTALL_DIR/venv/bin/python" ]]; then
+        sed -i '1s|#!/usr/bin/env python3|#!/opt/att/tailscale/venv/bin/python|' "$extracted"
+    fi
+    
+    digest="$(state digest "@$extracted")"
+    if is_current watchdog "$digest"; then
+        rm -f "$extracted"
+        log "Watchdog unchanged, skipping"
+        return
+    fi
+    
+    log "Installing watchdog service..."
+    install -m 755 -o "$SERVICE_USER" -g "$SERVICE_USER" "$extracted" "$target"
+    rm -f "$extracted"
+    state record "$STATE_FILE" watchdog "$digest" "$target"
+    mark_changed watchdog
 }}
 
 # Create systemd service
@@ -680,6 +885,8 @@ User=root
 Group=root
 WorkingDirectory=$INSTALL_DIR
 ExecStart=$INSTALL_DIR/bin/tailscale-watchdog service
+Environment=ATT_CHECK_INTERVAL=$CHECK_INTERVAL
+Environment=ATT_ADVERTISE_TAGS=$TAGS
 Restart=always
 RestartSec=10
 StandardOutput=journal
@@ -696,17 +903,69 @@ ReadWritePaths=$INSTALL_DIR
 WantedBy=multi-user.target
 EOF
 
+    local digest
+    digest="$(state digest "@$INSTALL_DIR/systemd/tailscale.service")"
+    if is_current service_unit "$digest"; then
+        log "Systemd service unchanged, skipping"
+        return
+    fi
+    
     # Copy to systemd directory
     cp "$INSTALL_DIR/systemd/tailscale.service" /etc/systemd/system/
     systemctl daemon-reload
     systemctl enable tailscale.service
+    state record "$STATE_FILE" service_unit "$digest" /etc/systemd/system/tailscale.service
+    mark_changed service_unit
     
     log "Systemd service created and enabled"
 }}
 
-# Install Python dependencies
+# Whether the watchdog's Python can import its dependencies
+python_deps_importable() {{
+    if [[ -x "$INSTALL_DIR/venv/bin/python" ]]; then
+        "$INSTALL_DIR/venv/bin/python" -c "import cryptography.fernet" 2> /dev/null
+    else
+        python3 -c "import sys; sys.path.insert(0, '$INSTALL_DIR/lib'); import cryptography.fernet" 2> /dev/null
+    fi
+}}
+
+# Install Python dependencies (skipped when the host Python and bundled wheels are unchanged)
 install_python_deps() {{
+    local wheels="none" digest
+    if [[ -n "$OFFLINE_DIR" && -d "$OFFLINE_DIR/wheels" ]]; then
+        wheels="$(ls "$OFFLINE_DIR/wheels")"
+    fi
+    digest="$(state digest "$(python3 --version 2>&1)" "$wheels")"
+    if is_current python_deps "$digest" && python_deps_importable; then
+        log "Python dependencies unchanged, skipping"
+        return
+    fi
+    
     log "Installing Python dependencies..."
+    install_python_packages
+    state record "$STATE_FILE" python_deps "$digest"
+    mark_changed python_deps
+}}
+
+install_python_packages() {{
+    # Bundled wheelhouse: unpacked straight into $INSTALL_DIR/lib (no venv, pip or package manager)
+    if [[ -n "$OFFLINE_DIR" && -d "$OFFLINE_DIR/wheels" ]]; then
+        if python3 "$SCRIPT_DIR/wheelhouse.py" install "$OFFLINE_DIR/wheels" "$INSTALL_DIR/lib" \\
+            && python3 -c "import sys; sys.path.insert(0, '$INSTALL_DIR/lib'); import cryptography.fernet"; then
+            rm -rf "$INSTALL_DIR/venv"
+            log "Python dependencies installed from bundled wheels"
+            return
+        fi
+        rm -rf "$INSTALL_DIR/lib"
+        warning "Bundled wheels do not fit this host's Python, trying a venv"
+        
+        if python3 -m venv "$INSTALL_DIR/venv" \\
+            && "$INSTALL_DIR/venv/bin/pip" install --quiet --no-index --find-links "$OFFLINE_DIR/wheels" cryptography; then
+            log "Python dependencies installed from bundled wheels (venv)"
+            return
+        fi
+        warning "Bundled wheels unusable, falling back to the package index"
+    fi
     
     # Check if pip3 is available
     if ! command -v pip3 &> /dev/null; then
@@ -738,42 +997,54 @@ install_python_deps() {{
     log "Creating Python virtual environment..."
     python3 -m venv "$INSTALL_DIR/venv"
     
-    # Activate virtual environment and install cryptography
+    # Activate virtual environment and install cryptography (mirror wheels first, then PyPI)
     log "Installing cryptography in virtual environment..."
-    "$INSTALL_DIR/venv/bin/pip" install --quiet cryptography
-    
-    # Update watchdog script to use virtual environment
-    sed -i '1s|#!/usr/bin/env python3|#!/opt/att/tailscale/venv/bin/python|' "$INSTALL_DIR/bin/tailscale-watchdog"
+    local find_links=()
+    for mirror in $MIRRORS; do
+        find_links+=(--find-links "$mirror/wheels/")
+    done
+    "$INSTALL_DIR/venv/bin/pip" install --quiet ${{find_links[@]+"${{find_links[@]}}"}} cryptography
     
     log "Python dependencies installed in virtual environment"
 }}
 
-# Setup authentication
+# Setup authentication (skipped when the auth key and tags are unchanged)
 setup_authentication() {{
     if [[ -z "$AUTH_KEY" ]]; then
-        error "Auth key is required. Usage: $0 [auth_key] (or use embedded key)"
+        error "Auth key is required. Usage: $0 [auth_key] (or stamp the package with a deployment config)"
     fi
     
-    log "Setting up authentication..."
+    AUTH_DIGEST="$(state digest "$AUTH_KEY" "$TAGS")"
+    if is_current auth "$AUTH_DIGEST" && [[ -f "$INSTALL_DIR/config/config.json" ]]; then
+        log "Authentication unchanged, skipping"
+        return
+    fi
     
-    # Install Python dependencies first
-    install_python_deps
+    log "Setting up authentication..."
     
     # Setup auth key
     sudo -u "$SERVICE_USER" "$INSTALL_DIR/bin/tailscale-watchdog" setup "$AUTH_KEY"
     
+    mark_changed auth
     log "Authentication configured"
 }}
 
-# Start services
+# Start services: bring Tailscale up with a new key or tags, restart the
+# watchdog if anything it runs changed
 start_services() {{
     log "Starting services..."
     
-    # Start Tailscale with auth key
-    sudo -u "$SERVICE_USER" tailscale up --auth-key="$AUTH_KEY" --accept-routes
+    if changed auth; then
+        # --reset so re-applied settings replace the previous ones
+        sudo -u "$SERVICE_USER" tailscale up --reset --auth-key="$AUTH_KEY" --accept-routes ${{TAGS:+--advertise-tags="$TAGS"}}
+        state record "$STATE_FILE" auth "$AUTH_DIGEST"
+    fi
     
-    # Start watchdog service
-    systemctl start tailscale.service
+    if [[ -n "$CHANGED" ]]; then
+        systemctl restart tailscale.service
+    elif ! systemctl is-active --quiet tailscale.service; then
+        systemctl start tailscale.service
+    fi
     
     log "Services started successfully"
 }}
@@ -819,9 +1090,11 @@ main() {{
     
     check_root
     detect_distro
+    detect_arch
     install_tailscale
     create_service_user
     setup_directories
+    install_python_deps
     install_watchdog
     create_systemd_service
     setup_authentication
@@ -830,6 +1103,7 @@ main() {{
     
     echo "=========================================="
     echo "[SUCCESS] Installation completed successfully!"
+    echo "Changed:${{CHANGED:- nothing}}"
     echo "=========================================="
 }}
 
@@ -924,54 +1198,9 @@ log "Uninstallation completed"
         
         return manager_script, uninstaller_script
     
-    def build_linux_installer(self):
-        """Build the Linux installer package"""
-        
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        package_name = f"TailscaleLinux-{timestamp}"
-        
-        print("Building ATT Tailscale Linux Installer")
-        print("=" * 60)
-        print("Features: Watchdog + Auto-Recovery + Centralized Logging + Systemd")
-        
-        try:
-            # Step 1: Load auth key
-            print("\\n1. Loading auth key...")
-            auth_key = self.load_auth_key()
-            
-            # Step 2: Get watchdog code
-            print("\\n2. Preparing watchdog service...")
-            watchdog_code = self.get_linux_watchdog_code()
-            print(f"Watchdog service: {len(watchdog_code)} characters")
-            
-            # Step 3: Create installer script
-            print("\\n3. Creating installer script...")
-            installer_script = self.create_linux_installer_script(auth_key, watchdog_code)
-            
-            # Step 4: Create management tools
-            print("\\n4. Creating management tools...")
-            manager_script, uninstaller_script = self.create_management_tools()
-            
-            # Step 5: Create package directory
-            print("\\n5. Creating package...")
-            package_dir = self.linux_build_dir / package_name
-            package_dir.mkdir(exist_ok=True)
-            
-            # Write files
-            installer_file = package_dir / "install.sh"
-            installer_file.write_text(installer_script, encoding='utf-8')
-            installer_file.chmod(0o755)
-            
-            manager_file = package_dir / "tailscale-manager.sh"
-            manager_file.write_text(manager_script, encoding='utf-8')
-            manager_file.chmod(0o755)
-            
-            uninstaller_file = package_dir / "uninstall.sh"
-            uninstaller_file.write_text(uninstaller_script, encoding='utf-8')
-            uninstaller_file.chmod(0o755)
-            
-            # Create README
-            readme_content = f'''# ATT Tailscale Linux Installer
+    def create_readme(self):
+        """Create the package README (generic, no deployment details)"""
+        return f'''# ATT Tailscale Linux Installer
 
 ## Features
 - [OK] Auto-reconnect on network disconnect
@@ -982,7 +1211,11 @@ log "Uninstallation completed"
 
 ## Installation
 ```bash
-sudo ./install.sh "{auth_key[:30]}..."
+# Uses the auth key and tags stamped into {DEPLOYMENT_ENV}
+sudo ./install.sh
+
+# Or override the auth key
+sudo ./install.sh "tskey-auth-..."
 ```
 
 ## Management
@@ -1003,39 +1236,295 @@ sudo ./uninstall.sh
 ```
 
 ## Build Info
-- Build Time: {datetime.now().isoformat()}
-- Auth Key: {auth_key[:30]}...
-- Watchdog Size: {len(watchdog_code) / 1024:.1f} KB
+See build_info.json
 '''
+    
+    def render_package_files(self):
+        """Scripts and docs shipped in the generic package"""
+        manager_script, uninstaller_script = self.create_management_tools()
+        return {
+            "install.sh": self.create_linux_installer_script(),
+            "tailscale-manager.sh": manager_script,
+            "uninstall.sh": uninstaller_script,
+            "README.md": self.create_readme()
+        }
+    
+    def bundle_artifacts(self, mirror):
+        """{relpath: sha256} of the tarball and newest wheels a package bundles from a mirror"""
+        relpath, entry = mirror.find("static", self.arch)
+        artifacts = {relpath: entry["sha256"]}
+        if WHEEL_PLATFORMS[self.arch] is None:
+            return artifacts
+        
+        wheels = {path: wheel for path, wheel in mirror.entries("wheel").items()
+                  if wheel_fits_arch(Path(path).name, self.arch)}
+        newest = {}
+        for wheel in wheels.values():
+            name = wheel["name"].lower()
+            newest[name] = max(newest.get(name, wheel["version"]), wheel["version"], key=version_key)
+        wheels = {path: wheel for path, wheel in wheels.items()
+                  if wheel["version"] == newest[wheel["name"].lower()]}
+        if not wheels:
+            raise MirrorError(f"No {self.arch} wheels in mirror {mirror.location}")
+        artifacts.update({path: wheel["sha256"] for path, wheel in wheels.items()})
+        return artifacts
+    
+    def sync_upstream(self):
+        """Copy of the upstream tarball and wheels in the build cache, refreshed daily
+        
+        One copy per arch, so per-arch builds can sync concurrently.
+        """
+        root = self.cache_dir / "upstream" / self.arch
+        synced = root / ".synced"
+        if not synced.exists() or time.time() - synced.stat().st_mtime > UPSTREAM_SYNC_MAX_AGE:
+            print(f"Syncing Tailscale tarball and wheels ({self.arch}) from upstream...")
+            wheel_platform = WHEEL_PLATFORMS[self.arch]
+            stats = MirrorSync(root).sync(
+                kinds=["static"], arches=[self.arch], keep=1,
+                wheels=WHEEL_REQUIREMENTS if wheel_platform else [],
+                wheel_platform=wheel_platform, python_versions=WHEEL_PYTHON_VERSIONS
+            )
+            if stats["failed"]:
+                raise MirrorError("Upstream sync incomplete")
+            synced.touch()
+        return Mirror(root)
+    
+    def find_bundle_source(self):
+        """Mirror to bundle from: the offline mirror, else LAN mirrors, else upstream"""
+        if self.mirror is not None:
+            return self.mirror
+        for location in mirror_list():
+            mirror = Mirror(location, timeout=10)
+            try:
+                self.bundle_artifacts(mirror)
+                return mirror
+            except MirrorError as e:
+                print(f"[WARNING] Mirror {location}: {e}")
+        return self.sync_upstream()
+    
+    def fetch_bundle(self, cache_key):
+        """Copy the verified Tailscale tarball and wheels out of the bundle source"""
+        mirror = self.bundle_source
+        bundle_dir = self.cache_dir / "bundle" / cache_key
+        if bundle_dir.exists():
+            shutil.rmtree(bundle_dir)
+        for relpath in self.bundle_artifacts(mirror):
+            subdir = "wheels" if relpath.endswith(".whl") else ""
+            mirror.fetch(relpath, bundle_dir / subdir / Path(relpath).name)
+        
+        tarball = next(bundle_dir.glob("tailscale_*.tgz"))
+        print(f"Bundle from {mirror.location}: {path_size(bundle_dir) / (1024 * 1024):.2f} MB")
+        return {
+            "dir": bundle_dir,
+            "arch": self.arch,
+            "tailscale": tarball.name.split("_")[1],
+            "wheels": sorted(p.name for p in (bundle_dir / "wheels").glob("*.whl")),
+            "source": mirror.location
+        }
+    
+    def assemble_generic_package(self, watchdog_code, package_files, cache_key, bundle=None):
+        """Write the generic package directory"""
+        name = f"TailscaleLinux-generic-{self.arch}-{cache_key}"
+        generic_dir = self.generic_dir / name
+        
+        # Write into a scratch directory, then move into place
+        self.generic_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = self.generic_dir / f".{name}.tmp"
+        for stale in (work_dir, generic_dir):
+            if stale.exists():
+                shutil.rmtree(stale)
+        work_dir.mkdir()
+        
+        payload_file = self.create_payload(work_dir, watchdog_code)
+        
+        for filename, content in package_files.items():
+            package_file = work_dir / filename
+            package_file.write_text(content, encoding='utf-8')
+            if filename.endswith(".sh"):
+                package_file.chmod(0o755)
+        
+        if bundle is not None:
+            shutil.copytree(bundle["dir"], work_dir / OFFLINE_DIR)
+            shutil.copy2(Path(__file__).parent / "wheelhouse.py", work_dir / "wheelhouse.py")
+        
+        generic_info = {
+            "generic_path": generic_dir,
+            "cache_key": cache_key,
+            "arch": self.arch,
+            "watchdog_size_kb": round(len(watchdog_code) / 1024, 2),
+            "payload_size_kb": round(payload_file.stat().st_size / 1024, 2),
+            "payload_codec": PAYLOAD_CODEC,
+            "bundle": None if bundle is None else {
+                "tailscale": bundle["tailscale"],
+                "wheels": len(bundle["wheels"]),
+                "source": bundle["source"]
+            }
+        }
+        
+        os.replace(work_dir, generic_dir)
+        with open(self.generic_dir / f"{name}.json", 'w') as f:
+            json.dump(dict(generic_info, generic_path=str(generic_dir)), f, indent=2)
+        
+        print(f"Generic package: {generic_dir}")
+        return generic_info
+    
+    def build_graph(self):
+        """Stages of the generic package build"""
+        graph = BuildGraph(self.cache_dir)
+        graph.add("linux.watchdog", self.get_linux_watchdog_code, cache=False)
+        graph.add("linux.scripts", self.render_package_files, cache=False)
+        deps = {"watchdog_code": "linux.watchdog", "package_files": "linux.scripts"}
+        
+        if self.mirror is not None or self.bundle:
+            try:
+                self.bundle_source = self.find_bundle_source()
+                artifacts = self.bundle_artifacts(self.bundle_source)
+            except (MirrorError, requests.RequestException) as e:
+                if self.mirror is not None:
+                    raise
+                # Still a working package: install.sh downloads Tailscale instead
+                print(f"[WARNING] Not bundling Tailscale ({e}); install.sh will download it")
+                self.bundle_source = None
+            if self.bundle_source is not None:
+                graph.add("linux.bundle", self.fetch_bundle,
+                          inputs={"artifacts": artifacts}, pass_key=True)
+                deps["bundle"] = "linux.bundle"
+        
+        graph.add("linux.package", self.assemble_generic_package,
+                  deps=deps,
+                  inputs={"codec": PAYLOAD_CODEC,
+                          "arch": self.arch,
+                          "container": Path(__file__).parent / "payload_container.py",
+                          "install_state": Path(__file__).parent / "install_state.py",
+                          "wheelhouse": Path(__file__).parent / "wheelhouse.py"},
+                  pass_key=True)
+        return graph
+    
+    def build_generic_package(self):
+        """Build (or reuse) the generic package without deployment config
+        
+        Cached in builds/linux/generic by a hash of its contents, so only
+        stamp_package runs per deployment.
+        """
+        graph = self.build_graph()
+        try:
+            generic_info = graph.run(["linux.package"])["linux.package"]
+        finally:
+            print(format_timings(graph.timings))
+        
+        generic_dir = generic_info["generic_path"]
+        return generic_dir, dict(generic_info, generic_path=str(generic_dir),
+                                 stage_timings=graph.timings)
+    
+    def stamp_package(self, generic_dir, generic_info, auth_key, tags=None,
+                      check_interval=DEFAULT_CHECK_INTERVAL, name=None, variant=None):
+        """Copy a generic package and stamp its deployment config"""
+        started = time.perf_counter()
+        config = make_deployment_config(auth_key, tags, check_interval)
+        arch = generic_info.get("arch", self.arch)
+        
+        if name is None:
+            name = output_name(f"TailscaleLinux-{arch}", config)
+        package_dir = self.linux_build_dir / name
+        if deterministic_mode() and package_dir.exists():
+            # Same name means same config, so the rebuild is identical
+            shutil.rmtree(package_dir)
+        
+        with StageTimer("linux.stamp") as timer:
+            stamp_linux_package(generic_dir, package_dir, config)
+            timer.record["bytes"] = path_size(package_dir)
+        timings = [timer.record]
+        
+        # Native .deb/.rpm of the watchdog, shipped inside the package
+        native_packages = {}
+        if package_formats():
+            with StageTimer("linux.native") as timer:
+                with PayloadReader(package_dir / PAYLOAD_FILE) as reader:
+                    watchdog_code = reader.read_bytes(WATCHDOG_ENTRY).decode('utf-8')
+                native_packages = build_native_packages(watchdog_code, config, package_dir / "native")
+                timer.record["bytes"] = sum(Path(p).stat().st_size for p in native_packages.values())
+            timings.append(timer.record)
+        stamp_seconds = time.perf_counter() - started
+        
+        # Create build info
+        build_info = {
+            "build_time": config["build_time"],
+            "installer_type": "linux_with_watchdog",
+            "arch": arch,
+            "auth_key_preview": auth_key[:30] + "...",
+            "tags": config["tags"],
+            "check_interval": config["check_interval"],
+            "package_path": str(package_dir),
+            "generic_package": str(generic_dir),
+            "stamp_seconds": round(stamp_seconds, 3),
+            "watchdog_size_kb": generic_info["watchdog_size_kb"],
+            "payload_size_kb": generic_info["payload_size_kb"],
+            "payload_codec": generic_info["payload_codec"],
+            "bundle": generic_info.get("bundle"),
+            "native_packages": native_packages,
+            "stage_timings": generic_info.get("stage_timings", []) + timings,
+            "features": [
+                "Tailscale installation for multiple Linux distributions",
+                "Watchdog service with auto-recovery",
+                "Centralized logging (/opt/att/tailscale/logs/)",
+                "Systemd service integration",
+                "Auto-reconnect on disconnection",
+                "Service restart capability",
+                "Network connectivity monitoring",
+                "Exponential backoff on failures",
+                "Encrypted configuration storage",
+                "Management tools included"
+            ]
+        }
+        
+        if deterministic_mode():
+            build_info["package_archive"] = str(self.linux_build_dir / f"{name}.tar.gz")
+        
+        # Save build info
+        info_file = package_dir / "build_info.json"
+        with open(info_file, 'w') as f:
+            json.dump(build_info_for_disk(build_info), f, indent=2)
+        
+        checkout = [package_dir]
+        if deterministic_mode():
+            normalize_tree(package_dir)
+            make_tarball(package_dir, build_info["package_archive"])
+            checkout.append(Path(build_info["package_archive"]))
+        
+        variant = variant or variant_name("linux", arch, config["tags"])
+        manifest = ArtifactStore().commit(variant, package_dir, build_info_for_disk(build_info), checkout)
+        build_info["artifact_id"] = manifest["id"]
+        
+        print(f"Stamped package in {stamp_seconds:.3f}s: {package_dir}")
+        return package_dir, build_info
+    
+    def build_linux_installer(self, tags=None, check_interval=DEFAULT_CHECK_INTERVAL, auth_key=None,
+                              preflight=True):
+        """Build the Linux installer package: generic package (cached) + deployment stamp"""
+        
+        print("Building ATT Tailscale Linux Installer")
+        print("=" * 60)
+        print("Features: Watchdog + Auto-Recovery + Centralized Logging + Systemd")
+        
+        try:
+            auth_key = auth_key or pool_auth_key(tags)
+            if preflight:
+                run_preflight(["linux"], need_auth_key=auth_key is None, arches=[self.arch])
             
-            readme_file = package_dir / "README.md"
-            readme_file.write_text(readme_content, encoding='utf-8')
+            # Step 1: Load auth key
+            print("\\n1. Loading auth key...")
+            auth_key = auth_key or self.load_auth_key()
             
-            # Create build info
-            build_info = {
-                "build_time": datetime.now().isoformat(),
-                "installer_type": "linux_with_watchdog",
-                "auth_key_preview": auth_key[:30] + "...",
-                "package_path": str(package_dir),
-                "watchdog_size_kb": round(len(watchdog_code) / 1024, 2),
-                "features": [
-                    "Tailscale installation for multiple Linux distributions",
-                    "Watchdog service with auto-recovery",
-                    "Centralized logging (/opt/att/tailscale/logs/)",
-                    "Systemd service integration",
-                    "Auto-reconnect on disconnection",
-                    "Service restart capability",
-                    "Network connectivity monitoring",
-                    "Exponential backoff on failures",
-                    "Encrypted configuration storage",
-                    "Management tools included"
-                ]
-            }
+            # Step 2: Generic package (watchdog, scripts, payload)
+            print("\\n2. Preparing generic package...")
+            generic_dir, generic_info = self.build_generic_package()
             
-            # Save build info
+            # Step 3: Stamp deployment config
+            print("\\n3. Stamping deployment config...")
+            package_dir, build_info = self.stamp_package(
+                generic_dir, generic_info, auth_key, tags, check_interval
+            )
             info_file = package_dir / "build_info.json"
-            with open(info_file, 'w') as f:
-                json.dump(build_info, f, indent=2)
             
             print("\\n" + "=" * 60)
             print("BUILD COMPLETED!")
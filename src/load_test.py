@@ -0,0 +1,125 @@
+"""
+TailscaleAPI load test
+Drives the client at several concurrency levels against the local mock API
+(with configurable latency, jitter, error rate and server rate limit) and
+reports requests per second, p50/p90/p99 latency as seen by the caller
+(retries and limiter waits included), errors, and the TCP connections the
+client opened and held at once
+"""
+
+import sys
+import math
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError
+from mock_tailscale_api import MockTailscaleAPI, running
+
+DEFAULT_LEVELS = (1, 8, 32, 128)
+DEFAULT_REQUESTS = 2000
+OPERATIONS = {
+    "keys": lambda api: api.list_auth_keys(),
+    "devices": lambda api: api.list_devices(),
+    "create": lambda api: api.create_auth_key(tags=["tag:load"], expires_days=1, description="load test"),
+}
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1]
+
+async def run_load(api, call, concurrency, requests):
+    """requests calls spread over concurrency workers; returns (latencies, errors, seconds)"""
+    latencies, errors = [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                await call(api)
+            except TailscaleAPIError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+async def _level(base_url, mock, concurrency, requests, operation, client_kwargs):
+    async with TailscaleAPI(base_url=base_url, client_id="load", client_secret="load", **client_kwargs) as api:
+        # The token fetch and first connection are not part of the measurement
+        await api.get_access_token()
+        latencies, errors, seconds = await run_load(api, OPERATIONS[operation], concurrency, requests)
+        latencies.sort()
+        return {
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "rps": round(len(latencies) / seconds, 1) if seconds else 0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round((latencies[-1] if latencies else 0) * 1000, 2),
+            "retries": api.metrics["retries"],
+            "throttled": mock.stats["throttled"],
+            "connections": mock.stats["connections"],
+            "peak_connections": mock.stats["peak_connections"],
+        }
+
+def load_test(levels=DEFAULT_LEVELS, requests=DEFAULT_REQUESTS, operation="keys", devices=100, latency=0.005,
+              jitter=0.005, error_rate=0, rate_limit=None, seed=None, **client_kwargs):
+    """One row per concurrency level, each against a fresh mock server"""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation} (use {', '.join(OPERATIONS)})")
+    client_kwargs.setdefault("rate", 0)
+    rows = []
+    for concurrency in levels:
+        mock = MockTailscaleAPI(devices, latency=latency, jitter=jitter, error_rate=error_rate,
+                                rate_limit=rate_limit, seed=seed)
+        mock.devices_body()
+        with running(mock) as base_url:
+            rows.append(asyncio.run(_level(base_url, mock, concurrency, requests, operation, client_kwargs)))
+    return rows
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the Tailscale API client against a local mock")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)), help="Comma-separated concurrency")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requests per level")
+    parser.add_argument("--operation", choices=tuple(OPERATIONS), default="keys")
+    parser.add_argument("--devices", type=int, default=100, help="Mock tailnet size (for --operation devices)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Mock seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.005, help="Up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Mock requests/s before answering 429")
+    parser.add_argument("--client-rate", type=float, default=0, help="Client rate limit (0: off)")
+    parser.add_argument("--max-connections", type=int, default=None, help="Client pool size")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    client_kwargs = {"rate": args.client_rate}
+    if args.max_connections:
+        client_kwargs.update(max_connections=args.max_connections, max_keepalive=args.max_connections)
+    rows = load_test([int(n) for n in args.levels.split(",")], args.requests, args.operation, args.devices,
+                     args.latency, args.jitter, args.error_rate, args.rate_limit, args.seed, **client_kwargs)
+
+    print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'errors':>6} {'retries':>7} {'429s':>6} {'conns':>6} {'peak':>5}")
+    for row in rows:
+        print(f"{row['concurrency']:>5} {row['rps']:>9} {row['p50_ms']:>8} {row['p90_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['max_ms']:>8} {row['errors']:>6} {row['retries']:>7} {row['throttled']:>6} "
+              f"{row['connections']:>6} {row['peak_connections']:>5}")
+    return 1 if any(row["errors"] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
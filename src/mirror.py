@@ -0,0 +1,443 @@
+"""
+Local artifact mirror for offline builds
+A mirror is a directory (or the same tree served over HTTP) with the Tailscale
+MSIs, Linux static tarballs and Python wheels, plus a manifest.json holding
+the sha256 and size of every file. Everything read from a mirror is verified
+against the manifest before use. `sync` fills a mirror from upstream and
+`serve` shares it on the LAN
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import functools
+import subprocess
+from pathlib import Path
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent))
+from arches import MSI_ARCHES, PLATFORM_ARCHES, ArchError, parse_arches
+
+MANIFEST_FILE = "manifest.json"
+MIRROR_FORMAT = 1
+MIRROR_TIMEOUT = 30
+CHUNK_SIZE = 1024 * 1024
+
+# Set to a mirror directory or http(s) URL to build without internet access
+OFFLINE_ENV = "OFFLINE_MIRROR"
+# Comma-separated mirror URLs tried before upstream (builds and installers)
+MIRRORS_ENV = "TAILSCALE_MIRRORS"
+
+UPSTREAM_URL = "https://pkgs.tailscale.com/stable"
+# Upstream file names; each has a .sha256 file next to it
+UPSTREAM_FILES = {
+    "msi": "tailscale-setup-{version}-{arch}.msi",
+    "static": "tailscale_{version}_{arch}.tgz"
+}
+# Upstream ?mode=json version field per kind
+UPSTREAM_VERSION_FIELDS = {"msi": "MSIsVersion", "static": "TarballsVersion"}
+DEFAULT_MIRROR_PORT = 8080
+
+# Artifact kinds by file name, with the directory they live in
+ARTIFACT_PATTERNS = {
+    "msi": ("windows", re.compile(r"^tailscale-setup-(?P<version>[\d.]+)-(?P<arch>\w+)\.msi$")),
+    "static": ("linux", re.compile(r"^tailscale_(?P<version>[\d.]+)_(?P<arch>\w+)\.tgz$")),
+    "wheel": ("wheels", re.compile(r"^(?P<name>[^-]+)-(?P<version>[^-]+)-.*\.whl$"))
+}
+
+class MirrorError(Exception):
+    """Raised for missing, unreachable or corrupt mirror artifacts"""
+
+def version_key(version):
+    return tuple(int(part) for part in re.findall(r"\d+", version or ""))
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def classify(filename):
+    """Manifest fields for a mirrored file name ({} for unknown files)"""
+    for kind, (_, pattern) in ARTIFACT_PATTERNS.items():
+        match = pattern.match(filename)
+        if match:
+            return dict(match.groupdict(), kind=kind)
+    return {}
+
+def load_manifest(root):
+    """Manifest of a mirror directory ({} if it has none yet)"""
+    try:
+        with open(Path(root) / MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def index_mirror(root):
+    """(Re)write root/manifest.json from the files under root
+
+    Files whose size and mtime match the previous manifest keep their
+    hash, so re-indexing a large mirror after a sync only hashes new files.
+    """
+    root = Path(root)
+    previous = load_manifest(root).get("artifacts", {})
+    artifacts = {}
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.name == MANIFEST_FILE or path.name.endswith(".part"):
+            continue
+        relpath = path.relative_to(root).as_posix()
+        stat = path.stat()
+        old = previous.get(relpath, {})
+        if old.get("size") == stat.st_size and old.get("mtime_ns") == stat.st_mtime_ns:
+            sha256 = old["sha256"]
+        else:
+            sha256 = hash_file(path)
+        artifacts[relpath] = dict(classify(path.name), sha256=sha256, size=stat.st_size,
+                                  mtime_ns=stat.st_mtime_ns)
+
+    manifest = {"format": MIRROR_FORMAT, "artifacts": artifacts}
+    part = root / (MANIFEST_FILE + ".part")
+    with open(part, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(part, root / MANIFEST_FILE)
+    return manifest
+
+class Mirror:
+    def __init__(self, location, timeout=MIRROR_TIMEOUT):
+        self.location = str(location).rstrip("/")
+        self.is_http = self.location.startswith(("http://", "https://"))
+        self.timeout = timeout
+        self._manifest = None
+        self._session = None
+
+    def __repr__(self):
+        return f"Mirror({self.location})"
+
+    def _iter_raw(self, relpath):
+        """Unverified bytes of a mirror file"""
+        if not self.is_http:
+            path = Path(self.location) / relpath
+            try:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        yield chunk
+            except OSError as e:
+                raise MirrorError(f"Cannot read {path}: {e}")
+            return
+
+        if self._session is None:
+            self._session = requests.Session()
+            # A LAN mirror must not be routed through an outbound proxy
+            self._session.trust_env = False
+        url = f"{self.location}/{relpath}"
+        try:
+            with self._session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    yield chunk
+        except requests.RequestException as e:
+            raise MirrorError(f"Cannot fetch {url}: {e}")
+
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                self._manifest = json.loads(b"".join(self._iter_raw(MANIFEST_FILE)))
+            except ValueError as e:
+                raise MirrorError(f"Invalid mirror manifest in {self.location}: {e}")
+            if self._manifest.get("format") != MIRROR_FORMAT:
+                raise MirrorError(f"Unsupported mirror format in {self.location}")
+        return self._manifest
+
+    def entries(self, kind, arch=None):
+        """{relpath: entry} for artifacts of a kind (and arch)"""
+        return {
+            relpath: entry for relpath, entry in self.manifest()["artifacts"].items()
+            if entry.get("kind") == kind and (arch is None or entry.get("arch") == arch)
+        }
+
+    def find(self, kind, arch=None, version=None):
+        """(relpath, entry) of the newest artifact matching kind/arch/version"""
+        matches = [
+            (relpath, entry) for relpath, entry in self.entries(kind, arch).items()
+            if version is None or entry.get("version") == version
+        ]
+        if not matches:
+            wanted = " ".join(filter(None, [kind, arch, version]))
+            raise MirrorError(f"No {wanted} artifact in mirror {self.location}")
+        return max(matches, key=lambda m: version_key(m[1].get("version")))
+
+    def _verified(self, relpath):
+        entry = self.manifest()["artifacts"].get(relpath)
+        if entry is None:
+            raise MirrorError(f"{relpath} is not in the mirror manifest")
+
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in self._iter_raw(relpath):
+            digest.update(chunk)
+            size += len(chunk)
+            if size > entry["size"]:
+                raise MirrorError(f"{relpath} is larger than the manifest says")
+            yield chunk
+        if size != entry["size"] or digest.hexdigest() != entry["sha256"]:
+            raise MirrorError(f"{relpath} failed hash verification")
+
+    def read(self, relpath):
+        """Bytes of a mirror file, verified against the manifest"""
+        return b"".join(self._verified(relpath))
+
+    def fetch(self, relpath, dest):
+        """Copy a mirror file to dest; nothing is left behind unless it verifies"""
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        try:
+            with open(part, 'wb') as out:
+                for chunk in self._verified(relpath):
+                    out.write(chunk)
+            os.replace(part, dest)
+        finally:
+            if part.exists():
+                part.unlink()
+        return dest
+
+def offline_mirror():
+    """Mirror configured by OFFLINE_MIRROR, or None when building online"""
+    location = (os.getenv(OFFLINE_ENV) or "").strip()
+    return Mirror(location) if location else None
+
+def mirror_list():
+    """Mirror URLs from TAILSCALE_MIRRORS, in the order they are tried"""
+    return [m.strip().rstrip("/") for m in (os.getenv(MIRRORS_ENV) or "").split(",") if m.strip()]
+
+def read_from_mirrors(locations, kind, arch=None):
+    """(data, location, entry) from the first mirror that has a verified artifact, else None"""
+    for location in locations:
+        mirror = Mirror(location)
+        try:
+            relpath, entry = mirror.find(kind, arch)
+            return mirror.read(relpath), location, entry
+        except MirrorError as e:
+            print(f"[WARNING] Mirror {location}: {e}")
+    return None
+
+class MirrorSync:
+    """Incrementally fill a mirror directory from upstream"""
+
+    def __init__(self, root, upstream=UPSTREAM_URL, timeout=300):
+        self.root = Path(root)
+        self.upstream = upstream.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._upstream_index = None
+
+    def resolve_version(self, kind, version):
+        if version != "latest":
+            return version
+        if self._upstream_index is None:
+            response = self.session.get(f"{self.upstream}/?mode=json", timeout=30)
+            response.raise_for_status()
+            self._upstream_index = response.json()
+        index = self._upstream_index
+        return index.get(UPSTREAM_VERSION_FIELDS[kind]) or index["Version"]
+
+    def upstream_sha256(self, name):
+        """Published sha256 of an upstream file (None if not published)"""
+        try:
+            response = self.session.get(f"{self.upstream}/{name}.sha256", timeout=30)
+            response.raise_for_status()
+            return response.text.split()[0].lower()
+        except (requests.RequestException, IndexError):
+            return None
+
+    def download(self, name, dest, expected_sha256):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        digest = hashlib.sha256()
+        try:
+            with self.session.get(f"{self.upstream}/{name}", stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(part, 'wb') as out:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        out.write(chunk)
+            if expected_sha256 and digest.hexdigest() != expected_sha256:
+                raise MirrorError(f"{name} does not match its published sha256")
+            os.replace(part, dest)
+        finally:
+            if part.exists():
+                part.unlink()
+        return dest.stat().st_size
+
+    def sync_artifact(self, kind, version, arch, known, stats):
+        name = UPSTREAM_FILES[kind].format(version=version, arch=arch)
+        relpath = f"{ARTIFACT_PATTERNS[kind][0]}/{name}"
+        expected = self.upstream_sha256(name)
+        entry = known.get(relpath)
+        if (self.root / relpath).exists() and entry and expected in (None, entry["sha256"]):
+            print(f"   [OK] {relpath} (up to date)")
+            stats["skipped"] += 1
+            return
+        try:
+            size = self.download(name, self.root / relpath, expected)
+        except (requests.RequestException, MirrorError) as e:
+            print(f"   [ERROR] {relpath}: {e}")
+            stats["failed"] += 1
+            return
+        print(f"   [OK] {relpath} ({size / (1024 * 1024):.2f} MB)")
+        stats["downloaded"] += 1
+        stats["bytes"] += size
+
+    def sync_wheels(self, requirements, stats, wheel_platform=None, python_versions=()):
+        """pip download binary wheels for the target hosts into wheels/
+
+        With a wheel platform (e.g. manylinux2014_x86_64) wheels are fetched
+        for each target Python version rather than the build host's.
+        """
+        cmd = [sys.executable, "-m", "pip", "download", "--only-binary=:all:",
+               "--dest", str(self.root / "wheels")]
+        targets = [[]]
+        if wheel_platform:
+            targets = [["--platform", wheel_platform, "--implementation", "cp", "--python-version", version]
+                       for version in python_versions or [f"{sys.version_info[0]}.{sys.version_info[1]}"]]
+        for target in targets:
+            result = subprocess.run(cmd + target + list(requirements), capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"   [ERROR] pip download {' '.join(target)} failed: {result.stderr.strip()}")
+                stats["failed"] += 1
+
+    def prune(self, keep):
+        """Delete all but the newest `keep` versions of each kind and arch"""
+        groups = {}
+        for relpath, entry in load_manifest(self.root).get("artifacts", {}).items():
+            if entry.get("kind") in UPSTREAM_FILES:
+                groups.setdefault((entry["kind"], entry.get("arch")), []).append((relpath, entry))
+        removed = 0
+        for entries in groups.values():
+            entries.sort(key=lambda e: version_key(e[1].get("version")), reverse=True)
+            for relpath, _ in entries[keep:]:
+                (self.root / relpath).unlink(missing_ok=True)
+                print(f"   [INFO] Removed {relpath}")
+                removed += 1
+        return removed
+
+    def sync(self, versions=("latest",), arches=("amd64",), kinds=("msi", "static"),
+             wheels=(), keep=None, wheel_platform=None, python_versions=()):
+        """Fetch what is missing or changed upstream, prune, then re-index"""
+        arches = parse_arches(arches)
+        self.root.mkdir(parents=True, exist_ok=True)
+        known = load_manifest(self.root).get("artifacts", {})
+        stats = {"downloaded": 0, "skipped": 0, "failed": 0, "removed": 0, "bytes": 0}
+
+        for kind in kinds:
+            kind_arches = arches
+            if kind == "msi":
+                # Upstream publishes no arm MSI, and calls 386 "x86"
+                missing = [arch for arch in arches if arch not in PLATFORM_ARCHES["windows"]]
+                if missing:
+                    print(f"   [INFO] No MSI for {', '.join(missing)}, skipped")
+                kind_arches = [MSI_ARCHES[arch] for arch in arches if arch in PLATFORM_ARCHES["windows"]]
+            for version in versions:
+                resolved = self.resolve_version(kind, version)
+                for arch in kind_arches:
+                    self.sync_artifact(kind, resolved, arch, known, stats)
+        if wheels:
+            self.sync_wheels(wheels, stats, wheel_platform, python_versions)
+
+        # Index first so pruning sees the new downloads
+        index_mirror(self.root)
+        if keep is not None:
+            stats["removed"] = self.prune(keep)
+            index_mirror(self.root)
+        return stats
+
+class MirrorRequestHandler(SimpleHTTPRequestHandler):
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+def create_mirror_server(root, host="0.0.0.0", port=DEFAULT_MIRROR_PORT, verbose=False):
+    """Static HTTP server for a mirror directory (port 0 picks a free port)"""
+    handler = functools.partial(MirrorRequestHandler, directory=str(root))
+    MirrorRequestHandler.verbose = verbose
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sync, serve, index and verify Tailscale package mirrors")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync = sub.add_parser("sync", help="Fetch Tailscale packages from upstream into a mirror")
+    sync.add_argument("root")
+    sync.add_argument("--version", dest="versions", action="append",
+                      help="Tailscale version (repeatable, default: latest)")
+    sync.add_argument("--arch", dest="arches", action="append", help="Target arch (repeatable, default: amd64)")
+    sync.add_argument("--kind", dest="kinds", action="append", choices=sorted(UPSTREAM_FILES),
+                      help="Artifact kind (repeatable, default: msi and static)")
+    sync.add_argument("--wheel", dest="wheels", action="append", default=[],
+                      help="Requirement to download as a wheel (e.g. cryptography)")
+    sync.add_argument("--wheel-platform", default=None,
+                      help="Target platform tag for wheels (e.g. manylinux2014_x86_64)")
+    sync.add_argument("--python-version", dest="python_versions", action="append", default=[],
+                      help="Target Python version for wheels (repeatable)")
+    sync.add_argument("--keep", type=int, default=None, help="Keep only the newest N versions per kind/arch")
+    sync.add_argument("--upstream", default=UPSTREAM_URL)
+    serve = sub.add_parser("serve", help="Serve a mirror directory over HTTP")
+    serve.add_argument("root")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=DEFAULT_MIRROR_PORT)
+    serve.add_argument("--verbose", action="store_true", help="Log every request")
+    index = sub.add_parser("index", help="Write manifest.json for a mirror directory")
+    index.add_argument("root")
+    verify = sub.add_parser("verify", help="Verify every artifact of a mirror")
+    verify.add_argument("location", help="Mirror directory or http(s) URL")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "sync":
+            print(f"[INFO] Syncing {args.upstream} -> {args.root}")
+            stats = MirrorSync(args.root, args.upstream).sync(
+                args.versions or ["latest"], args.arches or ["amd64"],
+                args.kinds or ["msi", "static"], args.wheels, args.keep,
+                args.wheel_platform, args.python_versions)
+            print(f"[OK] {stats['downloaded']} downloaded ({stats['bytes'] / (1024 * 1024):.2f} MB), "
+                  f"{stats['skipped']} up to date, {stats['removed']} removed, {stats['failed']} failed")
+            return 1 if stats["failed"] else 0
+        elif args.command == "serve":
+            if not (Path(args.root) / MANIFEST_FILE).exists():
+                index_mirror(args.root)
+            server = create_mirror_server(args.root, args.host, args.port, args.verbose)
+            print(f"[OK] Serving {args.root} on http://{args.host}:{server.server_address[1]}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                print("\n[INFO] Shutting down...")
+            finally:
+                server.server_close()
+        elif args.command == "index":
+            manifest = index_mirror(args.root)
+            print(f"[OK] Indexed {len(manifest['artifacts'])} artifacts in {args.root}")
+        else:
+            mirror = Mirror(args.location)
+            for relpath in sorted(mirror.manifest()["artifacts"]):
+                for _ in mirror._verified(relpath):
+                    pass
+                print(f"   [OK] {relpath}")
+            print(f"[OK] Mirror verified: {args.location}")
+    except (MirrorError, ArchError, OSError, requests.RequestException) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""
+Local mock of the Tailscale control API
+Serves the endpoints TailscaleAPI uses (oauth/token, keys, devices) from
+synthetic in-memory state and counts requests and TCP connections, so client
+benchmarks and tests run offline and can check connection reuse. Latency
+(with jitter), random server errors, 429s and large device lists are
+configurable for load tests
+"""
+
+import sys
+import json
+import time
+import random
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).parent))
+from rate_limit import TokenBucket
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+API_PREFIX = "/api/v2"
+TOKEN_LIFETIME = 3600
+MAX_REQUEST_BYTES = 64 * 1024
+DEVICE_OS = ("windows", "linux", "macOS", "iOS")
+DEVICE_TAGS = ("tag:employee", "tag:server", "tag:kiosk")
+# POST /device/{id}/<action> endpoints the mock implements
+DEVICE_ACTIONS = ("tags", "authorized", "expire")
+# Statuses answered at random with error_rate
+RANDOM_ERRORS = (500, 502, 503)
+
+def make_device(index, now=None):
+    """Synthetic device shaped like the API's device objects"""
+    now = now or datetime.now(timezone.utc)
+    hostname = f"host-{index:06d}"
+    last_seen = now - timedelta(hours=index % (24 * 90))
+    return {
+        "id": str(100000000 + index),
+        "nodeId": f"n{index:010x}CNTRL",
+        "name": f"{hostname}.tailnet.ts.net",
+        "hostname": hostname,
+        "addresses": [f"100.{64 + index // 65536 % 64}.{index // 256 % 256}.{index % 256}",
+                      f"fd7a:115c:a1e0::{index:x}"],
+        "os": DEVICE_OS[index % len(DEVICE_OS)],
+        "user": f"user{index % 500}@example.com",
+        "tags": [DEVICE_TAGS[index % len(DEVICE_TAGS)]],
+        "authorized": True,
+        "clientVersion": "1.66.4",
+        "created": (now - timedelta(days=180)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "lastSeen": last_seen.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "keyExpiryDisabled": index % 10 == 0,
+        "updateAvailable": False
+    }
+
+class MockTailscaleAPI:
+    def __init__(self, devices=0, token_lifetime=TOKEN_LIFETIME, token_delay=0,
+                 rate_limit=None, burst=None, client_secret=None, latency=0, jitter=0, error_rate=0,
+                 seed=None):
+        self.lock = threading.Lock()
+        # Seconds added to every tailnet request, like the round trip to the real API,
+        # plus up to jitter more
+        self.latency = latency
+        self.jitter = jitter
+        # Share of tailnet requests answered with a random 5xx
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        # Any non-empty OAuth credentials are accepted unless a secret is set
+        self.client_secret = client_secret
+        self.token_lifetime = token_lifetime
+        self.token_delay = token_delay
+        # token -> monotonic expiry
+        self.tokens = {}
+        self.keys = {}
+        self.devices = [make_device(i) for i in range(devices)]
+        self._devices_body = None
+        # Server-side limit on tailnet endpoints (429 with Retry-After) and queued failures
+        self.limiter = TokenBucket(rate_limit, burst or rate_limit) if rate_limit else None
+        self.failures = []
+        self.stats = {"connections": 0, "requests": 0, "token_requests": 0, "throttled": 0, "failed": 0,
+                      "open_connections": 0, "peak_connections": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """Answer the next count tailnet requests with status"""
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def connection_opened(self):
+        with self.lock:
+            self.stats["connections"] += 1
+            self.stats["open_connections"] += 1
+            self.stats["peak_connections"] = max(self.stats["peak_connections"], self.stats["open_connections"])
+
+    def connection_closed(self):
+        with self.lock:
+            self.stats["open_connections"] -= 1
+
+    def admit(self):
+        """None to serve the request, else (status, Retry-After) to answer with"""
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            if self.failures:
+                self.stats["failed"] += 1
+                return self.failures.pop(0)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats["failed"] += 1
+                return self.random.choice(RANDOM_ERRORS), None
+            if self.limiter is not None:
+                wait = self.limiter.take()
+                if wait:
+                    self.stats["throttled"] += 1
+                    # Fractional seconds (the real API sends whole seconds)
+                    return 429, f"{wait:.3f}"
+        return None
+
+    def issue_token(self, form):
+        if not form.get("client_id") or not form.get("client_secret"):
+            return None
+        if self.client_secret is not None and form["client_secret"] != self.client_secret:
+            return None
+        if self.token_delay:
+            time.sleep(self.token_delay)
+        token = f"mock-token-{secrets.token_hex(16)}"
+        with self.lock:
+            self.tokens[token] = time.monotonic() + self.token_lifetime
+        return {"access_token": token, "token_type": "Bearer",
+                "expires_in": self.token_lifetime, "scope": form.get("scope", "")}
+
+    def authorized(self, header):
+        if not header or not header.startswith("Bearer "):
+            return False
+        with self.lock:
+            return time.monotonic() < self.tokens.get(header[7:], 0)
+
+    def revoke_tokens(self):
+        """Invalidate every issued token (clients see 401s)"""
+        with self.lock:
+            self.tokens.clear()
+
+    def create_key(self, body):
+        now = datetime.now(timezone.utc)
+        key_id = f"k{secrets.token_hex(8)}CNTRL"
+        key = {
+            "id": key_id,
+            "key": f"tskey-auth-{key_id}-{secrets.token_hex(16)}",
+            "created": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "expires": (now + timedelta(seconds=body.get("expirySeconds", 90 * 86400))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "capabilities": body.get("capabilities", {}),
+            "description": body.get("description", "")
+        }
+        with self.lock:
+            self.keys[key_id] = key
+        return key
+
+    def list_keys(self):
+        with self.lock:
+            return {"keys": [{"id": key_id} for key_id in self.keys]}
+
+    def get_key(self, key_id):
+        """Key metadata (the secret is only returned at creation), or None"""
+        with self.lock:
+            key = self.keys.get(key_id)
+            return None if key is None else {k: v for k, v in key.items() if k != "key"}
+
+    def delete_key(self, key_id):
+        with self.lock:
+            return self.keys.pop(key_id, None) is not None
+
+    def device_op(self, device_id, action=None, body=None):
+        """Delete a device (action None) or apply a device action; False if it doesn't exist"""
+        with self.lock:
+            index = next((i for i, d in enumerate(self.devices) if d["id"] == device_id), None)
+            if index is None:
+                return False
+            if action is None:
+                del self.devices[index]
+            else:
+                device = dict(self.devices[index])
+                if action == "tags":
+                    device["tags"] = list(body.get("tags", []))
+                elif action == "authorized":
+                    device["authorized"] = bool(body.get("authorized"))
+                elif action == "expire":
+                    device["expires"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                self.devices[index] = device
+            self._devices_body = None
+            return True
+
+    def set_devices(self, devices):
+        """Replace the tailnet's device list (devices joining, leaving or changing)"""
+        with self.lock:
+            self.devices = list(devices)
+            self._devices_body = None
+
+    def devices_body(self):
+        """Encoded device list (cached: large lists are costly to re-encode)"""
+        with self.lock:
+            if self._devices_body is None:
+                self._devices_body = json.dumps({"devices": self.devices}).encode('utf-8')
+            return self._devices_body
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MockTailscaleAPI/1.0"
+    # Keep-alive, so pooled clients reuse connections
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; Nagle would delay each response
+    disable_nagle_algorithm = True
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def setup(self):
+        super().setup()
+        self.api.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.api.connection_closed()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, data, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status, body):
+        self.send_body(status, json.dumps(body).encode('utf-8'))
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"message": message})
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("Request too large")
+        return self.rfile.read(length)
+
+    def route(self):
+        """(tailnet, resource, item id or None) of a tailnet endpoint, or None"""
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if len(parts) in (5, 6) and parts[:3] == ["api", "v2", "tailnet"]:
+            return parts[3], parts[4], parts[5] if len(parts) == 6 else None
+        return None
+
+    def device_route(self):
+        """(device id, action or None) of a device endpoint, or None"""
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if len(parts) in (4, 5) and parts[:3] == ["api", "v2", "device"]:
+            return parts[3], parts[4] if len(parts) == 5 else None
+        return None
+
+    def check_auth(self):
+        if self.api.authorized(self.headers.get("Authorization")):
+            return True
+        self.send_error_json(401, "invalid or expired token")
+        return False
+
+    def check_admitted(self):
+        rejected = self.api.admit()
+        if rejected is None:
+            return True
+        status, retry_after = rejected
+        data = json.dumps({"message": "rate limited" if status == 429 else "injected failure"}).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+        return False
+
+    def do_GET(self):
+        self.api.count("requests")
+        route = self.route()
+        if route is None:
+            self.send_error_json(404, f"Not found: {self.path}")
+        elif not self.check_admitted() or not self.check_auth():
+            return
+        elif route[1:] == ("devices", None):
+            self.send_body(200, self.api.devices_body())
+        elif route[1:] == ("keys", None):
+            self.send_json(200, self.api.list_keys())
+        elif route[1] == "keys" and self.api.get_key(route[2]) is not None:
+            self.send_json(200, self.api.get_key(route[2]))
+        else:
+            self.send_error_json(404, f"Not found: {self.path}")
+
+    def do_DELETE(self):
+        self.api.count("requests")
+        device = self.device_route()
+        if device is not None and device[1] is None:
+            if not self.check_admitted() or not self.check_auth():
+                return
+            if self.api.device_op(device[0]):
+                self.send_body(200, b"", "text/plain")
+            else:
+                self.send_error_json(404, f"Not found: {self.path}")
+            return
+
+        route = self.route()
+        if route is None or route[1] != "keys" or route[2] is None:
+            self.send_error_json(404, f"Not found: {self.path}")
+        elif not self.check_admitted() or not self.check_auth():
+            return
+        elif self.api.delete_key(route[2]):
+            self.send_body(200, b"", "text/plain")
+        else:
+            self.send_error_json(404, f"Not found: {self.path}")
+
+    def do_POST(self):
+        self.api.count("requests")
+        try:
+            body = self.read_body()
+        except ValueError as e:
+            self.send_error_json(413, str(e))
+            return
+
+        if self.path.split("?")[0] == f"{API_PREFIX}/oauth/token":
+            self.api.count("token_requests")
+            form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+            token = self.api.issue_token(form)
+            if token is None:
+                self.send_error_json(401, "invalid client credentials")
+            else:
+                self.send_json(200, token)
+            return
+
+        device = self.device_route()
+        if device is not None and device[1] in DEVICE_ACTIONS:
+            if not self.check_admitted() or not self.check_auth():
+                return
+            try:
+                found = self.api.device_op(device[0], device[1], json.loads(body or b"{}"))
+            except ValueError as e:
+                self.send_error_json(400, str(e))
+                return
+            if found:
+                self.send_body(200, b"", "text/plain")
+            else:
+                self.send_error_json(404, f"Not found: {self.path}")
+            return
+
+        route = self.route()
+        if route is None or route[1:] != ("keys", None):
+            self.send_error_json(404, f"Not found: {self.path}")
+        elif self.check_admitted() and self.check_auth():
+            try:
+                self.send_json(200, self.api.create_key(json.loads(body or b"{}")))
+            except ValueError as e:
+                self.send_error_json(400, str(e))
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for benchmarks that open many connections at once
+    request_queue_size = 1024
+
+def create_server(api, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """HTTP server bound to the mock (port 0 picks a free port)"""
+    server = MockServer((host, port), MockRequestHandler)
+    server.api = api
+    server.verbose = verbose
+    return server
+
+@contextmanager
+def running(api, host=DEFAULT_HOST, port=0):
+    """Serve the mock in a background thread; yields the API base URL"""
+    server = create_server(api, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}{API_PREFIX}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local mock of the Tailscale control API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--devices", type=int, default=100, help="Synthetic devices in the tailnet")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests/s before answering 429")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to each tailnet request")
+    parser.add_argument("--jitter", type=float, default=0, help="Up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 5xx")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    mock = MockTailscaleAPI(args.devices, rate_limit=args.rate_limit, latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate)
+    server = create_server(mock, args.host, args.port, args.verbose)
+    print(f"[INFO] Mock Tailscale API on http://{args.host}:{server.server_address[1]}{API_PREFIX}")
+    print("[INFO] Use it with TS_API_BASE set to that URL and any OAuth client id/secret")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Shutting down")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,21 +5,126 @@ Supports both Windows and Linux
 
 import os
 import sys
+import time
+import threading
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import json
 
 # Import builders
 from windows_installer_builder import WindowsInstallerBuilder
 from linux_installer_builder import LinuxInstallerBuilder
+from preflight import Preflight, PreflightError, checks_for, print_report, platform_failures
+from key_pool import pool_auth_key
+
+class PlatformOutput:
+    """sys.stdout replacement that prefixes each line with the writing thread's platform
+    
+    Lets concurrent platform builds stream their progress without interleaving
+    partial lines.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+    
+    def set_label(self, label):
+        self.local.label = label
+        self.local.pending = ""
+    
+    def write(self, text):
+        label = getattr(self.local, "label", None)
+        if label is None:
+            with self.lock:
+                return self.stream.write(text)
+        
+        self.local.pending += text
+        *lines, self.local.pending = self.local.pending.split("\n")
+        if lines:
+            with self.lock:
+                for line in lines:
+                    self.stream.write(f"[{label}] {line}\n")
+                self.stream.flush()
+        return len(text)
+    
+    def flush(self):
+        label = getattr(self.local, "label", None)
+        if label is not None and self.local.pending:
+            with self.lock:
+                self.stream.write(f"[{label}] {self.local.pending}")
+            self.local.pending = ""
+        self.stream.flush()
 
 class MultiPlatformBuilder:
     def __init__(self):
         self.build_dir = Path("builds")
         self.build_dir.mkdir(exist_ok=True)
+        
+        # platform -> (output label, build function taking the shared auth key)
+        self.platforms = {
+            "windows": ("WIN", self.build_windows),
+            "linux": ("LINUX", self.build_linux)
+        }
+        self.active_platforms = list(self.platforms)
+    
+    def build_windows(self, auth_key):
+        """Build the Windows installer (needs the MSI download)"""
+        return WindowsInstallerBuilder().build_standalone_installer(auth_key=auth_key, preflight=False)
     
-    def build_all_platforms(self):
-        """Build installers for all platforms"""
+    def build_linux(self, auth_key):
+        """Build the Linux package (codegen and file writes only)"""
+        return LinuxInstallerBuilder().build_linux_installer(auth_key=auth_key, preflight=False)
+    
+    def run_preflight(self):
+        """Shared prerequisites, checked once and concurrently for all platforms
+        
+        A failed auth key check stops everything; other failures only fail
+        the platforms that need the check.
+        """
+        print("\n[BUILD] Running shared preflight...")
+        platforms = self.active_platforms
+        auth_key = pool_auth_key()
+        report = Preflight(checks_for(platforms, need_auth_key=auth_key is None)).run()
+        print_report(report)
+        
+        if any(c["name"] == "auth_key" and not c["ok"] for c in report["checks"]):
+            raise PreflightError(report)
+        auth_key = auth_key or WindowsInstallerBuilder().load_auth_key()
+        return auth_key, {"report": report, "failed": platform_failures(report, platforms)}
+    
+    def _build_platform(self, output, platform, auth_key, preflight):
+        """Worker: build one platform with prefixed output and isolated failures"""
+        label, build = self.platforms[platform]
+        output.set_label(label)
+        started = time.perf_counter()
+        
+        try:
+            failure = preflight.get("failed", {}).get(platform)
+            if failure:
+                raise Exception(failure)
+            print(f"Building {platform} installer...")
+            path, info = build(auth_key)
+            result = {
+                "success": True,
+                "path": str(path),
+                "info": info
+            }
+            print(f"[OK] {platform.capitalize()} installer completed")
+        except Exception as e:
+            print(f"[ERROR] {platform.capitalize()} build failed: {e}")
+            result = {
+                "success": False,
+                "error": str(e)
+            }
+        finally:
+            output.flush()
+        
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+    
+    def build_all_platforms(self, platforms=None):
+        """Build installers for all platforms concurrently"""
         
         print("=" * 70)
         print("ATT TAILSCALE MULTI-PLATFORM BUILDER")
@@ -29,63 +134,54 @@ class MultiPlatformBuilder:
         print("  [LINUX] Linux (Package + Watchdog + Systemd)")
         print("=" * 70)
         
-        results = {}
+        platforms = platforms or list(self.platforms)
+        self.active_platforms = platforms
+        started = time.perf_counter()
         
         try:
-            # Build Windows installer
-            print("\\n[WIN] Building Windows installer...")
-            windows_builder = WindowsInstallerBuilder()
-            windows_exe, windows_info = windows_builder.build_standalone_installer()
-            results["windows"] = {
-                "success": True,
-                "path": str(windows_exe),
-                "info": windows_info
-            }
-            print("[OK] Windows installer completed")
-            
+            auth_key, preflight = self.run_preflight()
         except Exception as e:
-            print(f"[ERROR] Windows build failed: {e}")
-            results["windows"] = {
-                "success": False,
-                "error": str(e)
-            }
+            print(f"[ERROR] Preflight failed: {e}")
+            results = {platform: {"success": False, "error": str(e), "seconds": 0.0}
+                       for platform in platforms}
+            self.create_build_summary(results, time.perf_counter() - started)
+            return results
         
+        output = PlatformOutput(sys.stdout)
+        sys.stdout = output
         try:
-            # Build Linux installer
-            print("\\n[LINUX] Building Linux installer...")
-            linux_builder = LinuxInstallerBuilder()
-            linux_package, linux_info = linux_builder.build_linux_installer()
-            results["linux"] = {
-                "success": True,
-                "path": str(linux_package),
-                "info": linux_info
-            }
-            print("[OK] Linux installer completed")
-            
-        except Exception as e:
-            print(f"[ERROR] Linux build failed: {e}")
-            results["linux"] = {
-                "success": False,
-                "error": str(e)
-            }
+            with ThreadPoolExecutor(max_workers=len(platforms)) as pool:
+                futures = {
+                    platform: pool.submit(self._build_platform, output, platform, auth_key, preflight)
+                    for platform in platforms
+                }
+                results = {platform: future.result() for platform, future in futures.items()}
+        finally:
+            sys.stdout = output.stream
         
         # Create summary
-        self.create_build_summary(results)
+        self.create_build_summary(results, time.perf_counter() - started)
         
         return results
     
-    def create_build_summary(self, results):
+    def create_build_summary(self, results, wall_seconds=None):
         """Create build summary"""
         
         timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
         summary_file = self.build_dir / f"build_summary_{timestamp}.json"
         
+        platform_seconds = sum(r.get("seconds", 0.0) for r in results.values())
         summary = {
             "build_time": datetime.now().isoformat(),
             "platforms": results,
             "total_platforms": len(results),
             "successful_builds": sum(1 for r in results.values() if r["success"]),
-            "failed_builds": sum(1 for r in results.values() if not r["success"])
+            "failed_builds": sum(1 for r in results.values() if not r["success"]),
+            "timing": {
+                "wall_seconds": round(wall_seconds or 0.0, 3),
+                "sum_platform_seconds": round(platform_seconds, 3),
+                "speedup": round(platform_seconds / wall_seconds, 2) if wall_seconds else None
+            }
         }
         
         with open(summary_file, 'w') as f:
@@ -97,13 +193,15 @@ class MultiPlatformBuilder:
         print(f"Total Platforms: {summary['total_platforms']}")
         print(f"Successful: {summary['successful_builds']}")
         print(f"Failed: {summary['failed_builds']}")
+        print(f"Wall time: {summary['timing']['wall_seconds']:.1f}s "
+              f"(sum of platforms: {summary['timing']['sum_platform_seconds']:.1f}s)")
         print(f"Summary: {summary_file}")
         
         for platform, result in results.items():
             if result["success"]:
-                print(f"[OK] {platform.upper()}: {result['path']}")
+                print(f"[OK] {platform.upper()}: {result['path']} ({result['seconds']:.1f}s)")
             else:
-                print(f"[ERROR] {platform.upper()}: {result['error']}")
+                print(f"[ERROR] {platform.upper()}: {result['error']} ({result['seconds']:.1f}s)")
         
         print("=" * 70)
 
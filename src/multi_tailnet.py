@@ -0,0 +1,268 @@
+"""
+Multi-tailnet API orchestration
+One TailscaleAPI per tailnet (prod, lab, contractors, ...), each with its own
+OAuth credentials, token cache, connection pool, rate limiter and circuit
+breaker. Queries fan out to every tailnet concurrently and their results are
+merged into one stream, so a fleet-wide query takes about as long as the
+slowest tailnet instead of the sum of all of them
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tailscale_api import TailscaleAPI, TailscaleAPIError
+
+DEFAULT_TAILNETS_FILE = "tailnets.json"
+SPEC_FIELDS = ("name", "tailnet", "client_id", "client_secret", "client_id_env", "client_secret_env",
+               "base_url", "rate", "burst")
+# Items buffered between the per-tailnet producers and the merged stream
+STREAM_BUFFER = 1000
+
+class TailnetConfigError(Exception):
+    """Raised for an invalid tailnets file"""
+
+def expand_tailnets(spec):
+    """Tailnet entries from a list, or {"tailnets": [...]}; credentials may name env vars"""
+    items = spec.get("tailnets", []) if isinstance(spec, dict) else spec
+    tailnets, seen = [], set()
+    for item in items:
+        unknown = set(item) - set(SPEC_FIELDS)
+        if unknown:
+            raise TailnetConfigError(f"Unknown tailnet fields: {', '.join(sorted(unknown))}")
+        name = item.get("name") or item.get("tailnet")
+        if not name:
+            raise TailnetConfigError(f"Tailnet entry without a name: {item}")
+        if name in seen:
+            raise TailnetConfigError(f"Duplicate tailnet name: {name}")
+        seen.add(name)
+        entry = {"name": name, "tailnet": item.get("tailnet", "-"), "base_url": item.get("base_url"),
+                 "rate": item.get("rate"), "burst": item.get("burst")}
+        for field in ("client_id", "client_secret"):
+            env_name = item.get(f"{field}_env")
+            entry[field] = os.getenv(env_name) if env_name else item.get(field)
+            if not entry[field]:
+                source = f"${env_name}" if env_name else field
+                raise TailnetConfigError(f"Tailnet {name}: {source} is not set")
+        tailnets.append(entry)
+    if not tailnets:
+        raise TailnetConfigError("No tailnets defined")
+    return tailnets
+
+def load_tailnets(path=None):
+    with open(path or os.getenv("TAILNETS_FILE", DEFAULT_TAILNETS_FILE), 'r') as f:
+        return expand_tailnets(json.load(f))
+
+class TailnetManager:
+    """Isolated TailscaleAPI clients per tailnet, plus concurrent fan-out over them
+
+    client_kwargs (connection pool size, retries, ...) apply to every client;
+    a tailnet entry's rate and burst override the limiter for that tailnet.
+    """
+    def __init__(self, tailnets, **client_kwargs):
+        self.tailnets = {t["name"]: t for t in tailnets}
+        self.client_kwargs = client_kwargs
+        self._clients = {}
+
+    @property
+    def names(self):
+        return list(self.tailnets)
+
+    def api(self, name):
+        """The tailnet's client (created on first use)"""
+        if name not in self._clients:
+            entry = self.tailnets[name]
+            kwargs = dict(self.client_kwargs)
+            for field in ("rate", "burst"):
+                if entry[field] is not None:
+                    kwargs[field] = entry[field]
+            self._clients[name] = TailscaleAPI(base_url=entry["base_url"], tailnet=entry["tailnet"],
+                                               client_id=entry["client_id"],
+                                               client_secret=entry["client_secret"], **kwargs)
+        return self._clients[name]
+
+    async def aclose(self):
+        await asyncio.gather(*(api.aclose() for api in self._clients.values()))
+        self._clients.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def _select(self, names):
+        names = list(names or self.tailnets)
+        unknown = [n for n in names if n not in self.tailnets]
+        if unknown:
+            raise TailnetConfigError(f"Unknown tailnets: {', '.join(unknown)}")
+        return names
+
+    async def gather(self, call, names=None):
+        """Await call(api) on every tailnet at once; returns (results, errors) keyed by tailnet"""
+        names = self._select(names)
+        outcomes = await asyncio.gather(*(call(self.api(name)) for name in names), return_exceptions=True)
+        results, errors = {}, {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, TailscaleAPIError):
+                errors[name] = outcome
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[name] = outcome
+        return results, errors
+
+    async def stream(self, call, names=None, errors=None):
+        """Merged (tailnet, item) stream of the async iterators call(api), in arrival order
+
+        A tailnet that fails is recorded in errors while the others carry on;
+        without an errors dict the failure is raised.
+        """
+        names = self._select(names)
+        queue = asyncio.Queue(STREAM_BUFFER)
+        done = object()
+
+        async def produce(name):
+            # Not in a finally: a producer cancelled on a full queue must not block on one more put
+            try:
+                async for item in call(self.api(name)):
+                    await queue.put((name, item))
+            except Exception as e:
+                await queue.put((name, e))
+            await queue.put((name, done))
+
+        tasks = [asyncio.create_task(produce(name)) for name in names]
+        try:
+            running = len(tasks)
+            while running:
+                name, item = await queue.get()
+                if item is done:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    if errors is None or not isinstance(item, TailscaleAPIError):
+                        raise item
+                    errors[name] = item
+                else:
+                    yield name, item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def iter_devices(self, names=None, errors=None):
+        """Every tailnet's devices as one stream of (tailnet, device)"""
+        return self.stream(lambda api: api.iter_devices(), names, errors)
+
+async def _tailnet_devices(manager, names, errors):
+    async for name, device in manager.iter_devices(names, errors):
+        yield {**device, "tailnet": name}
+
+async def _summary(api):
+    started = time.perf_counter()
+    devices = 0
+    async for _ in api.iter_devices():
+        devices += 1
+    keys = len((await api.list_auth_keys()).get("keys", []))
+    return {"devices": devices, "keys": keys, "seconds": round(time.perf_counter() - started, 3)}
+
+async def _bench(latencies, devices):
+    from contextlib import ExitStack
+    from mock_tailscale_api import MockTailscaleAPI, running
+
+    with ExitStack() as stack:
+        tailnets = [{"name": f"tailnet-{i}", "tailnet": "-", "client_id": "bench", "client_secret": "bench",
+                     "base_url": stack.enter_context(running(MockTailscaleAPI(devices, latency=latency))),
+                     "rate": None, "burst": None}
+                    for i, latency in enumerate(latencies)]
+        async with TailnetManager(tailnets, rate=0) as manager:
+            await manager.gather(lambda api: api.get_access_token())
+
+            started = time.perf_counter()
+            sequential = 0
+            for name in manager.names:
+                async for _ in manager.api(name).iter_devices():
+                    sequential += 1
+            sequential_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            merged = 0
+            async for _ in manager.iter_devices():
+                merged += 1
+            merged_seconds = time.perf_counter() - started
+    return {"tailnets": len(latencies), "devices": merged, "sequential_seconds": round(sequential_seconds, 3),
+            "fan_out_seconds": round(merged_seconds, 3), "slowest_latency": max(latencies),
+            "speedup": round(sequential_seconds / merged_seconds, 1), "sequential_devices": sequential}
+
+def benchmark(latencies=(0.2, 0.4, 0.6, 0.8), devices=5000):
+    """Device listing across mock tailnets with the given latencies: one at a time vs fanned out"""
+    return asyncio.run(_bench(latencies, devices))
+
+def main():
+    """Command line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query several tailnets at once")
+    parser.add_argument("--tailnets-file", help=f"Tailnets JSON (default: $TAILNETS_FILE or {DEFAULT_TAILNETS_FILE})")
+    parser.add_argument("--tailnet", action="append", help="Only these tailnets (repeatable)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    devices = sub.add_parser("devices", help="Every tailnet's devices as one NDJSON/CSV export")
+    devices.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    devices.add_argument("--fields", help="Comma-separated fields (default: tailnet plus the export defaults)")
+    devices.add_argument("--out", default="-", help="Output file (default: stdout)")
+    sub.add_parser("summary", help="Device and key counts per tailnet")
+    bench = sub.add_parser("bench", help="Sequential vs fanned-out device listing across mock tailnets")
+    bench.add_argument("--latencies", default="0.2,0.4,0.6,0.8", help="Mock latency per tailnet, seconds")
+    bench.add_argument("--devices", type=int, default=5000, help="Devices per tailnet")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        for name, value in benchmark([float(x) for x in args.latencies.split(",")], args.devices).items():
+            print(f"{name:<20} {value}")
+        return 0
+
+    from device_export import DEFAULT_FIELDS, ExportError, export_devices, parse_fields
+
+    try:
+        tailnets = load_tailnets(args.tailnets_file)
+        fields = parse_fields(args.fields or ",".join(("tailnet",) + DEFAULT_FIELDS)) \
+            if args.command == "devices" else None
+    except (TailnetConfigError, ExportError, OSError, ValueError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+
+    async def run(out):
+        async with TailnetManager(tailnets) as manager:
+            if args.command == "summary":
+                return await manager.gather(_summary, args.tailnet)
+            errors = {}
+            count = await export_devices(_tailnet_devices(manager, args.tailnet, errors), out, args.format, fields)
+            return count, errors
+
+    out = sys.stdout if args.command == "summary" or args.out == "-" else \
+        open(args.out, 'w', newline='', encoding='utf-8')
+    try:
+        result, errors = asyncio.run(run(out))
+    except TailnetConfigError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.command == "summary":
+        print(f"{'tailnet':<20} {'devices':>8} {'keys':>6} {'seconds':>8}")
+        for name, row in result.items():
+            print(f"{name:<20} {row['devices']:>8} {row['keys']:>6} {row['seconds']:>8}")
+    else:
+        queried = len(args.tailnet or tailnets)
+        print(f"[OK] Exported {result} devices from {queried - len(errors)} of {queried} tailnets", file=sys.stderr)
+    for name, error in errors.items():
+        print(f"[ERROR] {name}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Native .deb and .rpm packages for the Linux watchdog
+Built from a stamped Linux package with the distro tools (dpkg-deb,
+rpmbuild); a format whose tool is not installed is skipped with a warning
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from installer_stamp import render_deployment_env
+from reproducible import normalize_tree, source_date_epoch
+
+PACKAGE_NAME = "att-tailscale-watchdog"
+PACKAGE_VERSION_BASE = "1.0"
+SERVICE_NAME = f"{PACKAGE_NAME}.service"
+INSTALL_DIR = "/opt/att/tailscale"
+CONFIG_DIR = "/etc/att/tailscale"
+MODULE_NAME = "tailscale_watchdog"
+FORMATS = ("deb", "rpm")
+TOOLS = {"deb": "dpkg-deb", "rpm": "rpmbuild"}
+# The watchdog is pure Python, so one package fits every arch
+DEB_ARCH = "all"
+RPM_ARCH = "noarch"
+DEB_DEPENDS = "python3 (>= 3.8), python3-cryptography, tailscale"
+RPM_REQUIRES = ["python3 >= 3.8", "python3-cryptography", "tailscale"]
+UNIT_DIRS = {"deb": "/lib/systemd/system", "rpm": "/usr/lib/systemd/system"}
+DESCRIPTION = "ATT Tailscale watchdog: auto-reconnect, service restart and centralized logging"
+
+class NativePackageError(Exception):
+    """Raised when a package tool fails"""
+
+def package_formats():
+    """Formats requested by LINUX_PACKAGE_FORMATS (default: deb,rpm; empty for none)"""
+    value = os.getenv("LINUX_PACKAGE_FORMATS", ",".join(FORMATS))
+    formats = [f.strip() for f in value.split(",") if f.strip()]
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise NativePackageError(f"Unknown package format: {fmt}")
+    return formats
+
+def package_version(config):
+    """Monotonic version from the stamped build time (fixed in deterministic mode)"""
+    build_time = datetime.fromisoformat(config["build_time"])
+    return f"{PACKAGE_VERSION_BASE}.{build_time.strftime('%Y%m%d%H%M%S')}"
+
+def render_launcher():
+    return f'''#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "{INSTALL_DIR}/lib")
+import {MODULE_NAME}
+sys.exit({MODULE_NAME}.main())
+'''
+
+def render_unit(config):
+    return f'''[Unit]
+Description=ATT Tailscale Watchdog Service
+After=network-online.target tailscaled.service
+Wants=tailscaled.service
+
+[Service]
+Type=simple
+ExecStart={INSTALL_DIR}/bin/tailscale-watchdog service
+Environment=ATT_CHECK_INTERVAL={config["check_interval"]}
+Environment=ATT_ADVERTISE_TAGS={",".join(config["tags"])}
+Restart=always
+RestartSec=10
+PrivateTmp=true
+ReadWritePaths={INSTALL_DIR}
+
+[Install]
+WantedBy=multi-user.target
+'''
+
+def post_install_script():
+    """Shared by deb postinst (configure) and rpm %post"""
+    return f'''mkdir -p {INSTALL_DIR}/logs {INSTALL_DIR}/config
+chmod 700 {INSTALL_DIR}/config
+python3 -m compileall -q {INSTALL_DIR}/lib >/dev/null || true
+. {CONFIG_DIR}/deployment.env
+if [ -n "$DEPLOY_AUTH_KEY" ] && [ ! -f {INSTALL_DIR}/config/config.json ]; then
+    python3 -c "import sys; sys.path.insert(0, '{INSTALL_DIR}/lib'); import {MODULE_NAME} as w; sys.exit(0 if w.TailscaleWatchdog().setup_auth_key(sys.argv[1]) else 1)" "$DEPLOY_AUTH_KEY" \\
+        || echo "{PACKAGE_NAME}: auth key setup failed, see {INSTALL_DIR}/logs" >&2
+fi
+if [ -d /run/systemd/system ]; then
+    systemctl daemon-reload
+    systemctl enable {SERVICE_NAME}
+    systemctl restart {SERVICE_NAME} || true
+fi
+'''
+
+def pre_remove_script():
+    return f'''if [ -d /run/systemd/system ]; then
+    systemctl disable --now {SERVICE_NAME} || true
+fi
+rm -rf {INSTALL_DIR}/lib/__pycache__
+'''
+
+def deb_scripts():
+    return {
+        "postinst": f'''#!/bin/sh
+set -e
+if [ "$1" = "configure" ]; then
+{post_install_script()}fi
+''',
+        "prerm": f'''#!/bin/sh
+set -e
+case "$1" in
+    remove|deconfigure)
+{pre_remove_script()}        ;;
+    upgrade)
+        rm -rf {INSTALL_DIR}/lib/__pycache__
+        ;;
+esac
+''',
+        "postrm": f'''#!/bin/sh
+set -e
+if [ "$1" = "purge" ]; then
+    rm -rf {INSTALL_DIR}/config {INSTALL_DIR}/logs {CONFIG_DIR}
+fi
+if [ -d /run/systemd/system ]; then
+    systemctl daemon-reload || true
+fi
+'''
+    }
+
+def stage_files(stage_dir, fmt, watchdog_code, config):
+    """Write the package payload tree; returns {path: mode} of installed files"""
+    files = {
+        f"{INSTALL_DIR}/lib/{MODULE_NAME}.py": (watchdog_code, 0o644),
+        f"{INSTALL_DIR}/bin/tailscale-watchdog": (render_launcher(), 0o755),
+        f"{UNIT_DIRS[fmt]}/{SERVICE_NAME}": (render_unit(config), 0o644),
+        f"{CONFIG_DIR}/deployment.env": (render_deployment_env(config), 0o600)
+    }
+    for path, (content, mode) in files.items():
+        target = stage_dir / path.lstrip("/")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding='utf-8')
+        target.chmod(mode)
+    return {path: mode for path, (_, mode) in files.items()}
+
+def _run(cmd):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise NativePackageError(f"{cmd[0]} failed: {result.stderr.strip()}")
+    return result.stdout
+
+def build_deb(watchdog_code, config, output_dir):
+    version = package_version(config)
+    output = Path(output_dir) / f"{PACKAGE_NAME}_{version}_{DEB_ARCH}.deb"
+    with tempfile.TemporaryDirectory() as tmp:
+        stage_dir = Path(tmp) / "root"
+        files = stage_files(stage_dir, "deb", watchdog_code, config)
+        control_dir = stage_dir / "DEBIAN"
+        control_dir.mkdir(mode=0o755)
+        (control_dir / "control").write_text(f'''Package: {PACKAGE_NAME}
+Version: {version}
+Architecture: {DEB_ARCH}
+Maintainer: ATT IT <it@att.local>
+Depends: {DEB_DEPENDS}
+Section: net
+Priority: optional
+Description: {DESCRIPTION}
+''', encoding='utf-8')
+        (control_dir / "conffiles").write_text(f"{CONFIG_DIR}/deployment.env\n", encoding='utf-8')
+        for name, content in deb_scripts().items():
+            script = control_dir / name
+            script.write_text(content, encoding='utf-8')
+            script.chmod(0o755)
+        normalize_tree(stage_dir)
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        _run(["dpkg-deb", "--root-owner-group", "-Zxz", "--build", str(stage_dir), str(output)])
+    return output, files
+
+def render_spec(config, files):
+    version = package_version(config)
+    requires = "\n".join(f"Requires: {r}" for r in RPM_REQUIRES)
+    file_lines = []
+    for path, mode in sorted(files.items()):
+        if path.startswith(CONFIG_DIR):
+            file_lines.append(f"%config(noreplace) %attr({mode:04o},root,root) {path}")
+        else:
+            file_lines.append(f"%attr({mode:04o},root,root) {path}")
+    file_lines.append(f"%dir {CONFIG_DIR}")
+    files_section = "\n".join(file_lines)
+    return f'''Name: {PACKAGE_NAME}
+Version: {version}
+Release: 1
+Summary: ATT Tailscale watchdog service
+License: Proprietary
+BuildArch: {RPM_ARCH}
+{requires}
+AutoReqProv: no
+# Bytecode is compiled on the host in %post for its own Python
+%global __os_install_post %{{nil}}
+
+%description
+{DESCRIPTION}
+
+%install
+cp -a %{{stage}}/. %{{buildroot}}/
+
+%files
+{files_section}
+
+%post
+{post_install_script()}
+%preun
+if [ $1 -eq 0 ]; then
+{pre_remove_script()}fi
+
+%postun
+if [ -d /run/systemd/system ]; then
+    systemctl daemon-reload || true
+    if [ $1 -ge 1 ]; then
+        systemctl try-restart {SERVICE_NAME} || true
+    fi
+fi
+'''
+
+def build_rpm(watchdog_code, config, output_dir):
+    version = package_version(config)
+    output = Path(output_dir) / f"{PACKAGE_NAME}-{version}-1.{RPM_ARCH}.rpm"
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        stage_dir = tmp / "root"
+        files = stage_files(stage_dir, "rpm", watchdog_code, config)
+        normalize_tree(stage_dir)
+        spec = tmp / f"{PACKAGE_NAME}.spec"
+        spec.write_text(render_spec(config, files), encoding='utf-8')
+
+        cmd = ["rpmbuild", "-bb", "--define", f"_topdir {tmp / 'rpmbuild'}",
+               "--define", f"_rpmdir {tmp / 'rpms'}", "--define", f"stage {stage_dir}"]
+        if source_date_epoch() is not None:
+            cmd += ["--define", "use_source_date_epoch_as_buildtime 1",
+                    "--define", "clamp_mtime_to_source_date_epoch 1"]
+        _run(cmd + [str(spec)])
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(next((tmp / "rpms").rglob("*.rpm"))), output)
+    return output, files
+
+BUILDERS = {"deb": build_deb, "rpm": build_rpm}
+
+def build_native_packages(watchdog_code, config, output_dir, formats=None):
+    """Build the requested formats; returns {format: path} of those built"""
+    built = {}
+    for fmt in package_formats() if formats is None else formats:
+        if shutil.which(TOOLS[fmt]) is None:
+            print(f"[WARNING] {TOOLS[fmt]} not found, skipping .{fmt}")
+            continue
+        path, _ = BUILDERS[fmt](watchdog_code, config, output_dir)
+        print(f"[OK] Built {path.name}")
+        built[fmt] = str(path)
+    return built
+
+def inspect_package(path):
+    """Metadata and file list of a .deb or .rpm"""
+    path = str(path)
+    if path.endswith(".deb"):
+        return _run(["dpkg-deb", "--info", path]) + _run(["dpkg-deb", "--contents", path])
+    if path.endswith(".rpm"):
+        return _run(["rpm", "-qip", "--scripts", path]) + _run(["rpm", "-qlvp", path])
+    raise NativePackageError(f"Not a .deb or .rpm: {path}")
+
+def main():
+    """Command line entry point"""
+    if len(sys.argv) != 3 or sys.argv[1] != "inspect":
+        print("Usage: native_packages.py inspect <package.deb|package.rpm>")
+        return 2
+    try:
+        print(inspect_package(sys.argv[2]))
+    except (NativePackageError, OSError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
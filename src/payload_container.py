@@ -0,0 +1,426 @@
+"""
+Payload container for embedded installer artifacts
+Per-entry compression (lzma/zstd), manifest with sizes and hashes,
+streaming extraction with hash verification
+"""
+
+import io
+import os
+import sys
+import json
+import lzma
+import struct
+import hashlib
+import time
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Container layout (position independent, so it can be appended to an exe):
+#   [entry data ...][manifest json][trailer]
+# Trailer: manifest length, container length, magic
+MAGIC = b"TSPK0001"
+TRAILER = struct.Struct("<QQ8s")
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+
+CODECS = ("none", "lzma", "zstd")
+DEFAULT_LEVELS = {"none": 0, "lzma": 6, "zstd": 10}
+BENCH_LEVELS = {"none": [0], "lzma": list(range(0, 10)), "zstd": [1, 3, 6, 10, 15, 19]}
+# Raised by the decompressors for damaged entry data
+DECODE_ERRORS = (lzma.LZMAError, EOFError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+class PayloadError(Exception):
+    """Raised when a payload container is malformed or fails verification"""
+
+def codec_available(codec):
+    """Check whether a codec can be used in this interpreter"""
+    if codec == "zstd":
+        return zstandard is not None
+    return codec in ("none", "lzma")
+
+def default_codec():
+    """Codec used when none is configured (PAYLOAD_CODEC)"""
+    codec = os.getenv('PAYLOAD_CODEC', 'lzma').strip().lower()
+    if not codec_available(codec):
+        raise PayloadError(f"Payload codec not available: {codec}")
+    return codec
+
+def default_level(codec):
+    """Compression level used when none is configured (PAYLOAD_LEVEL)"""
+    level = os.getenv('PAYLOAD_LEVEL')
+    return int(level) if level else DEFAULT_LEVELS[codec]
+
+def _make_compressor(codec, level):
+    if codec == "lzma":
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, check=lzma.CHECK_NONE, preset=level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise PayloadError("zstd codec requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return None
+
+class _EntryView:
+    """Read-only window over one entry's bytes in the container file"""
+
+    def __init__(self, fp, offset, length):
+        self.fp = fp
+        self.offset = offset
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        self.fp.seek(self.offset)
+        data = self.fp.read(size)
+        self.offset += len(data)
+        self.remaining -= len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class PayloadWriter:
+    """Write a payload container entry by entry"""
+
+    def __init__(self, fileobj, codec=None, level=None):
+        self.fp = fileobj
+        self.start = fileobj.tell()
+        self.codec = codec or default_codec()
+        self.level = level if level is not None else default_level(self.codec)
+        self.entries = []
+        self.closed = False
+
+    def add_stream(self, name, stream, codec=None, level=None):
+        """Compress a readable stream into a new entry"""
+        if any(entry["name"] == name for entry in self.entries):
+            raise PayloadError(f"Duplicate payload entry: {name}")
+
+        codec = codec or self.codec
+        if level is None:
+            level = self.level if codec == self.codec else DEFAULT_LEVELS[codec]
+        compressor = _make_compressor(codec, level)
+
+        offset = self.fp.tell() - self.start
+        digest = hashlib.sha256()
+        size = 0
+        written = 0
+
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                self.fp.write(out)
+                written += len(out)
+
+        if compressor:
+            out = compressor.flush()
+            self.fp.write(out)
+            written += len(out)
+
+        entry = {
+            "name": name,
+            "codec": codec,
+            "level": level,
+            "offset": offset,
+            "size": size,
+            "compressed_size": written,
+            "sha256": digest.hexdigest()
+        }
+        self.entries.append(entry)
+        return entry
+
+    def add_file(self, name, path, codec=None, level=None):
+        """Add a file from disk without loading it into memory"""
+        with open(path, 'rb') as f:
+            return self.add_stream(name, f, codec, level)
+
+    def add_bytes(self, name, data, codec=None, level=None):
+        """Add an in-memory blob"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self.add_stream(name, io.BytesIO(data), codec, level)
+
+    def close(self):
+        """Write manifest and trailer"""
+        if self.closed:
+            return
+        manifest = json.dumps(
+            {"version": FORMAT_VERSION, "entries": self.entries},
+            sort_keys=True, separators=(",", ":")
+        ).encode('utf-8')
+        self.fp.write(manifest)
+        container_length = self.fp.tell() - self.start + TRAILER.size
+        self.fp.write(TRAILER.pack(len(manifest), container_length, MAGIC))
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+class PayloadReader:
+    """Read a payload container, standalone or appended to another file"""
+
+    def __init__(self, path, end=None):
+        self.path = Path(path)
+        self.fp = open(self.path, 'rb')
+        try:
+            self._load_manifest(end)
+        except Exception:
+            self.fp.close()
+            raise
+
+    def _load_manifest(self, end):
+        self.fp.seek(0, os.SEEK_END)
+        file_end = self.fp.tell()
+        end = file_end if end is None else end
+
+        if end < TRAILER.size:
+            raise PayloadError(f"No payload found in {self.path}")
+
+        self.fp.seek(end - TRAILER.size)
+        manifest_length, container_length, magic = TRAILER.unpack(self.fp.read(TRAILER.size))
+        if magic != MAGIC:
+            raise PayloadError(f"No payload found in {self.path}")
+        if container_length > end or manifest_length > container_length:
+            raise PayloadError(f"Corrupt payload trailer in {self.path}")
+
+        self.start = end - container_length
+        self.end = end
+        self.fp.seek(end - TRAILER.size - manifest_length)
+        try:
+            manifest = json.loads(self.fp.read(manifest_length).decode('utf-8'))
+            version = manifest.get("version")
+            if version == FORMAT_VERSION:
+                self.entries = {entry["name"]: entry for entry in manifest["entries"]}
+        except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, AttributeError):
+            raise PayloadError(f"Corrupt payload manifest in {self.path}")
+
+        if version != FORMAT_VERSION:
+            raise PayloadError(f"Unsupported payload version: {version}")
+
+    def names(self):
+        return list(self.entries)
+
+    def entry(self, name):
+        if name not in self.entries:
+            raise PayloadError(f"Payload entry not found: {name}")
+        return self.entries[name]
+
+    def open_entry(self, name):
+        """Return a file-like object yielding the decompressed entry"""
+        entry = self.entry(name)
+        view = _EntryView(self.fp, self.start + entry["offset"], entry["compressed_size"])
+
+        if entry["codec"] == "none":
+            return view
+        if entry["codec"] == "lzma":
+            return lzma.LZMAFile(view, 'rb')
+        if entry["codec"] == "zstd":
+            if zstandard is None:
+                raise PayloadError("zstd payload requires the 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(view, closefd=False)
+        raise PayloadError(f"Unknown payload codec: {entry['codec']}")
+
+    def iter_chunks(self, name, chunk_size=CHUNK_SIZE):
+        """Yield decompressed chunks, verifying size and hash at the end"""
+        entry = self.entry(name)
+        digest = hashlib.sha256()
+        size = 0
+
+        stream = self.open_entry(name)
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > entry["size"]:
+                    raise PayloadError(f"Payload entry {name} is larger than its manifest size")
+                digest.update(chunk)
+                yield chunk
+        except DECODE_ERRORS as e:
+            raise PayloadError(f"Payload entry {name} is corrupt: {e}")
+        finally:
+            if not isinstance(stream, _EntryView):
+                stream.close()
+
+        if size != entry["size"]:
+            raise PayloadError(f"Payload entry {name} size mismatch: {size} != {entry['size']}")
+        if digest.hexdigest() != entry["sha256"]:
+            raise PayloadError(f"Payload entry {name} failed hash verification")
+
+    def read_bytes(self, name):
+        """Read a whole entry into memory (small entries only)"""
+        return b"".join(self.iter_chunks(name))
+
+    def extract(self, name, dest_path):
+        """Stream an entry to disk; the file only appears once verified"""
+        dest_path = Path(dest_path)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = dest_path.with_name(dest_path.name + ".part")
+
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in self.iter_chunks(name):
+                    f.write(chunk)
+            os.replace(part_path, dest_path)
+        except Exception:
+            try:
+                part_path.unlink()
+            except OSError:
+                pass
+            raise
+
+        return dest_path
+
+    def extract_all(self, dest_dir):
+        """Extract every entry into a directory"""
+        dest_dir = Path(dest_dir)
+        for name in self.entries:
+            # Entry names come from the file: never let one write outside dest_dir
+            parts = name.replace("\\", "/").split("/")
+            if not isinstance(name, str) or not name or name.startswith(("/", "\\")) or ":" in parts[0] or ".." in parts:
+                raise PayloadError(f"Unsafe payload entry name: {name}")
+        return [self.extract(name, dest_dir / name) for name in self.entries]
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def write_payload(path, entries, codec=None, level=None):
+    """Write a standalone container from a {name: bytes|str|Path} mapping"""
+    with open(path, 'wb') as f:
+        with PayloadWriter(f, codec, level) as writer:
+            for name in sorted(entries):
+                value = entries[name]
+                if isinstance(value, Path):
+                    writer.add_file(name, value)
+                else:
+                    writer.add_bytes(name, value)
+    return Path(path)
+
+def append_payload(target_path, payload_path):
+    """Append a finished container to another file (e.g. a onefile exe)"""
+    with open(target_path, 'ab') as out, open(payload_path, 'rb') as src:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+    return Path(target_path)
+
+def benchmark(blobs, codecs=None, repeat=3):
+    """Measure size and extraction time for each codec/level
+
+    blobs is a {name: bytes} mapping; returns one row per codec/level.
+    """
+    codecs = codecs or [c for c in CODECS if codec_available(c)]
+    total = sum(len(data) for data in blobs.values())
+    rows = []
+
+    for codec in codecs:
+        for level in BENCH_LEVELS[codec]:
+            buf = io.BytesIO()
+            started = time.perf_counter()
+            with PayloadWriter(buf, codec, level) as writer:
+                for name in sorted(blobs):
+                    writer.add_bytes(name, blobs[name])
+            compress_time = time.perf_counter() - started
+            container = buf.getvalue()
+
+            tmp = Path(os.getenv('TEMP_DIR', 'temp')) / f"bench-{os.getpid()}.tspk"
+            tmp.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(container)
+
+            timings = []
+            try:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    with PayloadReader(tmp) as reader:
+                        for name in reader.names():
+                            for _chunk in reader.iter_chunks(name):
+                                pass
+                    timings.append(time.perf_counter() - started)
+            finally:
+                tmp.unlink()
+
+            rows.append({
+                "codec": codec,
+                "level": level,
+                "size": len(container),
+                "ratio": round(len(container) / total, 4) if total else 0,
+                "compress_s": round(compress_time, 4),
+                "extract_s": round(min(timings), 4)
+            })
+
+    return rows
+
+def main():
+    """Command line entry point"""
+    usage = ("Usage: payload_container.py [list <container>|"
+             "extract <container> <entry> <dest>|extract-all <container> <dir>|"
+             "bench <file> [file ...]]")
+
+    if len(sys.argv) < 3:
+        print(usage)
+        return 1
+
+    command = sys.argv[1]
+
+    try:
+        if command == "list":
+            with PayloadReader(sys.argv[2]) as reader:
+                for name, entry in reader.entries.items():
+                    print(f"{name}\t{entry['codec']}:{entry['level']}\t"
+                          f"{entry['size']} -> {entry['compressed_size']}\t{entry['sha256']}")
+        elif command == "extract" and len(sys.argv) == 5:
+            with PayloadReader(sys.argv[2]) as reader:
+                reader.extract(sys.argv[3], sys.argv[4])
+            print(f"[OK] Extracted {sys.argv[3]} -> {sys.argv[4]}")
+        elif command == "extract-all" and len(sys.argv) == 4:
+            with PayloadReader(sys.argv[2]) as reader:
+                for path in reader.extract_all(sys.argv[3]):
+                    print(f"[OK] Extracted {path}")
+        elif command == "bench":
+            blobs = {Path(p).name: Path(p).read_bytes() for p in sys.argv[2:]}
+            total = sum(len(b) for b in blobs.values())
+            print(f"[INFO] Input: {total / (1024 * 1024):.2f} MB "
+                  f"(base64 would be {total * 4 / 3 / (1024 * 1024):.2f} MB)")
+            print(f"{'codec':<6} {'level':>5} {'size MB':>9} {'ratio':>7} {'pack s':>8} {'extract s':>10}")
+            for row in benchmark(blobs):
+                print(f"{row['codec']:<6} {row['level']:>5} {row['size'] / (1024 * 1024):>9.2f} "
+                      f"{row['ratio']:>7.3f} {row['compress_s']:>8.3f} {row['extract_s']:>10.3f}")
+        else:
+            print(usage)
+            return 1
+    except PayloadError as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
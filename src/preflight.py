@@ -0,0 +1,246 @@
+"""
+Build preflight checks
+All checks run concurrently with short timeouts before any expensive build
+work; passing results are cached for a few minutes across builds
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import importlib.util
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent))
+from mirror import Mirror, MirrorError, OFFLINE_ENV, mirror_list
+from arches import DEFAULT_ARCH, MSI_ARCHES, PLATFORM_ARCHES
+
+NETWORK_TIMEOUT = 3
+CACHE_TTL = int(os.getenv('PREFLIGHT_CACHE_TTL', '300'))
+
+# Free space needed in the build directory, per platform
+MIN_FREE_MB = {"windows": 500, "linux": 50}
+
+class PreflightError(Exception):
+    """Raised when required preflight checks fail"""
+
+    def __init__(self, report):
+        failed = [c for c in report["checks"] if not c["ok"]]
+        super().__init__("Preflight failed: " + "; ".join(f"{c['name']}: {c['detail']}" for c in failed))
+        self.report = report
+
+class Check:
+    def __init__(self, name, func, cacheable=False):
+        self.name = name
+        self.func = func
+        # Only checks of the environment are cached, never secrets or disk state
+        self.cacheable = cacheable
+
+def check_auth_key():
+    auth_key = (os.getenv('TAILSCALE_AUTH_KEY') or "").strip()
+    if not auth_key:
+        return False, "TAILSCALE_AUTH_KEY not set"
+    if not auth_key.startswith('tskey-auth-'):
+        return False, "auth key should start with 'tskey-auth-'"
+    return True, f"{auth_key[:15]}..."
+
+def check_host(host, port=443, timeout=NETWORK_TIMEOUT):
+    def check():
+        try:
+            socket.create_connection((host, port), timeout=timeout).close()
+            return True, "reachable"
+        except OSError as e:
+            return False, str(e) or type(e).__name__
+    return check
+
+def check_pyinstaller():
+    if importlib.util.find_spec("PyInstaller") is None:
+        return False, "PyInstaller not installed (pip install pyinstaller)"
+    return True, "installed"
+
+def check_disk_space(path, min_free_mb):
+    def check():
+        path_ = Path(path)
+        path_.mkdir(parents=True, exist_ok=True)
+        free_mb = shutil.disk_usage(path_).free / (1024 * 1024)
+        if free_mb < min_free_mb:
+            return False, f"{free_mb:.0f} MB free, need {min_free_mb} MB"
+        return True, f"{free_mb:.0f} MB free"
+    return check
+
+def check_writable(path):
+    def check():
+        path_ = Path(path)
+        try:
+            path_.mkdir(parents=True, exist_ok=True)
+            probe = path_ / f".preflight-{os.getpid()}"
+            probe.write_bytes(b"ok")
+            probe.unlink()
+            return True, "writable"
+        except OSError as e:
+            return False, str(e)
+    return check
+
+def check_mirror(location, kinds):
+    """Mirror manifest is readable and has the artifacts the build needs"""
+    def check():
+        mirror = Mirror(location, timeout=NETWORK_TIMEOUT)
+        try:
+            found = [mirror.find(kind, arch)[1]["version"] for kind, arch in kinds]
+        except MirrorError as e:
+            return False, str(e)
+        return True, f"{location} ({', '.join(filter(None, found))})"
+    return check
+
+def check_msi_source(mirrors, msi_arches=("amd64",)):
+    """Any mirror with the MSIs, else upstream reachable"""
+    def check():
+        for location in mirrors:
+            ok, detail = check_mirror(location, [("msi", arch) for arch in msi_arches])()
+            if ok:
+                return True, f"mirror {detail}"
+        ok, detail = check_host("pkgs.tailscale.com")()
+        return ok, f"pkgs.tailscale.com {detail}" if ok else f"no mirror has the MSI; pkgs.tailscale.com: {detail}"
+    return check
+
+def check_file(path):
+    def check():
+        if not Path(path).exists():
+            return False, f"{path} not found"
+        return True, "present"
+    return check
+
+def checks_for(platforms, need_auth_key=True, arches=(DEFAULT_ARCH,)):
+    """Checks required before building the given platforms and arches"""
+    checks = {}
+    if need_auth_key:
+        checks["auth_key"] = Check("auth_key", check_auth_key)
+    checks["writable:builds"] = Check("writable:builds", check_writable("builds"))
+    checks["writable:temp"] = Check("writable:temp", check_writable("temp"))
+
+    min_free = max(MIN_FREE_MB[p] for p in platforms)
+    checks["disk_space"] = Check("disk_space", check_disk_space("builds", min_free))
+
+    # Offline builds never touch the network, only the mirror
+    msi_arches = [MSI_ARCHES[a] for a in arches if a in PLATFORM_ARCHES["windows"]]
+    mirror = (os.getenv(OFFLINE_ENV) or "").strip()
+    if mirror:
+        # One check per platform, so a missing MSI doesn't fail the Linux builds
+        if "windows" in platforms:
+            checks["mirror:windows"] = Check("mirror:windows",
+                                             check_mirror(mirror, [("msi", arch) for arch in msi_arches]))
+        if "linux" in platforms:
+            checks["mirror:linux"] = Check("mirror:linux", check_mirror(
+                mirror, [("static", arch) for arch in arches] + [("wheel", None)]))
+
+    if "windows" in platforms:
+        if mirror_list() and not mirror:
+            checks["msi_source"] = Check("msi_source", check_msi_source(mirror_list(), msi_arches))
+        elif not mirror:
+            checks["network:pkgs.tailscale.com"] = Check(
+                "network:pkgs.tailscale.com", check_host("pkgs.tailscale.com"), cacheable=True)
+        checks["pyinstaller"] = Check("pyinstaller", check_pyinstaller, cacheable=True)
+        checks["watchdog_source"] = Check("watchdog_source", check_file("src/att_tailscale_watchdog.py"))
+    return list(checks.values())
+
+def platform_failures(report, platforms, arches=(DEFAULT_ARCH,)):
+    """{platform: error message} for platforms whose required checks failed"""
+    failed = {c["name"]: c["detail"] for c in report["checks"] if not c["ok"]}
+    failures = {}
+    for platform in platforms:
+        names = [c.name for c in checks_for([platform], arches=arches) if c.name in failed]
+        if names:
+            failures[platform] = "Preflight failed: " + "; ".join(f"{n}: {failed[n]}" for n in names)
+    return failures
+
+class Preflight:
+    def __init__(self, checks, cache_file=None, ttl=CACHE_TTL):
+        self.checks = checks
+        self.cache_file = Path(cache_file or Path("builds") / ".cache" / "preflight.json")
+        self.ttl = ttl
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        part = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.part")
+        with open(part, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(part, self.cache_file)
+
+    def _run_check(self, check):
+        started = time.perf_counter()
+        try:
+            ok, detail = check.func()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        return {"name": check.name, "ok": ok, "detail": detail, "cached": False,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    def run(self):
+        """Run all checks concurrently; returns the report"""
+        started = time.perf_counter()
+        now = time.time()
+        cache = self._load_cache()
+
+        results = {}
+        pending = []
+        for check in self.checks:
+            entry = cache.get(check.name)
+            if check.cacheable and entry and now - entry["checked"] < self.ttl:
+                results[check.name] = {"name": check.name, "ok": True, "detail": entry["detail"],
+                                       "cached": True, "seconds": 0.0}
+            else:
+                pending.append(check)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                for check, result in zip(pending, pool.map(self._run_check, pending)):
+                    results[check.name] = result
+                    if check.cacheable and result["ok"]:
+                        cache[check.name] = {"detail": result["detail"], "checked": now}
+                    elif check.name in cache:
+                        del cache[check.name]
+            self._save_cache(cache)
+
+        checks = [results[check.name] for check in self.checks]
+        return {
+            "ok": all(c["ok"] for c in checks),
+            "seconds": round(time.perf_counter() - started, 3),
+            "checks": checks
+        }
+
+def print_report(report):
+    """Single preflight report"""
+    print("[BUILD] Preflight checks:")
+    for c in report["checks"]:
+        status = "[OK]" if c["ok"] else "[ERROR]"
+        source = " (cached)" if c["cached"] else ""
+        print(f"   {status} {c['name']}: {c['detail']}{source}")
+    print(f"   Preflight {'passed' if report['ok'] else 'FAILED'} in {report['seconds']:.2f}s")
+
+def run_preflight(platforms, need_auth_key=True, quiet=False, arches=(DEFAULT_ARCH,)):
+    """Run the preflight for platforms and arches; raises PreflightError on failure"""
+    report = Preflight(checks_for(platforms, need_auth_key, arches)).run()
+    if not quiet or not report["ok"]:
+        print_report(report)
+    if not report["ok"]:
+        raise PreflightError(report)
+    return report
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    platforms = sys.argv[1:] or ["windows", "linux"]
+    try:
+        run_preflight(platforms)
+    except PreflightError:
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+Client-side rate limiting, retry backoff and circuit breaking
+Used by TailscaleAPI so bulk jobs run at the highest rate the API sustains:
+token buckets that slow down on 429s and recover on success, jittered
+exponential backoff that honors Retry-After, and a circuit breaker that fails
+fast while the API is down
+"""
+
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Share of the configured rate regained per successful request after a 429
+RATE_RECOVERY = 0.05
+# The rate is never cut below this share of the configured rate
+MIN_RATE_FRACTION = 1 / 16
+
+class TokenBucket:
+    """Token bucket whose rate halves on throttling and recovers on success"""
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.updated = clock()
+        self.paused_until = 0
+        self._lock = None
+
+    def take(self):
+        """Take a token; returns 0, or the seconds to wait before trying again"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - max(self.updated, self.paused_until)) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait for a token (waiters are served in order)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = self.take()
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def throttled(self, pause=None):
+        """The server answered 429: halve the rate and pause every caller"""
+        self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+        self.tokens = 0
+        self.updated = self.clock()
+        if pause:
+            self.paused_until = max(self.paused_until, self.updated + pause)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY)
+
+class CircuitBreaker:
+    """Opens after consecutive failures; one trial request is let through after reset_timeout"""
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.trial or self.retry_in() == 0 else "open"
+
+    def retry_in(self):
+        """Seconds until the next trial request (0 when closed or due)"""
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if not self.trial and self.retry_in() == 0:
+            self.trial = True
+            return True
+        return False
+
+    def release(self):
+        """Give up the trial without an outcome (cancelled): the next request is the trial"""
+        self.trial = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self.trial or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self.trial = False
+
+def backoff_delay(attempt, base=0.5, cap=30):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
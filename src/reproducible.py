@@ -0,0 +1,98 @@
+"""
+Deterministic build helpers
+Setting SOURCE_DATE_EPOCH (https://reproducible-builds.org/specs/source-date-epoch/)
+switches builds to deterministic mode: fixed build time, content-derived output
+names, normalized file metadata and archives with a fixed entry order
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import tarfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+# build_info fields that differ between otherwise identical builds
+VOLATILE_FIELDS = ("stamp_seconds", "stage_timings")
+
+def source_date_epoch():
+    """SOURCE_DATE_EPOCH as an int, or None when not set"""
+    value = os.getenv('SOURCE_DATE_EPOCH')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise Exception(f"SOURCE_DATE_EPOCH must be an integer, got {value!r}")
+
+def deterministic_mode():
+    """True when builds must be reproducible"""
+    return source_date_epoch() is not None
+
+def build_timestamp():
+    """ISO build time: SOURCE_DATE_EPOCH (UTC) in deterministic mode, else now"""
+    epoch = source_date_epoch()
+    if epoch is None:
+        return datetime.now().isoformat()
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def output_name(prefix, config):
+    """Output name: timestamped normally, derived from the config when deterministic"""
+    if not deterministic_mode():
+        return f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{prefix}-{digest[:12]}"
+
+def build_info_for_disk(build_info):
+    """Drop timing fields from build_info written into deterministic outputs"""
+    if not deterministic_mode():
+        return build_info
+    return {k: v for k, v in build_info.items() if k not in VOLATILE_FIELDS}
+
+def subprocess_env():
+    """Environment for build tools (PyInstaller) in deterministic mode"""
+    env = dict(os.environ)
+    if deterministic_mode():
+        env["PYTHONHASHSEED"] = "0"
+    return env
+
+def normalize_tree(path, epoch=None):
+    """Set every file and directory under path to the same mtime"""
+    epoch = source_date_epoch() if epoch is None else epoch
+    if epoch is None:
+        return
+    path = Path(path)
+    # Deepest first so setting a file's time doesn't touch its parent afterwards
+    for entry in sorted(path.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        os.utime(entry, (epoch, epoch), follow_symlinks=False)
+    os.utime(path, (epoch, epoch))
+
+def make_tarball(src_dir, output_path, epoch=None):
+    """Write a .tar.gz of src_dir with sorted entries and normalized metadata
+
+    Identical trees give byte-identical archives.
+    """
+    epoch = (source_date_epoch() or 0) if epoch is None else epoch
+    src_dir = Path(src_dir)
+    output_path = Path(output_path)
+
+    def normalize(info):
+        info.uid = info.gid = 0
+        info.uname = info.gname = "root"
+        info.mtime = epoch
+        info.mode = 0o755 if info.isdir() or info.mode & 0o111 else 0o644
+        if Path(info.name).name == "deployment.env":
+            info.mode = 0o600
+        return info
+
+    part_path = output_path.with_name(output_path.name + ".part")
+    with open(part_path, 'wb') as raw:
+        with gzip.GzipFile(filename="", mode='wb', fileobj=raw, mtime=epoch) as gz:
+            with tarfile.open(fileobj=gz, mode='w', format=tarfile.GNU_FORMAT) as tar:
+                tar.add(src_dir, arcname=src_dir.name, recursive=False, filter=normalize)
+                for entry in sorted(src_dir.rglob("*")):
+                    tar.add(entry, arcname=f"{src_dir.name}/{entry.relative_to(src_dir).as_posix()}",
+                            recursive=False, filter=normalize)
+    os.replace(part_path, output_path)
+    return output_path
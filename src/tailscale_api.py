@@ -1,65 +1,355 @@
+import time
 import httpx
 import asyncio
 from datetime import datetime, timedelta
 import logging
 from config import config
+from rate_limit import TokenBucket, CircuitBreaker, backoff_delay, parse_retry_after
+from json_stream import JSONStreamError, iter_array
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TIMEOUT = 30
+READ_METHODS = ("GET", "HEAD")
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+# The request never left: safe to retry even when it is not idempotent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+# Tokens are refreshed in the background after this share of their lifetime,
+# and not used in the last TOKEN_EXPIRY_BUFFER seconds (or tenth of it)
+TOKEN_REFRESH_FRACTION = 0.8
+TOKEN_EXPIRY_BUFFER = 60
+
+class TailscaleAPIError(Exception):
+    """API request failed; status is None when no response was received"""
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+class AuthenticationError(TailscaleAPIError):
+    """OAuth failed or the token was rejected (401/403)"""
+
+class NotFoundError(TailscaleAPIError):
+    """Unknown tailnet, key or device (404)"""
+
+class RateLimitError(TailscaleAPIError):
+    """Still throttled (429) after all retries"""
+    def __init__(self, message, status=429, body=None, retry_after=None):
+        super().__init__(message, status, body)
+        self.retry_after = retry_after
+
+class ServerError(TailscaleAPIError):
+    """The API failed (5xx) after all retries"""
+
+class CircuitOpenError(TailscaleAPIError):
+    """Not sent: too many consecutive failures, the API is given time to recover"""
+
+def error_for_response(response):
+    """Typed exception for an error response"""
+    status = response.status_code
+    message = f"API error {status}: {response.text}"
+    if status == 429:
+        return RateLimitError(message, status, response.text,
+                              retry_after=parse_retry_after(response.headers.get("Retry-After")))
+    if status in (401, 403):
+        return AuthenticationError(message, status, response.text)
+    if status == 404:
+        return NotFoundError(message, status, response.text)
+    if status >= 500:
+        return ServerError(message, status, response.text)
+    return TailscaleAPIError(message, status, response.text)
+
+def endpoint_class(method, endpoint):
+    """Rate-limit class of an endpoint: its resource plus read/write, e.g. keys:write"""
+    resource = endpoint.split("?")[0].split("/")[0]
+    return f"{resource}:{'read' if method.upper() in READ_METHODS else 'write'}"
+
+def http2_available():
+    """HTTP/2 needs the optional h2 package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
 class TailscaleAPI:
-    def __init__(self):
-        self.client_id = config.TS_OAUTH_CLIENT_ID
-        self.client_secret = config.TS_OAUTH_CLIENT_SECRET
-        self.tailnet = config.TS_TAILNET
-        self.base_url = config.TS_API_BASE
+    """Tailscale API client owning one pooled HTTP client for its lifetime
+
+    Use it as an async context manager, or call aclose(), to release the
+    pooled connections and stop the background token refresh.
+    
+    Requests pass a token bucket per endpoint class (rate 0 disables it;
+    rate_limits overrides {class: (rate, burst)}), are retried with backoff
+    on 429/5xx honoring Retry-After, and fail fast while the circuit breaker
+    is open.
+    """
+    def __init__(self, base_url=None, tailnet=None, client_id=None, client_secret=None,
+                 max_connections=None, max_keepalive=None, keepalive_expiry=None,
+                 http2=None, timeout=DEFAULT_TIMEOUT, auto_refresh=True,
+                 rate=None, burst=None, rate_limits=None, max_retries=None,
+                 circuit_threshold=CIRCUIT_FAILURE_THRESHOLD, circuit_reset=CIRCUIT_RESET_SECONDS):
+        self.client_id = client_id or config.TS_OAUTH_CLIENT_ID
+        self.client_secret = client_secret or config.TS_OAUTH_CLIENT_SECRET
+        self.tailnet = tailnet or config.TS_TAILNET
+        self.base_url = (base_url or config.TS_API_BASE).rstrip("/")
         self._access_token = None
         self._token_expires = None
+        # In-flight token fetch shared by every waiter, and the proactive refresh
+        self._token_fetch = None
+        self._refresh_task = None
+        self.auto_refresh = auto_refresh
+        self.metrics = {
+            "token_fetches": 0,
+            "token_fetch_errors": 0,
+            "token_waits": 0,
+            "token_wait_seconds": 0.0,
+            "proactive_refreshes": 0,
+            "unauthorized_retries": 0,
+            "retries": 0,
+            "throttled": 0,
+            "circuit_rejections": 0
+        }
+        
+        # Rate limiting, retries and circuit breaking (defaults from TS_API_* env vars)
+        self.rate = config.TS_API_RATE_LIMIT if rate is None else rate
+        self.burst = burst or config.TS_API_BURST
+        self.rate_limits = rate_limits or {}
+        self.max_retries = config.TS_API_MAX_RETRIES if max_retries is None else max_retries
+        self.breaker = CircuitBreaker(circuit_threshold, circuit_reset)
+        self._buckets = {}
+        
+        # Pool settings (defaults from Config / TS_API_* env vars)
+        self.limits = httpx.Limits(
+            max_connections=max_connections or config.TS_API_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive or config.TS_API_MAX_KEEPALIVE,
+            keepalive_expiry=keepalive_expiry or config.TS_API_KEEPALIVE_EXPIRY
+        )
+        self.http2 = config.TS_API_HTTP2 if http2 is None else http2
+        if self.http2 and not http2_available():
+            logger.info("h2 not installed, using HTTP/1.1")
+            self.http2 = False
+        self.timeout = timeout
+        self._client = None
+    
+    @property
+    def client(self):
+        """Pooled HTTP client, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+        return self._client
+    
+    async def aclose(self):
+        """Stop the token refresh and close the pooled connections"""
+        for task in (self._refresh_task, self._token_fetch):
+            if task is not None and not task.done():
+                task.cancel()
+        self._refresh_task = self._token_fetch = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
     
     async def get_access_token(self):
-        """Get OAuth access token"""
-        if self._access_token and self._token_expires and datetime.now() < self._token_expires:
+        """Get OAuth access token (concurrent callers share one in-flight fetch)"""
+        if self._access_token and time.monotonic() < self._token_expires:
             return self._access_token
         
+        self.metrics["token_waits"] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.shield(self._start_token_fetch())
+        finally:
+            self.metrics["token_wait_seconds"] += time.perf_counter() - started
+    
+    def _start_token_fetch(self):
+        if self._token_fetch is None:
+            self._token_fetch = asyncio.ensure_future(self._fetch_token())
+        return self._token_fetch
+    
+    async def _fetch_token(self):
         logger.info("Getting new access token...")
+        self.metrics["token_fetches"] += 1
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.tailscale.com/api/v2/oauth/token",
-                data={
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "grant_type": "client_credentials",
-                    "scope": "auth_keys devices:core"
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"OAuth failed: {response.text}")
+        try:
+            try:
+                response = await self._call(
+                    "POST", f"{self.base_url}/oauth/token", "oauth", authorized=False,
+                    data={
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "grant_type": "client_credentials",
+                        "scope": "auth_keys devices:core"
+                    }
+                )
+            except TailscaleAPIError as e:
+                if e.status is not None and e.status < 500 and e.status != 429:
+                    raise AuthenticationError(f"OAuth failed: {e.body}", e.status, e.body) from e
+                raise
             
             data = response.json()
             self._access_token = data["access_token"]
             expires_in = data.get("expires_in", 3600)
-            self._token_expires = datetime.now() + timedelta(seconds=expires_in - 60)  # 1 min buffer
+            self._token_expires = time.monotonic() + expires_in - min(TOKEN_EXPIRY_BUFFER, expires_in / 10)
+        except Exception:
+            self.metrics["token_fetch_errors"] += 1
+            raise
+        finally:
+            self._token_fetch = None
+        
+        if self.auto_refresh:
+            self._schedule_refresh(expires_in * TOKEN_REFRESH_FRACTION)
+        logger.info("Access token obtained successfully")
+        return self._access_token
+    
+    def _schedule_refresh(self, delay):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_later(delay))
+    
+    async def _refresh_later(self, delay):
+        """Refresh before expiry, so callers don't wait on the token round trip"""
+        await asyncio.sleep(delay)
+        # The fetch schedules the next refresh
+        self._refresh_task = None
+        self.metrics["proactive_refreshes"] += 1
+        try:
+            await asyncio.shield(self._start_token_fetch())
+        except Exception as e:
+            # Callers fetch a new token on demand once this one expires
+            logger.warning(f"Background token refresh failed: {e}")
+    
+    def _invalidate_token(self, token):
+        """Drop a rejected token (unless another caller already replaced it)"""
+        if self._access_token == token:
+            self._access_token = None
+    
+    def _bucket(self, endpoint_cls):
+        rate, burst = self.rate_limits.get(endpoint_cls, (self.rate, self.burst))
+        if not rate:
+            return None
+        if endpoint_cls not in self._buckets:
+            self._buckets[endpoint_cls] = TokenBucket(rate, burst)
+        return self._buckets[endpoint_cls]
+    
+    async def _send(self, method, url, token, stream=False, **kwargs):
+        headers = dict(kwargs.pop('headers', None) or {})
+        if token is not None:
+            headers['Authorization'] = f'Bearer {token}'
+        if not stream:
+            return await self.client.request(method, url, headers=headers, **kwargs)
+        response = await self.client.send(self.client.build_request(method, url, headers=headers, **kwargs),
+                                          stream=True)
+        if response.status_code >= 400:
+            # Error bodies are small: read them so the connection is released
+            await response.aread()
+        return response
+    
+    async def _retry_wait(self, attempt, retry_after=None):
+        self.metrics["retries"] += 1
+        await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+    
+    async def _call(self, method, url, endpoint_cls, authorized=True, **kwargs):
+        """Send a request through the rate limiter, circuit breaker and retries"""
+        bucket = self._bucket(endpoint_cls)
+        # Throttled (429) or unsent requests are always safe to retry; failed
+        # writes only if idempotent, so a key is never minted twice
+        idempotent = method.upper() in IDEMPOTENT_METHODS or not authorized
+        # OAuth bypasses the breaker so a half-open trial request can fetch a token
+        breaker = self.breaker if authorized else None
+        reauthorized = False
+        attempt = 0
+        
+        while True:
+            if breaker is not None and not breaker.allow():
+                self.metrics["circuit_rejections"] += 1
+                raise CircuitOpenError(f"Circuit open after repeated API failures, "
+                                       f"next attempt in {breaker.retry_in():.0f}s")
+            # Allowed while the breaker is open: this request is its half-open trial
+            trial = breaker is not None and breaker.opened_at is not None
             
-            logger.info("Access token obtained successfully")
-            return self._access_token
+            try:
+                if bucket is not None:
+                    await bucket.acquire()
+                token = await self.get_access_token() if authorized else None
+                response = await self._send(method, url, token, **kwargs)
+            except httpx.TransportError as e:
+                if breaker is not None:
+                    breaker.failure()
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise TailscaleAPIError(f"{method} {url} failed: {e}") from e
+                await self._retry_wait(attempt)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled or failed before an outcome: don't keep the breaker half-open forever
+                if trial:
+                    breaker.release()
+                raise
+            
+            status = response.status_code
+            if status == 429:
+                self.metrics["throttled"] += 1
+                # Throttled still means the API is up
+                if breaker is not None:
+                    breaker.success()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if attempt >= self.max_retries:
+                    raise error_for_response(response)
+                if bucket is not None:
+                    # Every caller of this endpoint class waits out the pause
+                    bucket.throttled(retry_after if retry_after is not None else backoff_delay(attempt))
+                    self.metrics["retries"] += 1
+                else:
+                    await self._retry_wait(attempt, retry_after)
+                attempt += 1
+                continue
+            
+            if status >= 500:
+                if breaker is not None:
+                    breaker.failure()
+                if not idempotent or attempt >= self.max_retries:
+                    raise error_for_response(response)
+                await self._retry_wait(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            
+            # Anything else means the API is up
+            if breaker is not None:
+                breaker.success()
+            if bucket is not None:
+                bucket.succeeded()
+            
+            if status == 401 and authorized and not reauthorized:
+                # Token revoked or expired early: retry once with a fresh one
+                self.metrics["unauthorized_retries"] += 1
+                self._invalidate_token(token)
+                reauthorized = True
+                continue
+            
+            if status >= 400:
+                raise error_for_response(response)
+            return response
     
     async def _request(self, method, endpoint, **kwargs):
         """Make authenticated request to Tailscale API"""
-        token = await self.get_access_token()
-        headers = kwargs.get('headers', {})
-        headers['Authorization'] = f'Bearer {token}'
-        kwargs['headers'] = headers
-        
         url = f"{self.base_url}/tailnet/{self.tailnet}/{endpoint}"
+        response = await self._call(method, url, endpoint_class(method, endpoint), **kwargs)
         
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.request(method, url, **kwargs)
-            
-            if response.status_code >= 400:
-                raise Exception(f"API error {response.status_code}: {response.text}")
-            
-            return response.json() if response.headers.get('content-type', '').startswith('application/json') else response
+        return response.json() if response.headers.get('content-type', '').startswith('application/json') else response
+    
+    async def _device_request(self, method, device_id, action=None, **kwargs):
+        """Request to a device endpoint (these are not under the tailnet path)"""
+        url = f"{self.base_url}/device/{device_id}" + (f"/{action}" if action else "")
+        response = await self._call(method, url, endpoint_class(method, "device"), **kwargs)
+        
+        return response.json() if response.headers.get('content-type', '').startswith('application/json') else None
     
     async def create_auth_key(self, 
                             reusable=True, 
@@ -67,13 +357,15 @@ class TailscaleAPI:
                             preauthorized=True,
                             tags=None, 
                             expires_days=90,
-                            description="Standalone deployment"):
-        """Create new auth key"""
+                            description="Standalone deployment",
+                            expiry_seconds=None):
+        """Create new auth key (expiry_seconds overrides expires_days)"""
         
         if tags is None:
             tags = ["tag:employee"]
         
-        expires = datetime.now() + timedelta(days=expires_days)
+        if expiry_seconds is None:
+            expiry_seconds = expires_days * 24 * 3600
         
         payload = {
             "capabilities": {
@@ -86,11 +378,11 @@ class TailscaleAPI:
                     }
                 }
             },
-            "expirySeconds": expires_days * 24 * 3600,
+            "expirySeconds": expiry_seconds,
             "description": description
         }
         
-        logger.info(f"Creating auth key with tags: {tags}, expires in {expires_days} days")
+        logger.info(f"Creating auth key with tags: {tags}, expires in {expiry_seconds / 86400:g} days")
         
         result = await self._request("POST", "keys", json=payload)
         
@@ -101,33 +393,71 @@ class TailscaleAPI:
         """List all devices in tailnet"""
         return await self._request("GET", "devices")
     
+    async def iter_devices(self):
+        """Devices one at a time, parsed as the response streams in (memory stays flat)"""
+        url = f"{self.base_url}/tailnet/{self.tailnet}/devices"
+        response = await self._call("GET", url, endpoint_class("GET", "devices"), stream=True)
+        try:
+            async for device in iter_array(response.aiter_bytes(), "devices"):
+                yield device
+        except (httpx.TransportError, JSONStreamError) as e:
+            raise TailscaleAPIError(f"GET {url} failed mid-stream: {e}") from e
+        finally:
+            await response.aclose()
+    
     async def list_auth_keys(self):
         """List all auth keys"""
         return await self._request("GET", "keys")
+    
+    async def get_auth_key(self, key_id):
+        """Auth key metadata (description, capabilities, expiry; not the secret)"""
+        return await self._request("GET", f"keys/{key_id}")
+    
+    async def delete_auth_key(self, key_id):
+        """Revoke an auth key"""
+        logger.info(f"Revoking auth key: {key_id}")
+        await self._request("DELETE", f"keys/{key_id}")
+    
+    async def delete_device(self, device_id):
+        """Remove a device from the tailnet"""
+        logger.info(f"Deleting device: {device_id}")
+        await self._device_request("DELETE", device_id)
+    
+    async def set_device_tags(self, device_id, tags):
+        """Replace a device's tags"""
+        await self._device_request("POST", device_id, "tags", json={"tags": list(tags)})
+    
+    async def authorize_device(self, device_id, authorized=True):
+        """Authorize (or deauthorize) a device"""
+        await self._device_request("POST", device_id, "authorized", json={"authorized": authorized})
+    
+    async def expire_device(self, device_id):
+        """Expire a device's node key (it must re-authenticate)"""
+        await self._device_request("POST", device_id, "expire")
 
 # Test function
 async def test_api():
-    api = TailscaleAPI()
-    try:
-        # Test token
-        token = await api.get_access_token()
-        print(f"[OK] Token obtained: {token[:20]}...")
-        
-        # Test create auth key
-        key = await api.create_auth_key(
-            tags=["tag:test"], 
-            expires_days=1,
-            description="API test key"
-        )
-        print(f"[OK] Auth key created: {key['id']}")
-        print(f"Key: {key['key'][:20]}...")
+    async with TailscaleAPI() as api:
+        try:
+            # Test token
+            token = await api.get_access_token()
+            print(f"[OK] Token obtained: {token[:20]}...")
+        
+            # Test create auth key
+            key = await api.create_auth_key(
+                tags=["tag:test"], 
+                expires_days=1,
+                description="API test key"
+            )
+            print(f"[OK] Auth key created: {key['id']}")
+            print(f"Key: {key['key'][:20]}...")
         
-        # Test list devices
-        devices = await api.list_devices()
-        print(f"[OK] Found {len(devices['devices'])} devices")
+            # Test list devices
+            devices = await api.list_devices()
+            print(f"[OK] Found {len(devices['devices'])} devices")
         
-    except Exception as e:
-        print(f"[ERROR] API test failed: {e}")
+        except Exception as e:
+            print(f"[ERROR] API test failed: {e}")
 
 if __name__ == "__main__":
     asyncio.run(test_api())
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Install bundled wheels without pip
+Shipped in Linux packages next to install.sh: picks the wheels that fit the
+host's Python, CPU and glibc and unpacks them into a plain library directory,
+so hosts need neither pip, a venv nor a package index
+"""
+
+import os
+import re
+import sys
+import shutil
+import zipfile
+import platform
+from pathlib import Path
+
+WHEEL_NAME = re.compile(
+    r"^(?P<name>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-(?P<py>[^-]+)-(?P<abi>[^-]+)-(?P<plat>[^-]+)\.whl$"
+)
+# Legacy manylinux tags and the glibc they require
+MANYLINUX_ALIASES = {"manylinux1": (2, 5), "manylinux2010": (2, 12), "manylinux2014": (2, 17)}
+
+def glibc_version():
+    try:
+        name, version = os.confstr("CS_GNU_LIBC_VERSION").split()
+        return tuple(int(x) for x in version.split(".")[:2])
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def version_key(version):
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+def platform_supported(tag, machine, glibc):
+    if tag == "any":
+        return True
+    if tag == f"linux_{machine}":
+        return True
+    if glibc is None or not tag.endswith(f"_{machine}"):
+        return False
+    prefix = tag[:-len(machine) - 1]
+    if prefix in MANYLINUX_ALIASES:
+        return MANYLINUX_ALIASES[prefix] <= glibc
+    match = re.match(r"^manylinux_(\d+)_(\d+)$", prefix)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) <= glibc
+
+def python_supported(py, abi, python):
+    major, minor = python
+    cpython = f"cp{major}{minor}"
+    if abi == "none":
+        return py in (f"py{major}", f"py{major}{minor}", cpython)
+    if abi == "abi3":
+        return py.startswith(f"cp{major}") and int(py[2 + len(str(major)):] or 0) <= minor
+    return py == cpython and abi == cpython
+
+def supported(filename, python=None, machine=None, glibc=None):
+    """Whether a wheel file name fits the given (default: running) interpreter"""
+    match = WHEEL_NAME.match(filename)
+    if not match:
+        return False
+    python = python or sys.version_info[:2]
+    machine = machine or platform.machine()
+    glibc = glibc if glibc is not None else glibc_version()
+    return (
+        any(python_supported(py, abi, python)
+            for py in match.group("py").split(".") for abi in match.group("abi").split("."))
+        and any(platform_supported(plat, machine, glibc) for plat in match.group("plat").split("."))
+    )
+
+def select_wheels(wheel_dir, **target):
+    """Newest fitting wheel per distribution; raises if a distribution has none"""
+    candidates = {}
+    for path in sorted(Path(wheel_dir).glob("*.whl")):
+        match = WHEEL_NAME.match(path.name)
+        if match:
+            candidates.setdefault(match.group("name").lower(), []).append((match.group("version"), path))
+
+    selected = []
+    for name, wheels in sorted(candidates.items()):
+        fitting = [(version, path) for version, path in wheels if supported(path.name, **target)]
+        if not fitting:
+            raise RuntimeError(f"No {name} wheel fits Python {'.'.join(map(str, sys.version_info[:2]))} "
+                               f"on {platform.machine()}")
+        selected.append(max(fitting, key=lambda w: version_key(w[0]))[1])
+    return selected
+
+def install_wheels(wheel_dir, target):
+    """Unpack the selected wheels into target (replacing it)"""
+    target = Path(target)
+    wheels = select_wheels(wheel_dir)
+    work_dir = target.with_name(target.name + ".part")
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+
+    for wheel in wheels:
+        with zipfile.ZipFile(wheel) as archive:
+            for member in archive.infolist():
+                parts = member.filename.split("/")
+                if parts[0].endswith(".data"):
+                    # purelib/platlib go on the path; scripts, headers and data are not needed
+                    if len(parts) < 3 or parts[1] not in ("purelib", "platlib"):
+                        continue
+                    parts = parts[2:]
+                if member.is_dir() or ".." in parts:
+                    continue
+                dest = work_dir.joinpath(*parts)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                with archive.open(member) as src, open(dest, 'wb') as out:
+                    shutil.copyfileobj(src, out)
+
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(work_dir, target)
+    return wheels
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != "install":
+        print("Usage: wheelhouse.py install <wheel_dir> <target_dir>")
+        return 2
+    try:
+        wheels = install_wheels(sys.argv[2], sys.argv[3])
+    except (RuntimeError, OSError, zipfile.BadZipFile) as e:
+        print(f"[ERROR] {e}")
+        return 1
+    for wheel in wheels:
+        print(f"[OK] {wheel.name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
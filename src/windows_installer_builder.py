@@ -14,9 +14,31 @@ from pathlib import Path
 from dotenv import load_dotenv
 import time
 import socket
+import hashlib
+import shutil
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+sys.path.insert(0, str(Path(__file__).parent))
+from payload_container import write_payload, append_payload, default_codec, default_level
+from installer_stamp import make_deployment_config, stamp_executable, DEFAULT_CHECK_INTERVAL
+from build_graph import BuildGraph, StageTimer, format_timings
+from reproducible import output_name, build_info_for_disk, subprocess_env
+from artifact_store import ArtifactStore, variant_name
+from preflight import Preflight, Check, check_host, run_preflight
+from mirror import offline_mirror, mirror_list, read_from_mirrors
+from arches import DEFAULT_ARCH, MSI_ARCHES, normalize_arch
+from key_pool import pool_auth_key
+
+# Payload entry names shared by the builder and the generated agent
+MSI_ENTRY = "tailscale-setup.msi"
+WATCHDOG_ENTRY = "att_tailscale_watchdog.py"
+# Arch of the bundled MSI, checked by the agent before installing
+ARCH_ENTRY = "arch"
+MSI_URL = "https://pkgs.tailscale.com/stable/tailscale-setup-latest-{arch}.msi"
+# "latest" moves upstream, so the cached MSI download is refreshed daily
+MSI_CACHE_MAX_AGE = 24 * 3600
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -1235,9 +1257,18 @@ if __name__ == "__main__":
 '''
 
 class WindowsInstallerBuilder:
-    def __init__(self):
+    def __init__(self, arch=DEFAULT_ARCH):
         self.build_dir = Path("builds")
         self.temp_dir = Path("temp")
+        self.generic_dir = self.build_dir / "generic"
+        self.cache_dir = self.build_dir / ".cache"
+        # Target arch of the bundled MSI; the agent executable is shared by all arches
+        self.arch = normalize_arch(arch, "windows")
+        self.msi_arch = MSI_ARCHES[self.arch]
+        # Per-arch scratch space, so arches can build concurrently
+        self.work_dir = self.temp_dir / self.arch
+        # Offline builds take the MSI from a local mirror only
+        self.mirror = offline_mirror()
         
         # Create directories
         self.build_dir.mkdir(exist_ok=True)
@@ -1258,11 +1289,32 @@ class WindowsInstallerBuilder:
         print(f"[OK] Auth key loaded from environment: {auth_key[:30]}...")
         return auth_key
 
-    def create_standalone_agent(self, auth_key, msi_data, watchdog_code):
-        """Create the standalone agent code"""
+    def create_payload(self, msi_data, watchdog_code):
+        """Pack MSI and watchdog into a compressed payload container"""
+        codec = default_codec()
+        level = default_level(codec)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        payload_file = self.work_dir / "payload.tspk"
+        
+        write_payload(payload_file, {
+            MSI_ENTRY: msi_data,
+            WATCHDOG_ENTRY: watchdog_code,
+            ARCH_ENTRY: self.arch.encode('utf-8')
+        }, codec, level)
+        
+        raw_size = len(msi_data) + len(watchdog_code.encode('utf-8'))
+        packed_size = payload_file.stat().st_size
+        print(f"[OK] Payload packed ({codec}:{level}): "
+              f"{raw_size / (1024*1024):.2f} MB -> {packed_size / (1024*1024):.2f} MB")
+        return payload_file
+    
+    def create_standalone_agent(self):
+        """Create the standalone agent code
         
-        # Encode MSI data
-        msi_b64 = base64.b64encode(msi_data).decode('utf-8')
+        The agent is generic: MSI and watchdog come from the payload container
+        appended to the executable (see create_payload), and the auth key, tags
+        and intervals from the deployment stamp after it (see installer_stamp).
+        """
         
         # Create the complete agent code
         agent_code = f'''"""
@@ -1271,7 +1323,6 @@ ATT Tailscale Standalone Installer with Watchdog Service
 
 import os
 import sys
-import base64
 import tempfile
 import subprocess
 import json
@@ -1282,11 +1333,38 @@ import logging
 import winreg
 import random
 
-# Embedded data
-AUTH_KEY = "{auth_key}"
-BUILD_TIME = "{datetime.now().isoformat()}"
-MSI_DATA = "{msi_b64}"
-WATCHDOG_CODE = """{watchdog_code.replace('"""', '\\"\\"\\"')}"""
+from payload_container import PayloadReader
+from installer_stamp import read_stamp
+from install_state import InstallState, digest
+
+MSI_ENTRY = "{MSI_ENTRY}"
+WATCHDOG_ENTRY = "{WATCHDOG_ENTRY}"
+ARCH_ENTRY = "{ARCH_ENTRY}"
+# Windows PROCESSOR_ARCHITECTURE values as Tailscale arch names
+HOST_ARCHES = {{"AMD64": "amd64", "ARM64": "arm64", "X86": "386"}}
+
+# Payload and stamp are appended to this executable (or next to the script)
+if getattr(sys, 'frozen', False):
+    INSTALLER_PATH = sys.executable
+else:
+    INSTALLER_PATH = Path(os.path.abspath(__file__)).with_name("payload.tspk")
+
+# Per-deployment config stamped after the payload
+DEPLOYMENT, PAYLOAD_END = read_stamp(INSTALLER_PATH)
+DEPLOYMENT = DEPLOYMENT or {{}}
+AUTH_KEY = DEPLOYMENT.get("auth_key", "")
+BUILD_TIME = DEPLOYMENT.get("build_time", "unknown")
+TAGS = DEPLOYMENT.get("tags", [])
+CHECK_INTERVAL = DEPLOYMENT.get("check_interval", 30)
+
+# Install-state manifest: a re-run only redoes components whose inputs changed
+STATE_FILE = Path("C:/ProgramData/ATT/install_state.json")
+FORCE = "--force" in sys.argv
+TASK_NAME = "ATT_Tailscale_Watchdog"
+
+def open_payload():
+    """Open the payload container in front of the deployment stamp"""
+    return PayloadReader(INSTALLER_PATH, end=PAYLOAD_END)
 
 class StandaloneInstaller:
     def __init__(self):
@@ -1296,6 +1374,8 @@ class StandaloneInstaller:
         
         # Create log directory
         self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.state = InstallState(STATE_FILE)
+        self.changed = []
         
         # Setup logging
         logging.basicConfig(
@@ -1337,6 +1417,12 @@ class StandaloneInstaller:
         except Exception as e:
             raise Exception(f"Administrator check failed: {{e}}")
         
+        # Generic installers must be stamped before they can be deployed
+        if not AUTH_KEY:
+            raise Exception("Installer has no deployment stamp (run installer_stamp.py stamp first)")
+        
+        self.check_arch()
+        
         # Check Windows version
         try:
             import platform
@@ -1347,22 +1433,47 @@ class StandaloneInstaller:
         
         self.log("Prerequisites check completed")
     
+    def is_current(self, component, input_digest):
+        """Whether a component is installed from these inputs (--force redoes everything)"""
+        return not FORCE and self.state.current(component, input_digest)
+    
+    def tailscale_version(self):
+        try:
+            result = subprocess.run([self.tailscale_exe, "version"], capture_output=True, text=True, timeout=30)
+            return result.stdout.splitlines()[0] if result.returncode == 0 and result.stdout else None
+        except Exception:
+            return None
+    
+    def check_arch(self):
+        """Refuse to install an MSI built for another CPU"""
+        with open_payload() as payload:
+            # Payloads from before per-arch builds only carried amd64 MSIs
+            msi_arch = payload.read_bytes(ARCH_ENTRY).decode('utf-8') if ARCH_ENTRY in payload.names() else "amd64"
+        
+        # A 32-bit process on 64-bit Windows sees x86; the real CPU is in PROCESSOR_ARCHITEW6432
+        machine = os.environ.get("PROCESSOR_ARCHITEW6432") or os.environ.get("PROCESSOR_ARCHITECTURE", "")
+        host_arch = HOST_ARCHES.get(machine.upper())
+        if host_arch is None:
+            self.log(f"Unknown CPU architecture {{machine!r}}, installing the {{msi_arch}} MSI", "WARNING")
+        elif host_arch != msi_arch:
+            raise Exception(f"This installer contains the {{msi_arch}} Tailscale MSI but this machine is "
+                            f"{{host_arch}}; use the {{host_arch}} installer")
+        self.log(f"Architecture: {{msi_arch}}")
+    
     def extract_msi(self):
         """Extract MSI from embedded data"""
         self.log("Extracting Tailscale MSI...")
         
         try:
-            # Decode MSI data
-            msi_bytes = base64.b64decode(MSI_DATA)
-            
             # Create temporary file
             suffix = random.randint(1000, 9999)
             msi_path = os.path.join(tempfile.gettempdir(), f"tailscale-{{suffix}}.msi")
             
-            with open(msi_path, 'wb') as f:
-                f.write(msi_bytes)
+            # Stream-decompress and verify against the payload manifest
+            with open_payload() as payload:
+                payload.extract(MSI_ENTRY, msi_path)
             
-            size_mb = len(msi_bytes) / (1024 * 1024)
+            size_mb = os.path.getsize(msi_path) / (1024 * 1024)
             self.log(f"MSI extracted: {{size_mb:.2f}} MB to {{msi_path}}")
             
             return msi_path
@@ -1408,7 +1519,7 @@ class StandaloneInstaller:
             raise Exception(f"Installation failed: {{e}}")
     
     def setup_watchdog(self):
-        """Setup watchdog service"""
+        """Setup watchdog service (script and config only when they changed)"""
         self.log("Setting up watchdog service...")
         
         try:
@@ -1418,29 +1529,43 @@ class StandaloneInstaller:
             
             # Write watchdog script
             watchdog_script = watchdog_dir / "att_tailscale_watchdog.py"
-            with open(watchdog_script, 'w', encoding='utf-8') as f:
-                f.write(WATCHDOG_CODE)
+            with open_payload() as payload:
+                watchdog_digest = payload.entry(WATCHDOG_ENTRY)["sha256"]
+                if self.is_current("watchdog", watchdog_digest):
+                    self.log("Watchdog unchanged, skipping")
+                else:
+                    payload.extract(WATCHDOG_ENTRY, watchdog_script)
+                    self.state.record("watchdog", watchdog_digest, files=[watchdog_script])
+                    self.changed.append("watchdog")
+            
+            config_dir = Path("C:/ProgramData/ATT/Config")
+            config_file = config_dir / "config.json"
+            batch_file = watchdog_dir / "run_watchdog.bat"
+            config_digest = digest(AUTH_KEY, ",".join(TAGS), CHECK_INTERVAL)
+            if self.is_current("config", config_digest):
+                self.log("Watchdog config unchanged, skipping")
+                return str(batch_file)
             
             # Create config
             config = {{
                 "auth_key": AUTH_KEY,
                 "setup_time": datetime.now().isoformat(),
-                "check_interval": 30,
+                "check_interval": CHECK_INTERVAL,
+                "tags": TAGS,
                 "auto_reconnect": True
             }}
             
-            config_dir = Path("C:/ProgramData/ATT/Config")
             config_dir.mkdir(parents=True, exist_ok=True)
-            config_file = config_dir / "config.json"
             with open(config_file, 'w') as f:
                 json.dump(config, f, indent=2)
             
             # Create batch file
-            batch_file = watchdog_dir / "run_watchdog.bat"
             with open(batch_file, 'w') as f:
                 f.write('@echo off\\n')
                 f.write('cd /d "C:\\\\ProgramData\\\\ATT\\\\Watchdog"\\n')
                 f.write('python "att_tailscale_watchdog.py" service\\n')
+            self.state.record("config", config_digest, files=[config_file, batch_file])
+            self.changed.append("config")
             
             self.log("Watchdog service setup completed")
             return str(batch_file)
@@ -1449,12 +1574,18 @@ class StandaloneInstaller:
             raise Exception(f"Watchdog setup failed: {{e}}")
     
     def create_scheduled_task(self, batch_file):
-        """Create Windows scheduled task"""
+        """Create Windows scheduled task (unless it exists with the same settings)"""
+        task_name = TASK_NAME
+        task_digest = digest(task_name, batch_file, "onlogon", "SYSTEM")
+        exists = subprocess.run(["schtasks", "/query", "/tn", task_name],
+                                capture_output=True, timeout=30).returncode == 0
+        if exists and self.is_current("scheduled_task", task_digest):
+            self.log("Scheduled task unchanged, skipping")
+            return
+        
         self.log("Creating scheduled task...")
         
         try:
-            task_name = "ATT_Tailscale_Watchdog"
-            
             cmd = [
                 "schtasks", "/create", "/tn", task_name,
                 "/tr", f'"{{batch_file}}"',
@@ -1468,6 +1599,8 @@ class StandaloneInstaller:
             if result.returncode != 0:
                 raise Exception(f"Task creation failed: {{result.stderr}}")
             
+            self.state.record("scheduled_task", task_digest)
+            self.changed.append("scheduled_task")
             self.log("Scheduled task created successfully")
             
         except Exception as e:
@@ -1478,12 +1611,15 @@ class StandaloneInstaller:
         self.log("Performing initial authentication...")
         
         try:
+            # --reset so re-applied settings replace the previous ones
             cmd = [
-                self.tailscale_exe, "up",
+                self.tailscale_exe, "up", "--reset",
                 "--auth-key", AUTH_KEY,
                 "--unattended",
                 "--accept-routes"
             ]
+            if TAGS:
+                cmd += ["--advertise-tags", ",".join(TAGS)]
             
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
             
@@ -1498,6 +1634,13 @@ class StandaloneInstaller:
             self.log(f"Initial auth exception: {{e}}")
             return False
     
+    def restart_watchdog_task(self):
+        """Restart the running watchdog so a new script or config takes effect"""
+        subprocess.run(["schtasks", "/end", "/tn", TASK_NAME], capture_output=True, timeout=30)
+        result = subprocess.run(["schtasks", "/run", "/tn", TASK_NAME], capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            self.log(f"Watchdog restart warning: {{result.stderr}}")
+    
     def cleanup_temp_files(self, msi_path):
         """Clean up temporary files"""
         try:
@@ -1524,9 +1667,16 @@ class StandaloneInstaller:
             # Step 1: Prerequisites
             self.check_prerequisites()
             
-            # Step 2: Extract and install MSI
-            msi_path = self.extract_msi()
-            self.install_tailscale(msi_path)
+            # Step 2: Extract and install MSI (unless this MSI is installed)
+            with open_payload() as payload:
+                msi_digest = payload.entry(MSI_ENTRY)["sha256"]
+            if self.is_current("tailscale", msi_digest) and Path(self.tailscale_exe).exists():
+                self.log("Tailscale unchanged, skipping MSI install")
+            else:
+                msi_path = self.extract_msi()
+                self.install_tailscale(msi_path)
+                self.state.record("tailscale", msi_digest, version=self.tailscale_version())
+                self.changed.append("tailscale")
             
             # Step 3: Setup watchdog service
             batch_file = self.setup_watchdog()
@@ -1534,8 +1684,17 @@ class StandaloneInstaller:
             # Step 4: Create scheduled task
             self.create_scheduled_task(batch_file)
             
-            # Step 5: Initial authentication
-            self.initial_authentication()
+            # Step 5: Initial authentication (new key or tags only)
+            auth_digest = digest(AUTH_KEY, ",".join(TAGS))
+            if self.is_current("auth", auth_digest):
+                self.log("Authentication unchanged, skipping")
+            elif self.initial_authentication():
+                self.state.record("auth", auth_digest)
+                self.changed.append("auth")
+            
+            if "watchdog" in self.changed or "config" in self.changed:
+                self.restart_watchdog_task()
+            self.log(f"Changed: {{', '.join(self.changed) or 'nothing'}}")
             
             print("\\n" + "=" * 70)
             print("[SUCCESS] DEPLOYMENT SUCCESSFUL!")
@@ -1570,7 +1729,9 @@ def main():
         print("[ERROR] Installation failed - check error messages above")
     print("=" * 70)
     
-    input("\\nPress Enter to close...")
+    # Only pause for a human at a console; provisioning tools run unattended
+    if sys.stdin is not None and sys.stdin.isatty() and "--no-pause" not in sys.argv:
+        input("\\nPress Enter to close...")
     return 0 if success else 1
 
 if __name__ == "__main__":
@@ -1579,12 +1740,59 @@ if __name__ == "__main__":
         
         return agent_code
     
+    def test_network_connectivity(self, test_hosts=None):
+        """Test network connectivity to Tailscale servers"""
+        print("[BUILD] Testing network connectivity...")
+        
+        test_hosts = test_hosts or [
+            ("pkgs.tailscale.com", 443),
+            ("login.tailscale.com", 443),
+            ("api.tailscale.com", 443)
+        ]
+        
+        # All hosts at once with a short timeout; passing results are cached
+        report = Preflight([
+            Check(f"network:{host}", check_host(host, port), cacheable=True)
+            for host, port in test_hosts
+        ]).run()
+        
+        reachable_hosts = 0
+        for (host, port), result in zip(test_hosts, report["checks"]):
+            if result["ok"]:
+                print(f"   [OK] {host}:{port} - Reachable")
+                reachable_hosts += 1
+            else:
+                print(f"   [WARNING] {host}:{port} - {result['detail']}")
+        
+        # If at least one host is reachable, consider network OK
+        if reachable_hosts > 0:
+            print(f"   [OK] Network connectivity confirmed ({reachable_hosts}/{len(test_hosts)} hosts reachable)")
+            return True
+        else:
+            print(f"   [ERROR] No Tailscale hosts reachable")
+            return False
+    
     def download_msi(self):
-        """Download Tailscale MSI from official source"""
-        print("[INFO] Downloading Tailscale MSI...")
+        """Download Tailscale MSI from official source (or the offline mirror)"""
+        if self.mirror is not None:
+            relpath, entry = self.mirror.find("msi", self.msi_arch)
+            print(f"[INFO] Loading Tailscale MSI {entry['version']} from mirror {self.mirror.location}...")
+            msi_data = self.mirror.read(relpath)
+            print(f"[OK] Verified MSI: {len(msi_data) / (1024 * 1024):.2f} MB (sha256 {entry['sha256'][:12]})")
+            return msi_data
+        
+        # LAN mirrors first, so fleet builds don't each pull the MSI over the WAN
+        mirrored = read_from_mirrors(mirror_list(), "msi", self.msi_arch)
+        if mirrored is not None:
+            msi_data, location, entry = mirrored
+            print(f"[OK] Loaded MSI {entry['version']} from mirror {location}: "
+                  f"{len(msi_data) / (1024 * 1024):.2f} MB")
+            return msi_data
+        
+        print(f"[INFO] Downloading Tailscale MSI ({self.arch})...")
         
         # Tailscale MSI download URL
-        url = "https://pkgs.tailscale.com/stable/tailscale-setup-latest-amd64.msi"
+        url = MSI_URL.format(arch=self.msi_arch)
         
         session = requests.Session()
         retry_strategy = Retry(
@@ -1621,100 +1829,221 @@ if __name__ == "__main__":
             print(f"[OK] Loaded watchdog code: {len(watchdog_code)} characters")
         return watchdog_code
     
-    def build_standalone_installer(self):
-        """Build the installer"""
-        auth_key = self.load_auth_key()
+    def build_agent_executable(self, agent_code):
+        """Run PyInstaller on the agent (no payload appended yet)"""
+        print("\n[BUILD] Building agent executable...")
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        agent_file = self.work_dir / "agent.py"
+        agent_file.write_text(agent_code, encoding='utf-8')
+        dist_dir = self.work_dir / "agent_dist"
+        
+        cmd = [
+            sys.executable, "-m", "PyInstaller",
+            "--onefile", "--console",
+            "--name", "TailscaleInstaller-agent",
+            "--distpath", str(dist_dir),
+            "--workpath", str(self.work_dir / "pyinstaller"),
+            "--specpath", str(self.work_dir),
+            "--paths", str(Path(__file__).parent),
+            "--hidden-import", "payload_container",
+            "--hidden-import", "installer_stamp",
+            "--hidden-import", "install_state",
+            str(agent_file)
+        ]
+        
+        print("[BUILD] Building installer (5-10 minutes)...")
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=900,
+                                env=subprocess_env())
+        
+        if result.returncode != 0:
+            print(f"[ERROR] Build failed: {result.stderr}")
+            raise Exception("PyInstaller failed")
+        
+        # Check for executable (Linux: no extension, Windows: .exe)
+        exe_path = dist_dir / ("TailscaleInstaller-agent.exe" if os.name == 'nt' else "TailscaleInstaller-agent")
+        if not exe_path.exists():
+            raise Exception("Executable not found")
+        return exe_path
+    
+    def pack_payload(self, msi_data, watchdog_code):
+        """Payload stage: container file plus the facts build_info reports about it"""
+        codec = default_codec()
+        level = default_level(codec)
+        payload_file = self.create_payload(msi_data, watchdog_code)
+        return {
+            "payload_file": payload_file,
+            "msi_sha256": hashlib.sha256(msi_data).hexdigest(),
+            "msi_size_mb": round(len(msi_data) / (1024 * 1024), 2),
+            "watchdog_size_kb": round(len(watchdog_code) / 1024, 2),
+            "payload_size_mb": round(payload_file.stat().st_size / (1024 * 1024), 2),
+            "payload_codec": f"{codec}:{level}"
+        }
+    
+    def assemble_generic_installer(self, agent_exe, payload, cache_key):
+        """Append the payload to a copy of the agent executable"""
+        self.generic_dir.mkdir(parents=True, exist_ok=True)
+        name = f"TailscaleInstaller-generic-{self.arch}-{cache_key}"
+        generic_path = self.generic_dir / (f"{name}.exe" if os.name == 'nt' else name)
+        
+        part_path = generic_path.with_name(generic_path.name + ".part")
+        shutil.copy2(agent_exe, part_path)
+        append_payload(part_path, payload["payload_file"])
+        os.replace(part_path, generic_path)
+        
+        generic_info = dict(payload, generic_path=generic_path, cache_key=cache_key, arch=self.arch)
+        del generic_info["payload_file"]
+        with open(self.generic_dir / f"{name}.json", 'w') as f:
+            json.dump(dict(generic_info, generic_path=str(generic_path)), f, indent=2)
+        
+        print(f"[OK] Generic installer: {generic_path}")
+        return generic_info
+    
+    def build_graph(self):
+        """Stages of the generic installer build
+        
+        PyInstaller only depends on the agent code, so a new MSI or watchdog
+        only re-packs the payload and re-appends it.
+        """
+        codec = default_codec()
+        src_dir = Path(__file__).parent
+        graph = BuildGraph(self.cache_dir)
+        if self.mirror is not None:
+            # Pinned by hash, so the cached MSI never goes stale
+            _, msi_entry = self.mirror.find("msi", self.msi_arch)
+            graph.add("windows.download_msi", self.download_msi,
+                      inputs={"msi_sha256": msi_entry["sha256"]})
+        else:
+            graph.add("windows.download_msi", self.download_msi,
+                      inputs={"url": MSI_URL.format(arch=self.msi_arch), "mirrors": mirror_list()},
+                      max_age=MSI_CACHE_MAX_AGE)
+        graph.add("windows.watchdog", self.get_watchdog_code,
+                  inputs={"source": Path("src/att_tailscale_watchdog.py")})
+        graph.add("windows.agent", self.create_standalone_agent, cache=False)
+        graph.add("windows.payload", self.pack_payload,
+                  deps={"msi_data": "windows.download_msi", "watchdog_code": "windows.watchdog"},
+                  inputs={"codec": f"{codec}:{default_level(codec)}", "arch": self.arch,
+                          "container": src_dir / "payload_container.py"})
+        graph.add("windows.pyinstaller", self.build_agent_executable,
+                  deps={"agent_code": "windows.agent"},
+                  inputs={"python": sys.version,
+                          "modules": [src_dir / "payload_container.py", src_dir / "installer_stamp.py",
+                                      src_dir / "install_state.py"]})
+        graph.add("windows.generic", self.assemble_generic_installer,
+                  deps={"agent_exe": "windows.pyinstaller", "payload": "windows.payload"},
+                  pass_key=True)
+        return graph
+    
+    def build_generic_installer(self):
+        """Build (or reuse) the generic installer for the current Tailscale MSI
+        
+        The generic exe holds the agent and payload but no deployment config.
+        Each stage is cached under builds/.cache by input hash, so unchanged
+        stages are skipped and a failed build resumes where it stopped.
+        """
+        graph = self.build_graph()
+        try:
+            generic_info = graph.run(["windows.generic"])["windows.generic"]
+        finally:
+            print(format_timings(graph.timings))
+        
+        generic_path = generic_info["generic_path"]
+        return generic_path, dict(generic_info, generic_path=str(generic_path),
+                                  stage_timings=graph.timings)
+    
+    def stamp_installer(self, generic_path, generic_info, auth_key, tags=None,
+                        check_interval=DEFAULT_CHECK_INTERVAL, name=None, variant=None):
+        """Write a per-deployment installer from a generic one (no PyInstaller run)"""
+        started = time.perf_counter()
+        config = make_deployment_config(auth_key, tags, check_interval)
+        arch = generic_info.get("arch", self.arch)
+        
+        if name is None:
+            name = output_name(f"TailscaleInstaller-{arch}", config)
+        exe_name = f"{name}.exe" if os.name == 'nt' else name
+        exe_path = self.build_dir / "dist" / exe_name
+        
+        with StageTimer("windows.stamp") as timer:
+            stamp_executable(generic_path, exe_path, config)
+            timer.record["bytes"] = exe_path.stat().st_size
+        stamp_seconds = time.perf_counter() - started
+        size_mb = exe_path.stat().st_size / (1024 * 1024)
+        
+        # Create build info
+        build_info = {
+            "build_time": config["build_time"],
+            "installer_type": "with_watchdog",
+            "arch": arch,
+            "auth_key_preview": auth_key[:30] + "...",
+            "tags": config["tags"],
+            "check_interval": config["check_interval"],
+            "exe_path": str(exe_path),
+            "exe_size_mb": round(size_mb, 2),
+            "generic_installer": str(generic_path),
+            "stamp_seconds": round(stamp_seconds, 3),
+            "msi_size_mb": generic_info["msi_size_mb"],
+            "watchdog_size_kb": generic_info["watchdog_size_kb"],
+            "payload_size_mb": generic_info["payload_size_mb"],
+            "payload_codec": generic_info["payload_codec"],
+            "stage_timings": generic_info.get("stage_timings", []) + [timer.record],
+            "features": [
+                "Tailscale MSI installation",
+                "Watchdog service with auto-recovery",
+                "Centralized logging (C:/ProgramData/ATT/Logs/)",
+                "Windows Scheduled Task integration",
+                "Auto-reconnect on disconnection",
+                "Service restart capability",
+                "Network connectivity monitoring",
+                "Exponential backoff on failures",
+                "JSON-structured logging with rotation",
+                "Hidden Tailscale tray icon",
+                "Chocolatey package manager integration",
+                "Python installation via Chocolatey",
+                "gdown integration for Google Drive downloads",
+                "gdown utility script for file downloads",
+                "Timeout handling (30s vs 10s)"
+            ]
+        }
+        
+        # Save build info
+        info_file = self.build_dir / f"{name}_build_info.json"
+        variant = variant or variant_name("windows", arch, config["tags"])
+        manifest = ArtifactStore().commit(variant, exe_path, build_info_for_disk(build_info),
+                                          checkout=[exe_path, info_file])
+        build_info["artifact_id"] = manifest["id"]
+        with open(info_file, 'w') as f:
+            json.dump(build_info_for_disk(build_info), f, indent=2)
+        
+        print(f"[OK] Stamped installer in {stamp_seconds:.3f}s: {exe_path}")
+        return exe_path, build_info
+    
+    def build_standalone_installer(self, tags=None, check_interval=DEFAULT_CHECK_INTERVAL, auth_key=None,
+                                   preflight=True):
+        """Build the installer: generic build (cached) + deployment stamp"""
+        auth_key = auth_key or pool_auth_key(tags)
+        if preflight:
+            run_preflight(["windows"], need_auth_key=auth_key is None, arches=[self.arch])
+        auth_key = auth_key or self.load_auth_key()
         
         try:
             # Step 1: Load auth key
             print("\n1. Loading authentication key...")
             
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            name = f"TailscaleInstaller-{timestamp}"
-            
-            # Step 2: Download MSI
-            print("\n2. Downloading Tailscale MSI...")
-            msi_data = self.download_msi()
-            
-            # Step 3: Get watchdog code
-            print("\n3. Preparing watchdog service...")
-            watchdog_code = self.get_watchdog_code()
-            
-            # Step 4: Create agent
-            print("\n4. Creating agent...")
-            agent_code = self.create_standalone_agent(auth_key, msi_data, watchdog_code)
+            # Step 2: Generic installer (download, watchdog, agent, PyInstaller)
+            print("\n2. Preparing generic installer...")
+            generic_path, generic_info = self.build_generic_installer()
             
-            # Step 5: Build executable
-            print("\n5. Building executable...")
-            
-            # Save agent
-            Path("temp").mkdir(exist_ok=True)
-            agent_file = Path("temp/agent.py")
-            agent_file.write_text(agent_code, encoding='utf-8')
-            
-            Path("builds/dist").mkdir(parents=True, exist_ok=True)
-            
-            cmd = [
-                sys.executable, "-m", "PyInstaller",
-                "--onefile", "--console",
-                "--name", name,
-                "--distpath", "builds/dist",
-                str(agent_file)
-            ]
-            
-            print("[BUILD] Building installer (5-10 minutes)...")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=900)
-            
-            if result.returncode != 0:
-                print(f"[ERROR] Build failed: {result.stderr}")
-                raise Exception("PyInstaller failed")
-            
-            # Check for executable (Linux: no extension, Windows: .exe)
-            exe_name = f"{name}.exe" if os.name == 'nt' else name
-            exe_path = Path(f"builds/dist/{exe_name}")
-            if not exe_path.exists():
-                raise Exception("Executable not found")
-            
-            size_mb = exe_path.stat().st_size / (1024 * 1024)
-            
-            # Create build info
-            build_info = {
-                "build_time": datetime.now().isoformat(),
-                "installer_type": "with_watchdog",
-                "auth_key_preview": auth_key[:30] + "...",
-                "exe_path": str(exe_path),
-                "exe_size_mb": round(size_mb, 2),
-                "msi_size_mb": round(len(msi_data) / (1024 * 1024), 2),
-                "watchdog_size_kb": round(len(watchdog_code) / 1024, 2),
-                "features": [
-                    "Tailscale MSI installation",
-                    "Watchdog service with auto-recovery",
-                    "Centralized logging (C:/ProgramData/ATT/Logs/)",
-                    "Windows Scheduled Task integration",
-                    "Auto-reconnect on disconnection",
-                    "Service restart capability",
-                    "Network connectivity monitoring",
-                    "Exponential backoff on failures",
-                    "JSON-structured logging with rotation",
-                    "Hidden Tailscale tray icon",
-                    "Chocolatey package manager integration",
-                    "Python installation via Chocolatey",
-                    "gdown integration for Google Drive downloads",
-                    "gdown utility script for file downloads",
-                    "Timeout handling (30s vs 10s)"
-                ]
-            }
-            
-            # Save build info
-            info_file = Path(f"builds/{name}_build_info.json")
-            with open(info_file, 'w') as f:
-                json.dump(build_info, f, indent=2)
+            # Step 3: Stamp deployment config
+            print("\n3. Stamping deployment config...")
+            exe_path, build_info = self.stamp_installer(
+                generic_path, generic_info, auth_key, tags, check_interval
+            )
+            info_file = self.build_dir / f"{exe_path.stem}_build_info.json"
             
             print("\n" + "=" * 60)
             print("[SUCCESS] BUILD COMPLETED!")
             print("=" * 60)
             print(f"[INFO] Installer: {exe_path}")
-            print(f"[INFO] Size: {size_mb:.2f} MB")
+            print(f"[INFO] Size: {build_info['exe_size_mb']:.2f} MB")
             print(f"[INFO] Auth Key: {auth_key[:30]}...")
             print(f"[INFO] Build Info: {info_file}")
             
@@ -4,7 +4,6 @@ This will be embedded into the final .exe
 """
 
 AGENT_TEMPLATE = '''
-import base64
 import tempfile
 import subprocess
 import os
@@ -15,16 +14,23 @@ import time
 from pathlib import Path
 import winreg
 
+from payload_container import PayloadReader
+
 # Embedded configuration
 AUTH_KEY = "{auth_key}"
 TAILSCALE_VERSION = "{tailscale_version}"
 INSTALL_TIMESTAMP = "{install_timestamp}"
 BUILD_INFO = {build_info}
 
-# Embedded MSI data (will be replaced during build)
-MSI_DATA = base64.b64decode("""
-{msi_data_b64}
-""")
+# MSI is not embedded in the source: it lives in the compressed payload
+# container appended to the executable (see src/payload_container.py)
+MSI_ENTRY = "tailscale-setup.msi"
+
+def open_payload():
+    """Open the payload appended to this executable (or next to the script)"""
+    if getattr(sys, 'frozen', False):
+        return PayloadReader(sys.executable)
+    return PayloadReader(Path(os.path.abspath(__file__)).with_name("payload.tspk"))
 
 class TailscaleInstaller:
     def __init__(self):
@@ -76,10 +82,11 @@ class TailscaleInstaller:
         
         msi_path = os.path.join(tempfile.gettempdir(), f"tailscale-setup-{os.getpid()}.msi")
         
-        with open(msi_path, 'wb') as f:
-            f.write(MSI_DATA)
+        # Stream-decompress and verify against the payload manifest
+        with open_payload() as payload:
+            payload.extract(MSI_ENTRY, msi_path)
         
-        msi_size = len(MSI_DATA) / (1024 * 1024)  # MB
+        msi_size = os.path.getsize(msi_path) / (1024 * 1024)  # MB
         self.log(f"MSI extracted: {msi_size:.2f} MB -> {msi_path}")
         
         return msi_path
@@ -276,7 +283,9 @@ def main():
     installer = TailscaleInstaller()
     success = installer.install()
     
-    input("\\nPress Enter to close...")
+    # Only pause for a human at a console; provisioning tools run unattended
+    if sys.stdin is not None and sys.stdin.isatty() and "--no-pause" not in sys.argv:
+        input("\\nPress Enter to close...")
     return 0 if success else 1
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+
+import sys
+print("Hello from test executable!")
+input("Press Enter to exit...")
+sys.exit(0)
@@ -0,0 +1,6 @@
+import pytest
+
+@pytest.fixture(autouse=True)
+def no_upstream_bundle(monkeypatch):
+    """Linux test builds don't fetch the Tailscale bundle from upstream"""
+    monkeypatch.setenv("LINUX_BUNDLE", "0")
@@ -1,31 +1,47 @@
+import os
+import sys
+from pathlib import Path
+
 import pytest
-import asyncio
-from src.tailscale_api import TailscaleAPI
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from tailscale_api import TailscaleAPI
+from mock_tailscale_api import MockTailscaleAPI, running
+
+# Set TS_API_LIVE=1 (with real OAuth credentials) to run against the Tailscale API
+LIVE = os.getenv("TS_API_LIVE") == "1"
 
 @pytest.fixture
-def api():
-    return TailscaleAPI()
+def api_kwargs():
+    if LIVE:
+        yield {}
+        return
+    with running(MockTailscaleAPI(devices=25)) as base_url:
+        yield {"base_url": base_url, "client_id": "test", "client_secret": "test"}
 
 @pytest.mark.asyncio
-async def test_get_access_token(api):
-    token = await api.get_access_token()
+async def test_get_access_token(api_kwargs):
+    async with TailscaleAPI(**api_kwargs) as api:
+        token = await api.get_access_token()
     assert token is not None
     assert len(token) > 20
 
 @pytest.mark.asyncio
-async def test_create_auth_key(api):
-    key = await api.create_auth_key(
-        tags=["tag:test"],
-        expires_days=1,
-        description="Test key"
-    )
-    
+async def test_create_auth_key(api_kwargs):
+    async with TailscaleAPI(**api_kwargs) as api:
+        key = await api.create_auth_key(
+            tags=["tag:test"],
+            expires_days=1,
+            description="Test key"
+        )
+
     assert 'key' in key
     assert 'id' in key
     assert key['key'].startswith('tskey-auth-')
 
-@pytest.mark.asyncio 
-async def test_list_devices(api):
-    devices = await api.list_devices()
+@pytest.mark.asyncio
+async def test_list_devices(api_kwargs):
+    async with TailscaleAPI(**api_kwargs) as api:
+        devices = await api.list_devices()
     assert 'devices' in devices
-    assert isinstance(devices['devices'], list)
\ No newline at end of file
+    assert isinstance(devices['devices'], list)
@@ -0,0 +1,173 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from tailscale_api import (AuthenticationError, CircuitOpenError, NotFoundError, RateLimitError,
+                           ServerError, TailscaleAPI, TailscaleAPIError)
+from mock_tailscale_api import MockTailscaleAPI, running
+from api_benchmark import benchmark
+
+def make_api(base_url, **kwargs):
+    kwargs.setdefault("rate", 0)
+    return TailscaleAPI(base_url=base_url, tailnet="-", client_id="id", client_secret="secret", **kwargs)
+
+@pytest.mark.asyncio
+async def test_pooled_client_reuses_connections():
+    mock = MockTailscaleAPI(devices=3)
+    with running(mock) as base_url:
+        async with make_api(base_url, max_connections=4) as api:
+            for _ in range(20):
+                await api.list_auth_keys()
+            assert mock.stats["connections"] == 1
+
+            await asyncio.gather(*(api.list_devices() for _ in range(50)))
+            assert mock.stats["connections"] <= 4
+            assert mock.stats["token_requests"] == 1
+            assert len((await api.list_devices())["devices"]) == 3
+            client = api.client
+        assert client.is_closed
+
+@pytest.mark.asyncio
+async def test_client_reopens_after_close():
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        api = make_api(base_url)
+        key = await api.create_auth_key(tags=["tag:test"], expires_days=1)
+        assert key["key"].startswith("tskey-auth-")
+        await api.aclose()
+        assert (await api.list_auth_keys())["keys"] == [{"id": key["id"]}]
+        await api.aclose()
+
+def test_benchmark_reports_connections_per_mode():
+    rows = {(r["mode"], r["pattern"]): r for r in benchmark(calls=20)}
+    assert rows["per-call", "sequential"]["connections"] == 20
+    assert rows["pooled", "sequential"]["connections"] == 0
+    assert rows["pooled", "concurrent"]["connections"] <= 20
+    assert all(r["rps"] > 0 for r in rows.values())
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_token_fetch():
+    mock = MockTailscaleAPI(token_delay=0.2)
+    with running(mock) as base_url:
+        async with make_api(base_url) as api:
+            await asyncio.gather(*(api.list_auth_keys() for _ in range(50)))
+            assert mock.stats["token_requests"] == 1
+            assert api.metrics["token_fetches"] == 1
+            assert api.metrics["token_waits"] == 50
+            assert api.metrics["token_wait_seconds"] >= 50 * 0.15
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_refetched_once_and_retried():
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        async with make_api(base_url) as api:
+            await api.list_auth_keys()
+            mock.revoke_tokens()
+            await asyncio.gather(*(api.list_auth_keys() for _ in range(20)))
+            assert mock.stats["token_requests"] == 2
+            assert api.metrics["unauthorized_retries"] == 20
+
+@pytest.mark.asyncio
+async def test_token_is_refreshed_before_expiry():
+    mock = MockTailscaleAPI(token_lifetime=1)
+    with running(mock) as base_url:
+        async with make_api(base_url) as api:
+            await api.list_auth_keys()
+            await asyncio.sleep(1.2)
+            assert api.metrics["proactive_refreshes"] == 1
+            assert mock.stats["token_requests"] == 2
+
+            # The refreshed token is ready, so callers don't wait
+            await api.list_auth_keys()
+            assert api.metrics["token_waits"] == 1
+
+@pytest.mark.asyncio
+async def test_retries_failed_reads_but_never_failed_key_creation():
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        async with make_api(base_url) as api:
+            mock.fail_next(503, 2, retry_after=0)
+            await api.list_auth_keys()
+            assert api.metrics["retries"] == 2
+
+            mock.fail_next(500)
+            with pytest.raises(ServerError):
+                await api.create_auth_key()
+            assert mock.keys == {}
+
+            # A throttled request was never processed, so it is retried
+            mock.fail_next(429, retry_after=0)
+            await api.create_auth_key()
+            assert len(mock.keys) == 1
+
+            with pytest.raises(NotFoundError):
+                await api._request("GET", "nope")
+
+@pytest.mark.asyncio
+async def test_unsent_key_creation_is_retried():
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        async with make_api(base_url) as api:
+            await api.get_access_token()
+            send = api._send
+            unsent = [httpx.ConnectTimeout("connect timed out"), httpx.PoolTimeout("no free connection")]
+
+            async def flaky_send(*args, **kwargs):
+                if unsent:
+                    raise unsent.pop(0)
+                return await send(*args, **kwargs)
+
+            api._send = flaky_send
+            await api.create_auth_key()
+            assert len(mock.keys) == 1 and api.metrics["retries"] == 2
+
+            # A read timeout may have reached the server: not retried
+            unsent.append(httpx.ReadTimeout("read timed out"))
+            with pytest.raises(TailscaleAPIError):
+                await api.create_auth_key()
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_and_open_circuit_raise_typed_errors():
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        async with make_api(base_url, max_retries=1, circuit_threshold=3) as api:
+            mock.fail_next(429, 2, retry_after=0)
+            with pytest.raises(RateLimitError) as error:
+                await api.list_auth_keys()
+            assert error.value.retry_after == 0
+
+            # The third consecutive failure opens the circuit mid-retry
+            mock.fail_next(500, 3, retry_after=0)
+            with pytest.raises(ServerError):
+                await api.list_auth_keys()
+            with pytest.raises(CircuitOpenError):
+                await api.list_auth_keys()
+            requests = mock.stats["requests"]
+            with pytest.raises(CircuitOpenError):
+                await api.list_auth_keys()
+            assert mock.stats["requests"] == requests
+
+        mock.client_secret = "other"
+        async with make_api(base_url) as api:
+            with pytest.raises(AuthenticationError):
+                await api.list_auth_keys()
+
+@pytest.mark.asyncio
+async def test_client_limiter_stays_under_server_rate_limit():
+    mock = MockTailscaleAPI(rate_limit=50, burst=5)
+    with running(mock) as base_url:
+        # Too fast a client limit adapts down on 429s instead of failing
+        async with make_api(base_url, rate=500, burst=20) as api:
+            await asyncio.gather(*(api.list_auth_keys() for _ in range(40)))
+            assert api.metrics["throttled"] == mock.stats["throttled"] > 0
+
+        # Once the server's burst has refilled
+        await asyncio.sleep(0.2)
+        throttled = mock.stats["throttled"]
+        async with make_api(base_url, rate=40, burst=5) as api:
+            await asyncio.gather(*(api.list_auth_keys() for _ in range(40)))
+            assert mock.stats["throttled"] - throttled <= 2
@@ -0,0 +1,160 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from build_graph import BuildGraph, BuildGraphError, StageTimer, format_timings
+
+class Counter:
+    def __init__(self):
+        self.calls = {}
+
+    def __call__(self, name, result):
+        def stage(**kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return result(**kwargs) if callable(result) else result
+        return stage
+
+def make_graph(cache_dir, calls, source="v1"):
+    graph = BuildGraph(cache_dir)
+    graph.add("download", calls("download", b"msi-bytes"), inputs={"url": "https://example"})
+    graph.add("source", calls("source", source), inputs={"version": source})
+    graph.add("package", calls("package", lambda data, code: data + code.encode()),
+              deps={"data": "download", "code": "source"})
+    return graph
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    calls = Counter()
+    assert make_graph(tmp_path, calls).run()["package"] == b"msi-bytesv1"
+
+    graph = make_graph(tmp_path, calls)
+    assert graph.run()["package"] == b"msi-bytesv1"
+    assert calls.calls == {"download": 1, "source": 1, "package": 1}
+    assert [t["status"] for t in graph.timings] == ["cached"] * 3
+    assert {"wall_seconds", "cpu_seconds", "bytes"} <= set(graph.timings[0])
+
+def test_changed_input_reruns_dependents_only(tmp_path):
+    calls = Counter()
+    make_graph(tmp_path, calls).run()
+    assert make_graph(tmp_path, calls, source="v2").run()["package"] == b"msi-bytesv2"
+    assert calls.calls == {"download": 1, "source": 2, "package": 2}
+
+def test_failed_build_resumes_from_failed_stage(tmp_path):
+    calls = Counter()
+    graph = BuildGraph(tmp_path)
+    graph.add("download", calls("download", b"data"))
+    graph.add("package", calls("package", lambda data: 1 / 0), deps={"data": "download"})
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+    assert graph.timings[-1]["status"] == "failed"
+
+    graph = BuildGraph(tmp_path)
+    graph.add("download", calls("download", b"data"))
+    graph.add("package", calls("package", lambda data: data * 2), deps={"data": "download"})
+    assert graph.run()["package"] == b"datadata"
+    assert calls.calls == {"download": 1, "package": 2}
+
+def test_path_output_changed_on_disk_is_rebuilt(tmp_path):
+    calls = Counter()
+    out = tmp_path / "out.bin"
+
+    def write():
+        out.write_bytes(b"artifact")
+        return out
+
+    for _ in range(2):
+        graph = BuildGraph(tmp_path / "cache")
+        graph.add("write", calls("write", write))
+        graph.run()
+    assert calls.calls["write"] == 1
+
+    out.write_bytes(b"tampered")
+    os.utime(out, ns=(0, 0))
+    graph = BuildGraph(tmp_path / "cache")
+    graph.add("write", calls("write", write))
+    graph.run()
+    assert calls.calls["write"] == 2
+
+def test_max_age_expires_entries(tmp_path):
+    calls = Counter()
+    for _ in range(2):
+        graph = BuildGraph(tmp_path)
+        graph.add("download", calls("download", b"latest"), max_age=0)
+        graph.run()
+    assert calls.calls["download"] == 2
+
+def test_cycle_is_rejected(tmp_path):
+    graph = BuildGraph(tmp_path)
+    graph.add("a", lambda b: b, deps={"b": "b"})
+    graph.add("b", lambda a: a, deps={"a": "a"})
+    with pytest.raises(BuildGraphError):
+        graph.run()
+
+def test_windows_generic_build_skips_pyinstaller_when_only_msi_changes(tmp_path, monkeypatch):
+    from windows_installer_builder import WindowsInstallerBuilder
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "att_tailscale_watchdog.py").write_text("print('watchdog')\n")
+    builds = []
+    msi = {"data": b"msi-v1" * 1000}
+
+    def fake_pyinstaller(self, agent_code):
+        builds.append(agent_code)
+        exe = self.temp_dir / "agent_dist" / "TailscaleInstaller-agent"
+        exe.parent.mkdir(parents=True, exist_ok=True)
+        exe.write_bytes(b"MZ-agent")
+        return exe
+
+    monkeypatch.setattr(WindowsInstallerBuilder, "build_agent_executable", fake_pyinstaller)
+    monkeypatch.setattr(WindowsInstallerBuilder, "download_msi", lambda self: msi["data"])
+
+    first_path, first_info = WindowsInstallerBuilder().build_generic_installer()
+    again_path, _ = WindowsInstallerBuilder().build_generic_installer()
+    assert again_path == first_path
+    assert len(builds) == 1
+
+    monkeypatch.setattr("windows_installer_builder.MSI_CACHE_MAX_AGE", 0)
+    msi["data"] = b"msi-v2" * 1000
+    new_path, new_info = WindowsInstallerBuilder().build_generic_installer()
+    assert new_path != first_path
+    assert len(builds) == 1
+    statuses = {t["stage"]: t["status"] for t in new_info["stage_timings"]}
+    assert statuses["windows.pyinstaller"] == "cached"
+    assert statuses["windows.payload"] == "built"
+
+@pytest.mark.skipif(sys.platform == "win32", reason="child CPU needs resource.getrusage")
+def test_child_cpu_is_not_charged_to_overlapping_stages():
+    import threading
+    import subprocess
+
+    def burn():
+        subprocess.run([sys.executable, "-c", "import time\nt = time.process_time()\n"
+                        "while time.process_time() - t < 0.3: pass"], check=True)
+
+    with StageTimer("serial") as serial:
+        burn()
+    assert serial.record["cpu_seconds"] >= 0.25 and serial.record["child_cpu"]
+
+    started, done = threading.Event(), threading.Event()
+    records = []
+
+    def idle_stage():
+        with StageTimer("idle") as timer:
+            started.set()
+            done.wait(5)
+        records.append(timer.record)
+
+    idle = threading.Thread(target=idle_stage)
+    idle.start()
+    started.wait(5)
+    with StageTimer("busy") as busy:
+        burn()
+    done.set()
+    idle.join(5)
+    # The idle stage's child CPU window includes the busy stage's child
+    assert records[0]["cpu_seconds"] < 0.1 and not records[0]["child_cpu"]
+    assert not busy.record["child_cpu"]
+    assert "*" in format_timings(records)
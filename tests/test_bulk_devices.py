@@ -0,0 +1,127 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from bulk_devices import (Selector, SelectorError, apply_plan, checkpoint_plan, finish_run, make_plan,
+                          plan_operations, plan_path, save_checkpoint)
+from bulk_keys import read_results
+from device_inventory import parse_time
+from mock_tailscale_api import MockTailscaleAPI, make_device, running
+from tailscale_api import TailscaleAPI
+
+def make_api(base_url, **kwargs):
+    return TailscaleAPI(base_url=base_url, client_id="id", client_secret="secret", rate=0, **kwargs)
+
+def test_selector_and_plan():
+    devices = [make_device(i) for i in range(200)]
+    with pytest.raises(SelectorError):
+        Selector()
+
+    offline = make_plan(devices, Selector(offline_days=30), "delete")
+    cutoff = time.time() - 30 * 86400
+    assert {op["device_id"] for op in offline} == {d["id"] for d in devices if parse_time(d["lastSeen"]) < cutoff}
+
+    kiosks = make_plan(devices, Selector(tags=["tag:kiosk"], hostname="HOST-00000?"), "delete")
+    assert [op["hostname"] for op in kiosks] == ["host-000002", "host-000005", "host-000008"]
+
+    # Already in the wanted state: nothing to do
+    assert make_plan(devices, Selector(tags=["tag:server"]), "authorize") == []
+    assert make_plan(devices, Selector(tags=["tag:server"]), "tag", {"tags": ["tag:server"]}) == []
+    with pytest.raises(SelectorError):
+        make_plan(devices, Selector(tags=["tag:server"]), "tag")
+
+    # Re-imaged laptop: same hostname, older registrations are the stale ones
+    reimaged = [{**make_device(300 + i), "hostname": "laptop-7", "lastSeen": f"2026-0{i + 1}-01T00:00:00Z"}
+                for i in range(3)]
+    plan = make_plan(devices + reimaged, Selector(duplicates=True), "delete")
+    assert [op["device_id"] for op in plan] == [reimaged[0]["id"], reimaged[1]["id"]]
+
+def test_apply_resumes_and_logs_every_device(tmp_path):
+    log = tmp_path / "ops.ndjson"
+    mock = MockTailscaleAPI(devices=90)
+
+    async def run(base_url):
+        async with make_api(base_url, max_retries=0) as api:
+            plan = await plan_operations(api, Selector(tags=["tag:kiosk"]), "delete")
+            assert len(plan) == 30
+
+            # Failed operations are logged and left for the re-run
+            mock.fail_next(500, 3)
+            first = await apply_plan(api, plan, log, concurrency=4, rate=0)
+            assert first["failed"] == 3 and first["done"] == 27
+
+            second = await apply_plan(api, plan, log, concurrency=4, rate=0)
+            assert second["skipped"] == 27 and second["done"] == 3 and second["failed"] == 0
+
+            tagged = await plan_operations(api, Selector(tags=["tag:server"]), "tag", {"tags": ["tag:retired"]})
+            await apply_plan(api, tagged, log, concurrency=4, rate=0)
+            return plan, tagged
+
+    with running(mock) as base_url:
+        plan, tagged = asyncio.run(run(base_url))
+
+    assert not any("tag:kiosk" in d["tags"] for d in mock.devices)
+    assert sum(d["tags"] == ["tag:retired"] for d in mock.devices) == 30
+    results = read_results(log, key="op_id")
+    assert all(results[op["op_id"]]["status"] == "ok" for op in plan + tagged)
+
+def test_apply_respects_ops_budget_and_missing_devices(tmp_path):
+    mock = MockTailscaleAPI(devices=30)
+
+    async def run(base_url):
+        async with make_api(base_url) as api:
+            plan = await plan_operations(api, Selector(tags=["tag:employee"]), "expire")
+            mock.device_op(plan[0]["device_id"])
+            started = time.perf_counter()
+            summary = await apply_plan(api, plan, tmp_path / "ops.ndjson", concurrency=8, rate=5)
+            return summary, time.perf_counter() - started
+
+    with running(mock) as base_url:
+        summary, elapsed = asyncio.run(run(base_url))
+    assert summary["done"] == 9 and summary["failed"] == 1
+    # 10 operations at 5/s: a burst of 5, then the other 5 over a second
+    assert 0.8 < elapsed < 3
+    assert all(d["expires"] for d in mock.devices if "tag:employee" in d["tags"])
+
+def test_checkpoint_is_only_resumed_by_the_same_command(tmp_path):
+    checkpoint = tmp_path / "ops.ndjson.plan.json"
+    kiosks = Selector(tags=["tag:kiosk"], offline_days=30)
+    command = {"action": "delete", "args": {}, "selector": kiosks.spec()}
+    assert checkpoint_plan(checkpoint, command) is None
+
+    plan = make_plan([make_device(i) for i in range(30)], kiosks, "delete")
+    save_checkpoint(plan, checkpoint, command)
+    assert checkpoint_plan(checkpoint, dict(command)) == plan
+
+    # A leftover checkpoint never stands in for a different action or selection
+    for other in ({**command, "action": "expire"},
+                  {**command, "selector": Selector(tags=["tag:server"]).spec()},
+                  {"action": "delete", "plan": str(tmp_path / "plan.json")}):
+        with pytest.raises(SelectorError, match="tag:kiosk"):
+            checkpoint_plan(checkpoint, other)
+    checkpoint.write_text("[]")
+    with pytest.raises(SelectorError):
+        checkpoint_plan(checkpoint, command)
+
+def test_finished_run_lets_the_same_command_apply_again(tmp_path):
+    log = tmp_path / "ops.ndjson"
+    mock = MockTailscaleAPI(devices=30)
+
+    async def run(base_url):
+        async with make_api(base_url) as api:
+            plan = await plan_operations(api, Selector(tags=["tag:employee"]), "expire")
+            first = await apply_plan(api, plan, log, rate=0)
+            save_checkpoint(plan, plan_path(log), {"action": "expire"})
+            archived = finish_run(log)
+            second = await apply_plan(api, plan, log, rate=0)
+            return first, second, archived
+
+    with running(mock) as base_url:
+        first, second, archived = asyncio.run(run(base_url))
+    assert first["done"] == second["done"] == 10 and second["skipped"] == 0
+    assert not plan_path(log).exists()
+    assert len(read_results(archived, key="op_id")) == 10
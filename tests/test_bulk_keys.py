@@ -0,0 +1,83 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from bulk_keys import MAX_DESCRIPTION, SpecError, expand_spec, key_description, marker, mint_keys, read_results
+from mock_tailscale_api import MockTailscaleAPI, running
+from tailscale_api import TailscaleAPI
+
+def mint(mock, base_url, requests, output, concurrency=4):
+    async def run():
+        async with TailscaleAPI(base_url=base_url, client_id="id", client_secret="secret", rate=0) as api:
+            return await mint_keys(api, requests, output, concurrency)
+    return asyncio.run(run())
+
+def test_expand_spec():
+    requests = expand_spec({"defaults": {"tags": ["tag:ci"], "expires_days": 1},
+                            "keys": [{"id": "runner", "count": 3}, {"id": "sales", "tags": ["tag:sales"]}]})
+    assert [r["request_id"] for r in requests] == ["runner-1", "runner-2", "runner-3", "sales"]
+    assert requests[0]["tags"] == ["tag:ci"] and requests[3]["tags"] == ["tag:sales"]
+    assert requests[0]["reusable"] is True
+
+    with pytest.raises(SpecError):
+        expand_spec([{"id": "a"}, {"id": "a"}])
+    with pytest.raises(SpecError):
+        expand_spec([{"id": "a", "tag": "tag:typo"}])
+    with pytest.raises(SpecError):
+        expand_spec([{"tags": ["tag:ci"]}])
+
+    long = {**requests[0], "description": "x" * 80}
+    assert len(key_description(long)) == MAX_DESCRIPTION
+    assert key_description(long).endswith(marker("runner-1"))
+
+def test_mint_resumes_failed_requests_without_duplicates(tmp_path):
+    output = tmp_path / "keys.ndjson"
+    requests = expand_spec([{"id": "ci", "count": 30, "tags": ["tag:ci"]}])
+    mock = MockTailscaleAPI()
+    with running(mock) as base_url:
+        # Failed key creation is not retried (it may have been processed)
+        mock.fail_next(500, 3)
+        summary = mint(mock, base_url, requests, output)
+        assert (summary["minted"], summary["failed"]) == (27, 3)
+        assert output.stat().st_mode & 0o777 == 0o600
+
+        summary = mint(mock, base_url, requests, output)
+        assert (summary["skipped"], summary["minted"], summary["failed"]) == (27, 3, 0)
+        assert mint(mock, base_url, requests, output)["minted"] == 0
+
+    results = read_results(output)
+    assert all(r["status"] == "ok" and r["key"].startswith("tskey-auth-") for r in results.values())
+    assert sorted(r["key_id"] for r in results.values()) == sorted(mock.keys)
+
+def test_key_minted_but_unrecorded_is_revoked_on_resume(tmp_path):
+    output = tmp_path / "keys.ndjson"
+    requests = expand_spec([{"id": "dept", "count": 5}])
+    mock = MockTailscaleAPI()
+    # An interrupted run: the key was created but its result never written
+    orphan = mock.create_key({"description": key_description(requests[2])})
+    output.write_text(json.dumps({"request_id": "dept-3", "status": "pending"}) + "\n")
+
+    with running(mock) as base_url:
+        summary = mint(mock, base_url, requests, output)
+    assert (summary["revoked"], summary["minted"]) == (1, 5)
+    assert orphan["id"] not in mock.keys
+    assert len(mock.keys) == 5
+    assert read_results(output)["dept-3"]["status"] == "ok"
+
+def test_key_minted_despite_a_client_error_is_revoked_on_resume(tmp_path):
+    output = tmp_path / "keys.ndjson"
+    requests = expand_spec([{"id": "dept", "count": 3}])
+    mock = MockTailscaleAPI()
+    # The server created the key but the response never made it back
+    orphan = mock.create_key({"description": key_description(requests[1])})
+    output.write_text(json.dumps({"request_id": "dept-2", "status": "error", "error": "read timed out"}) + "\n")
+
+    with running(mock) as base_url:
+        summary = mint(mock, base_url, requests, output)
+    assert (summary["revoked"], summary["minted"]) == (1, 3)
+    assert orphan["id"] not in mock.keys
+    assert len(mock.keys) == 3
@@ -0,0 +1,72 @@
+import io
+import sys
+import csv
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from json_stream import ArrayItemParser, JSONStreamError, read_array
+from device_export import ExportError, benchmark, device_record, export_devices, parse_fields
+from mock_tailscale_api import MockTailscaleAPI, make_device, running
+from tailscale_api import TailscaleAPI, TailscaleAPIError
+
+def test_parser_yields_items_across_any_chunking():
+    items = [make_device(i) for i in range(20)] + [{"n": 1.5, "s": "a]\"}{,", "u": "é☃"}, 7, None]
+    document = json.dumps({"devices": items}, indent=1).encode('utf-8')
+    for size in (1, 3, 64, len(document)):
+        parser = ArrayItemParser("devices")
+        parsed = []
+        for start in range(0, len(document), size):
+            parsed.extend(parser.feed(document[start:start + size]))
+        parser.close()
+        assert parsed == items
+
+    assert list(read_array(io.BytesIO(b'{"devices": []}'), "devices")) == []
+    with pytest.raises(JSONStreamError):
+        list(read_array(io.BytesIO(document[:len(document) // 2]), "devices"))
+
+def test_stream_export_matches_list_devices():
+    mock = MockTailscaleAPI(devices=500)
+
+    async def run(base_url):
+        async with TailscaleAPI(base_url=base_url, client_id="id", client_secret="secret", rate=0) as api:
+            streamed = [device async for device in api.iter_devices()]
+            assert streamed == (await api.list_devices())["devices"]
+
+            out = io.StringIO()
+            assert await export_devices(api.iter_devices(), out, "csv", parse_fields("hostname,addresses")) == 500
+            rows = list(csv.reader(io.StringIO(out.getvalue())))
+            assert rows[0] == ["hostname", "addresses"]
+            assert rows[2] == [mock.devices[1]["hostname"], " ".join(mock.devices[1]["addresses"])]
+
+            out = io.StringIO()
+            await export_devices(api.iter_devices(), out)
+            first = json.loads(out.getvalue().splitlines()[0])
+            assert first["tags"] == mock.devices[0]["tags"] and "nodeId" not in first
+
+            # Errors before the body streams are retried like any read
+            mock.fail_next(503, retry_after=0)
+            assert len([device async for device in api.iter_devices()]) == 500
+            mock.fail_next(404)
+            with pytest.raises(TailscaleAPIError):
+                [device async for device in api.iter_devices()]
+
+    with running(mock) as base_url:
+        asyncio.run(run(base_url))
+
+def test_records_and_fields():
+    record = device_record({**make_device(1), "unknownField": 1})
+    assert record.hostname == "host-000001" and isinstance(record.addresses, tuple)
+    assert not hasattr(record, "unknownField")
+    assert device_record({"id": "1"}).tags == ()
+    with pytest.raises(ExportError):
+        parse_fields("hostname,bogus")
+
+def test_streaming_peak_memory_stays_flat():
+    rows = {(r["mode"], r["devices"]): r for r in benchmark(sizes=(2000, 8000))}
+    assert rows["streaming", 8000]["peak_mb"] < 2 * rows["streaming", 2000]["peak_mb"] + 0.5
+    assert rows["buffered", 8000]["peak_mb"] > 3 * rows["buffered", 2000]["peak_mb"]
+    assert rows["streaming", 8000]["peak_mb"] < rows["buffered", 8000]["peak_mb"] / 5
@@ -0,0 +1,84 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from device_inventory import DeviceInventory, benchmark, parse_time
+from mock_tailscale_api import MockTailscaleAPI, make_device, running
+from tailscale_api import TailscaleAPI
+
+def sync(inventory, base_url, max_age=None):
+    async def run():
+        async with TailscaleAPI(base_url=base_url, client_id="id", client_secret="secret", rate=0) as api:
+            if max_age is not None:
+                return await inventory.sync_if_stale(api, max_age)
+            return await inventory.sync(api)
+    return asyncio.run(run())
+
+def test_sync_records_deltas(tmp_path):
+    mock = MockTailscaleAPI(devices=50)
+    with running(mock) as base_url, DeviceInventory(tmp_path / "devices.db") as inventory:
+        delta = sync(inventory, base_url)
+        assert len(delta["added"]) == inventory.count() == 50
+        assert sync(inventory, base_url)["changed"] == {}
+
+        devices = [dict(d) for d in mock.devices[2:]] + [make_device(50)]
+        devices[0]["tags"] = ["tag:moved"]
+        devices[1]["lastSeen"] = "2030-01-01T00:00:00Z"
+        mock.set_devices(devices)
+
+        delta = sync(inventory, base_url)
+        assert delta["added"] == [make_device(50)["id"]]
+        assert sorted(delta["removed"]) == [make_device(0)["id"], make_device(1)["id"]]
+        # A new lastSeen alone is not a change, but is stored
+        assert delta["changed"] == {devices[0]["id"]: ["tags"]}
+        assert inventory.get(devices[1]["id"])["lastSeen"] == "2030-01-01T00:00:00Z"
+        assert {c["change"] for c in inventory.changes(delta["sync_id"])} == {"added", "removed", "changed"}
+
+        assert [d["id"] for d in inventory.by_tag("tag:moved")] == [devices[0]["id"]]
+        assert inventory.by_hostname("host-000000") == []
+        assert inventory.last_sync()["total"] == 49
+
+        requests = mock.stats["requests"]
+        assert sync(inventory, base_url, max_age=60) is None
+        assert mock.stats["requests"] == requests
+
+def test_lookups_and_offline_query(tmp_path):
+    mock = MockTailscaleAPI(devices=300)
+    with running(mock) as base_url, DeviceInventory(tmp_path / "devices.db") as inventory:
+        sync(inventory, base_url)
+    # Lookups need no API
+    inventory = DeviceInventory(tmp_path / "devices.db")
+    device = mock.devices[123]
+
+    assert inventory.find("HOST-000123") == [device]
+    assert inventory.find(device["name"]) == [device]
+    assert inventory.find(device["name"].split(".")[0]) == [device]
+    assert inventory.find(device["addresses"][0]) == [device]
+    assert inventory.find(device["addresses"][1]) == [device]
+    assert len(inventory.find(device["tags"][0])) == sum(device["tags"] == d["tags"] for d in mock.devices)
+
+    now = time.time()
+    expected = [d for d in mock.devices if parse_time(d["lastSeen"]) < now - 5 * 86400]
+    offline = inventory.offline(5, now)
+    assert sorted(d["id"] for d in offline) == sorted(d["id"] for d in expected) != []
+    assert offline == sorted(offline, key=lambda d: d["lastSeen"])
+
+def test_lookups_use_indexes(tmp_path):
+    with DeviceInventory(tmp_path / "devices.db") as inventory:
+        queries = [
+            ("SELECT data FROM devices WHERE hostname = ?1 OR name = ?1 OR short_name = ?1", ("h",)),
+            ("SELECT d.data FROM device_addresses a JOIN devices d ON d.id = a.device_id WHERE a.address = ?",
+             ("100.64.0.1",)),
+            ("SELECT d.data FROM device_tags t JOIN devices d ON d.id = t.device_id WHERE t.tag = ?", ("tag:a",)),
+            ("SELECT data FROM devices WHERE last_seen < ? ORDER BY last_seen", (0,)),
+        ]
+        for query, params in queries:
+            plan = " ".join(row[3] for row in inventory.db.execute("EXPLAIN QUERY PLAN " + query, params))
+            assert "SCAN" not in plan, plan
+
+def test_benchmark_reports_local_lookups_faster():
+    result = benchmark(devices=2000, lookups=40)
+    assert result["local_lookup_ms"] < result["api_lookup_ms"]
+    assert result["offline_devices"] > 0
@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from load_test import load_test, percentile
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 1.0) == 100
+    assert percentile([], 0.5) == 0
+
+def test_levels_report_throughput_latency_and_connections():
+    rows = load_test(levels=(1, 8), requests=80, latency=0.01, jitter=0, max_connections=4, max_keepalive=4)
+    assert [row["concurrency"] for row in rows] == [1, 8]
+    for row in rows:
+        assert row["errors"] == 0 and row["rps"] > 0
+        assert 10 <= row["p50_ms"] <= row["p99_ms"] <= row["max_ms"]
+    assert rows[0]["peak_connections"] == 1
+    # More workers than pool slots: they queue for the 4 connections
+    assert rows[1]["connections"] <= 4 and rows[1]["peak_connections"] <= 4
+    assert rows[1]["rps"] > rows[0]["rps"] * 2
+
+def test_injected_errors_and_429s_are_retried():
+    [row] = load_test(levels=(8,), requests=100, operation="devices", devices=50, latency=0, jitter=0,
+                      error_rate=0.1, seed=7)
+    assert row["errors"] == 0 and row["retries"] > 0
+
+    [row] = load_test(levels=(8,), requests=400, latency=0, jitter=0, rate_limit=200, max_retries=30)
+    assert row["errors"] == 0 and row["throttled"] > 0
@@ -0,0 +1,102 @@
+import sys
+import asyncio
+from contextlib import ExitStack
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from multi_tailnet import TailnetConfigError, TailnetManager, benchmark, expand_tailnets
+from mock_tailscale_api import MockTailscaleAPI, running
+from tailscale_api import AuthenticationError
+
+def serve(stack, mocks):
+    """Tailnet entries for mocks, each with its own credentials"""
+    return expand_tailnets([{"name": name, "client_id": f"{name}-id", "client_secret": mock.client_secret,
+                             "base_url": stack.enter_context(running(mock))}
+                            for name, mock in mocks.items()])
+
+def test_expand_tailnets(monkeypatch):
+    monkeypatch.setenv("LAB_SECRET", "s3cret")
+    tailnets = expand_tailnets({"tailnets": [
+        {"name": "prod", "tailnet": "example.com", "client_id": "p", "client_secret": "ps", "rate": 5},
+        {"name": "lab", "client_id": "l", "client_secret_env": "LAB_SECRET"}]})
+    assert [t["name"] for t in tailnets] == ["prod", "lab"]
+    assert tailnets[1]["client_secret"] == "s3cret" and tailnets[1]["tailnet"] == "-"
+
+    monkeypatch.delenv("LAB_SECRET")
+    for bad in ([{"name": "lab", "client_id": "l", "client_secret_env": "LAB_SECRET"}],
+                [{"name": "a", "client_id": "x", "client_secret": "y"}] * 2,
+                [{"name": "a", "client_id": "x", "client_secret": "y", "secret": "typo"}],
+                []):
+        with pytest.raises(TailnetConfigError):
+            expand_tailnets(bad)
+
+def test_tailnets_have_isolated_tokens_and_pools():
+    mocks = {"prod": MockTailscaleAPI(devices=3, client_secret="prod-secret"),
+             "lab": MockTailscaleAPI(devices=5, client_secret="lab-secret")}
+
+    async def run(tailnets):
+        async with TailnetManager(tailnets, rate=0) as manager:
+            results, errors = await manager.gather(lambda api: api.list_devices())
+            assert errors == {}
+            assert {name: len(r["devices"]) for name, r in results.items()} == {"prod": 3, "lab": 5}
+            assert manager.api("prod").client is not manager.api("lab").client
+
+            mocks["prod"].revoke_tokens()
+            await manager.gather(lambda api: api.list_auth_keys())
+            assert manager.api("prod").metrics["unauthorized_retries"] == 1
+            assert manager.api("lab").metrics["unauthorized_retries"] == 0
+
+    with ExitStack() as stack:
+        asyncio.run(run(serve(stack, mocks)))
+    assert mocks["prod"].stats["token_requests"] == 2
+    assert mocks["lab"].stats["token_requests"] == 1
+    assert mocks["lab"].stats["connections"] == 1
+
+def test_merged_stream_survives_a_failing_tailnet():
+    mocks = {"prod": MockTailscaleAPI(devices=300, client_secret="a"),
+             "lab": MockTailscaleAPI(devices=200, client_secret="b"),
+             "contractors": MockTailscaleAPI(devices=10, client_secret="c")}
+
+    async def run(tailnets):
+        async with TailnetManager(tailnets, rate=0) as manager:
+            errors = {}
+            merged = [(name, device["id"]) async for name, device in manager.iter_devices(errors=errors)]
+            assert isinstance(errors["contractors"], AuthenticationError)
+            assert sorted({name for name, _ in merged}) == ["lab", "prod"]
+            assert len(merged) == 500
+
+            with pytest.raises(AuthenticationError):
+                [item async for item in manager.iter_devices()]
+            assert len([item async for item in manager.iter_devices(["lab"])]) == 200
+            with pytest.raises(TailnetConfigError):
+                [item async for item in manager.iter_devices(["staging"])]
+
+    with ExitStack() as stack:
+        tailnets = serve(stack, mocks)
+        tailnets[2]["client_secret"] = "wrong"
+        asyncio.run(run(tailnets))
+
+def test_stopping_the_stream_early_cancels_the_producers():
+    mocks = {"prod": MockTailscaleAPI(devices=5000, client_secret="a"),
+             "lab": MockTailscaleAPI(devices=5000, client_secret="b")}
+
+    async def run(tailnets):
+        async with TailnetManager(tailnets, rate=0) as manager:
+            stream = manager.iter_devices()
+            async for _ in stream:
+                break
+            # Both producers are blocked on a full queue by now
+            await asyncio.sleep(0.5)
+            await asyncio.wait_for(stream.aclose(), 5)
+            assert len([item async for item in manager.iter_devices(["lab"])]) == 5000
+
+    with ExitStack() as stack:
+        asyncio.run(run(serve(stack, mocks)))
+
+def test_fan_out_costs_the_slowest_tailnet_not_the_sum():
+    result = benchmark(latencies=(0.3, 0.3, 0.3), devices=100)
+    assert result["devices"] == result["sequential_devices"] == 300
+    assert result["sequential_seconds"] >= 0.9
+    assert result["fan_out_seconds"] < 0.6
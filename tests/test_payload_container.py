@@ -0,0 +1,108 @@
+import os
+import sys
+import struct
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from payload_container import (
+    PayloadWriter, PayloadReader, PayloadError, write_payload, append_payload, codec_available
+)
+
+CODECS = [c for c in ("none", "lzma", "zstd") if codec_available(c)]
+
+@pytest.fixture
+def blobs():
+    return {
+        "tailscale-setup.msi": os.urandom(256 * 1024) + b"\x00" * (512 * 1024),
+        "att_tailscale_watchdog.py": "print('watchdog')\n" * 2000,
+    }
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_roundtrip(tmp_path, blobs, codec):
+    path = write_payload(tmp_path / "payload.tspk", blobs, codec)
+
+    with PayloadReader(path) as reader:
+        assert sorted(reader.names()) == sorted(blobs)
+        for name, data in blobs.items():
+            expected = data.encode() if isinstance(data, str) else data
+            assert reader.read_bytes(name) == expected
+            assert reader.entry(name)["size"] == len(expected)
+
+def test_compression_shrinks_compressible_entries(tmp_path, blobs):
+    path = write_payload(tmp_path / "payload.tspk", blobs, "lzma")
+    with PayloadReader(path) as reader:
+        entry = reader.entry("att_tailscale_watchdog.py")
+        assert entry["compressed_size"] < entry["size"] / 10
+
+def test_appended_to_executable(tmp_path, blobs):
+    exe = tmp_path / "installer.exe"
+    exe.write_bytes(b"MZ" + os.urandom(4096))
+    payload = write_payload(tmp_path / "payload.tspk", blobs, "lzma")
+    append_payload(exe, payload)
+
+    with PayloadReader(exe) as reader:
+        out = reader.extract("tailscale-setup.msi", tmp_path / "out" / "ts.msi")
+        assert out.read_bytes() == blobs["tailscale-setup.msi"]
+
+def test_corrupt_entry_is_rejected_and_not_left_on_disk(tmp_path, blobs):
+    path = write_payload(tmp_path / "payload.tspk", blobs, "none")
+    with PayloadReader(path) as reader:
+        offset = reader.entry("tailscale-setup.msi")["offset"]
+    data = bytearray(path.read_bytes())
+    data[offset + 10] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    dest = tmp_path / "ts.msi"
+    with PayloadReader(path) as reader:
+        with pytest.raises(PayloadError):
+            reader.extract("tailscale-setup.msi", dest)
+    assert not dest.exists()
+    assert not dest.with_name("ts.msi.part").exists()
+
+@pytest.mark.parametrize("codec", [c for c in CODECS if c != "none"])
+def test_undecodable_entry_raises_payload_error(tmp_path, blobs, codec):
+    path = write_payload(tmp_path / "payload.tspk", blobs, codec)
+    with PayloadReader(path) as reader:
+        offset = reader.entry("tailscale-setup.msi")["offset"]
+    data = bytearray(path.read_bytes())
+    data[offset:offset + 4] = b"\xff" * 4
+    path.write_bytes(bytes(data))
+
+    with PayloadReader(path) as reader:
+        with pytest.raises(PayloadError, match="corrupt"):
+            reader.read_bytes("tailscale-setup.msi")
+
+@pytest.mark.parametrize("manifest", [b"\xff\xfe not json", b"[1, 2]", b'{"version": 1}', b'{"version": 1, "entries": [{}]}'])
+def test_corrupt_manifest_raises_payload_error(tmp_path, blobs, manifest):
+    path = write_payload(tmp_path / "payload.tspk", blobs, "none")
+    data = path.read_bytes()
+    manifest_length = struct.unpack("<QQ8s", data[-24:])[0]
+    start = len(data) - 24 - manifest_length
+    path.write_bytes(data[:start] + manifest.ljust(manifest_length) + data[-24:])
+
+    with pytest.raises(PayloadError, match="Corrupt payload manifest"):
+        PayloadReader(path)
+
+@pytest.mark.parametrize("name", ["../escape.txt", "sub/../../escape.txt", "/tmp/escape.txt", "..\\escape.txt", "C:escape.txt"])
+def test_extract_all_rejects_entries_outside_dest(tmp_path, name):
+    path = write_payload(tmp_path / "payload.tspk", {"ok.txt": b"ok", name: b"evil"}, "none")
+    with PayloadReader(path) as reader:
+        with pytest.raises(PayloadError, match="Unsafe"):
+            reader.extract_all(tmp_path / "out" / "dest")
+    assert not (tmp_path / "out").exists()
+    assert not (tmp_path / "escape.txt").exists()
+
+def test_missing_trailer(tmp_path):
+    path = tmp_path / "plain.bin"
+    path.write_bytes(b"not a payload" * 10)
+    with pytest.raises(PayloadError):
+        PayloadReader(path)
+
+def test_duplicate_entry(tmp_path):
+    with open(tmp_path / "p.tspk", "wb") as f:
+        writer = PayloadWriter(f, "none")
+        writer.add_bytes("a", b"1")
+        with pytest.raises(PayloadError):
+            writer.add_bytes("a", b"2")
@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from rate_limit import CircuitBreaker, TokenBucket, parse_retry_after
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_bursts_then_paces_and_adapts():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == 0.1
+    clock.now += 0.1
+    assert bucket.take() == 0
+
+    # A 429 halves the rate and pauses everyone for Retry-After
+    bucket.throttled(2)
+    assert bucket.rate == 5
+    assert bucket.take() == 2
+    clock.now += 2
+    assert bucket.take() == 0.2
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 10
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and breaker.retry_in() == 30
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("0.25") == 0.25
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 < parse_retry_after(date) <= 60
+
+def test_circuit_breaker_trial_released_without_an_outcome():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+def test_throttled_or_cancelled_trial_does_not_wedge_the_breaker():
+    import asyncio
+    from mock_tailscale_api import MockTailscaleAPI, running
+    from tailscale_api import TailscaleAPI
+
+    mock = MockTailscaleAPI(devices=1)
+
+    async def run(base_url):
+        async with TailscaleAPI(base_url=base_url, client_id="id", client_secret="secret", rate=0,
+                                max_retries=0, circuit_threshold=2, circuit_reset=0.2) as api:
+            await api.get_access_token()
+            mock.fail_next(500, 2)
+            for _ in range(2):
+                try:
+                    await api.list_auth_keys()
+                except Exception:
+                    pass
+            assert api.breaker.state == "open"
+
+            # The trial is answered with a 429: the API is up, the breaker closes
+            await asyncio.sleep(0.25)
+            mock.fail_next(429, 1, retry_after="0")
+            try:
+                await api.list_auth_keys()
+            except Exception:
+                pass
+            assert api.breaker.state == "closed"
+            await api.list_auth_keys()
+
+            # A trial cancelled mid-flight hands the next request the trial
+            mock.fail_next(500, 2)
+            for _ in range(2):
+                try:
+                    await api.list_auth_keys()
+                except Exception:
+                    pass
+            await asyncio.sleep(0.25)
+            mock.latency = 0.5
+            task = asyncio.create_task(api.list_auth_keys())
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            mock.latency = 0
+            await api.list_auth_keys()
+            assert api.breaker.state == "closed"
+
+    with running(mock) as base_url:
+        asyncio.run(run(base_url))
@@ -0,0 +1,57 @@
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+from wheelhouse import supported, select_wheels, install_wheels
+
+HOST = {"python": (3, 12), "machine": "x86_64", "glibc": (2, 35)}
+
+@pytest.mark.parametrize("filename, fits", [
+    ("cryptography-42.0.0-cp39-abi3-manylinux_2_28_x86_64.whl", True),
+    ("cryptography-42.0.0-cp39-abi3-manylinux_2_28_aarch64.whl", False),
+    ("cffi-1.17.0-cp312-cp312-manylinux2014_x86_64.manylinux_2_17_x86_64.whl", True),
+    ("cffi-1.17.0-cp313-cp313-manylinux2014_x86_64.manylinux_2_17_x86_64.whl", False),
+    ("cffi-1.17.0-cp312-cp312-musllinux_1_1_x86_64.whl", False),
+    ("pycparser-2.22-py3-none-any.whl", True),
+    ("cryptography-42.0.0-cp313-abi3-manylinux_2_28_x86_64.whl", False),
+])
+def test_wheel_tags(filename, fits):
+    assert supported(filename, **HOST) == fits
+
+def test_old_glibc_rejects_newer_manylinux():
+    assert not supported("cryptography-42.0.0-cp39-abi3-manylinux_2_28_x86_64.whl",
+                         python=(3, 12), machine="x86_64", glibc=(2, 17))
+
+def make_wheel(wheel_dir, filename, files):
+    wheel_dir.mkdir(exist_ok=True)
+    with zipfile.ZipFile(wheel_dir / filename, 'w') as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+
+def test_install_picks_newest_fitting_wheels(tmp_path):
+    wheels = tmp_path / "wheels"
+    make_wheel(wheels, "demo-1.0-py3-none-any.whl", {"demo/__init__.py": "VERSION = 1\n"})
+    make_wheel(wheels, "demo-2.0-py3-none-any.whl", {
+        "demo/__init__.py": "VERSION = 2\n",
+        "demo-2.0.data/purelib/demo_extra.py": "EXTRA = True\n",
+        "demo-2.0.data/scripts/demo": "#!/bin/sh\n"
+    })
+    make_wheel(wheels, "demo-3.0-cp312-cp312-linux_riscv64.whl", {"demo/__init__.py": "VERSION = 3\n"})
+
+    target = tmp_path / "lib"
+    (target / "stale").mkdir(parents=True)
+    installed = install_wheels(wheels, target)
+
+    assert [w.name for w in installed] == ["demo-2.0-py3-none-any.whl"]
+    assert (target / "demo" / "__init__.py").read_text() == "VERSION = 2\n"
+    assert (target / "demo_extra.py").exists()
+    assert not (target / "stale").exists()
+    assert not (target / "demo-2.0.data").exists()
+
+def test_missing_fitting_wheel_is_an_error(tmp_path):
+    make_wheel(tmp_path / "wheels", "native-1.0-cp27-cp27mu-manylinux1_x86_64.whl", {"native.py": ""})
+    with pytest.raises(RuntimeError, match="native"):
+        select_wheels(tmp_path / "wheels")